@@ -1,10 +1,33 @@
 import logging
 from fastapi import APIRouter
 
+from app.core.model_registry import model_registry
+from app.repository.postgres import write_metrics
+from app.services.result_sink import result_sink
+from app.services.pipeline import last_pipeline_metrics
+
 router = APIRouter()
 
 
 @router.get("/healthz")
 async def health_check():
     """Проверка здоровья сервиса"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@router.get("/healthz/models")
+async def models_metrics():
+    """Метрики реестра моделей: время загрузки и потребление памяти"""
+    return model_registry.get_metrics()
+
+
+@router.get("/healthz/pipeline")
+async def pipeline_metrics():
+    """Метрики последнего прогона конвейера позиций: задержки стадий и глубина очередей"""
+    return last_pipeline_metrics
+
+
+@router.get("/healthz/db")
+async def db_metrics():
+    """Метрики записи результатов в Postgres: задержка commit и строк на транзакцию"""
+    return {**write_metrics.as_dict(), "result_sink": result_sink.get_stats()}
@@ -8,7 +8,7 @@ from typing import Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.broker.broker import broker, tender_exchange
-from app.core.dependencies.services import get_tender_notifier, get_service_es_selector
+from app.core.dependencies.services import get_tender_notifier, get_service_es_selector, get_service_shrinker
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.db.session import get_session
@@ -25,12 +25,10 @@ async def tender_test(
     tender_id: Optional[int] = 463, # id тендера который прогонится через мэтчер еще раз (смотри в pg таблице 'tenders_info'; колонка 'id')
     es_service: ElasticSelector = Depends(get_service_es_selector),
     session: AsyncSession = Depends(get_session),
+    shrink_service: Shrinker = Depends(get_service_shrinker),
 ):
     """Ручной вызов прогона тендера"""
 
-    # Исправлено: передаем все зависимости в shrink_service
-    shrink_service = Shrinker()
-
     logger.info(f"Получен тендер для мэтчинга: {tender_id}")
 
     ts_pg = time.time()
@@ -1,41 +1,52 @@
+import asyncio
 import time
-from typing import Dict, List
+from functools import partial
+from typing import Dict, List, Optional
 
 from faststream import Depends
+from faststream.exceptions import NackMessage, RejectMessage
 from faststream.rabbit import RabbitQueue
+from faststream.rabbit.annotations import RabbitMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.broker.broker import broker, tender_exchange
-from app.core.dependencies.services import get_tender_notifier, get_service_es_selector
+from app.core.dependencies.services import get_tender_notifier, get_service_es_selector, get_service_shrinker
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.db.session import get_session
 from app.models.tenders import TenderPositions
-from app.repository.postgres import PostgresRepository
+from app.repository.postgres import PostgresRepository, PositionResultRows
 from app.services.es_selector import ElasticSelector
 from app.services.publisher_service import TenderNotifier
+from app.services.result_sink import result_sink
 from app.services.shrinker.shrinker_main import Shrinker
+from app.services.tender_pipeline import TenderPipeline
 
 logger = get_logger(name=__name__)
 
 
 @broker.subscriber(
     RabbitQueue(
-        "matching_queue", durable=True, routing_key="tender.categorized"
+        "matching_queue",
+        durable=True,
+        routing_key="tender.categorized",
+        arguments=(
+            {"x-dead-letter-exchange": settings.MATCHING_QUEUE_DEAD_LETTER_EXCHANGE}
+            if settings.MATCHING_QUEUE_DEAD_LETTER_EXCHANGE else None
+        ),
     ),
     tender_exchange,
 )
 async def handle_tender_categorization(
+    message: RabbitMessage,
     tender_id: int,
     tender_number=None,
     customer_name=None,
     notifier: TenderNotifier = Depends(get_tender_notifier),
     es_service: ElasticSelector = Depends(get_service_es_selector),
     session: AsyncSession = Depends(get_session),
+    shrink_service: Shrinker = Depends(get_service_shrinker),
 ):
-    # Исправлено: передаем все зависимости в shrink_service
-    shrink_service = Shrinker()
-
     logger.info(f"Получен тендер для мэтчинга: {tender_id}")
 
     ts_pg = time.time()
@@ -55,26 +66,22 @@ async def handle_tender_categorization(
 
     logger.info(f'для обработки пришло позиций: {len(positions)}')
 
-    for position in positions:
-
-        # Получаем кандидатов для позиции
-        es_candidates = await es_service.find_candidates_for_rabbit(
-            index_name=settings.ES_INDEX, position=position
-        )
-
-        # Применяем shrinking к кандидатам
-        processed_candidates = await shrink_service.shrink(candidates=es_candidates, position=position)
-
-        # ЭТАП 3: ФИНАЛЬНАЯ ОБРАБОТКА
-        await _finalize_results(candidates=es_candidates, processed_candidates=processed_candidates, position=position)
-
-        # Сохраняем результаты для позиции
-        position_result = {
-            "position_id": position.id,
-            "position_title": position.title,
-            "candidates_count": len(es_candidates["hits"]["hits"]),
-            "candidates": es_candidates["hits"]["hits"],
-        }
+    # Позиции идут конвейером: поиск в ES, парсинг, скоринг и запись разных позиций перекрываются
+    pending_writes: List[asyncio.Future] = []
+    tender_pipeline = TenderPipeline(
+        es_service=es_service,
+        shrink_service=shrink_service,
+        finalize=partial(
+            _finalize_results, pending_writes=pending_writes, delivery_id=_delivery_id(message)
+        ),
+    )
+    results = await tender_pipeline.run(positions)
+
+    # Порядок результатов совпадает с порядком позиций
+    for position, position_result in zip(positions, results):
+        if isinstance(position_result, Exception):
+            logger.error(f"Ошибка обработки позиции {position.id}: {position_result}")
+            continue
         all_position_results.append(position_result)
 
     # Сохраняем все результаты
@@ -86,18 +93,50 @@ async def handle_tender_categorization(
         "results": all_position_results,
     }
 
+    # Сообщение подтверждается после выхода из обработчика - поэтому ждем commit всех позиций тендера
+    failed_writes = await result_sink.wait_durable(pending_writes)
+
     tr_es = time.time() - ts_es
 
     logger.info(f"Завершен мэтчинг для тендера {tender_id}. Обработано позиций: {len(positions)}")
     logger.info(f'операции с PG: {round(tr_pg, 2)} сек. | мэтчер: {round(tr_es, 2)} сек.')
     logger.info(f"{60 * '='}\n")
 
+    if failed_writes:
+        # Записанные позиции помечены идентификатором доставки - повторная доставка перезапишет их, а не продублирует.
+        # Возвращаем тендер в очередь один раз; не записанный и после этого уходит в DLX (если он настроен)
+        if not message.raw_message.redelivered:
+            logger.error(f"Тендер {tender_id}: не записаны результаты {failed_writes} позиций, возвращаем в очередь")
+            raise NackMessage(requeue=True)
+        logger.error(f"Тендер {tender_id}: не записаны результаты {failed_writes} позиций после повторной доставки")
+        raise RejectMessage(requeue=False)
+
+
+def _delivery_id(message: RabbitMessage) -> Optional[str]:
+    """Идентификатор сообщения, одинаковый у всех его доставок (None - записи не защищены от дублей)"""
+    if not settings.RESULT_WRITES_DEDUP_ENABLED:
+        return None
+    delivery_id = message.raw_message.message_id or message.raw_message.correlation_id
+    if not delivery_id:
+        logger.warning("⚠️ У сообщения нет message_id и correlation_id - повторная доставка продублирует результаты")
+    return delivery_id
+
 
 async def _finalize_results(
-    candidates: dict, processed_candidates: List[Dict], position: TenderPositions
+    candidates: dict,
+    processed_candidates: List[Dict],
+    position: TenderPositions,
+    pending_writes: Optional[List[asyncio.Future]] = None,
+    delivery_id: Optional[str] = None,
 ):
-    """Финальная обработка результатов"""
+    """Финальная обработка результатов
+
+    Ошибка до записи или при записи не глотается молча: в pending_writes добавляется незаписанная позиция,
+    и обработчик не подтверждает тендер
+    """
     try:
+        # None - у позиции нет атрибутов для сравнения: записываем как обработанную без соответствий
+        processed_candidates = processed_candidates or []
         processed_candidates.sort(key=lambda x: x["points"], reverse=True)
         candidates["hits"]["hits"] = [
             item["candidate"] for item in processed_candidates
@@ -146,29 +185,46 @@ async def _finalize_results(
                 }
                 attributes_matches_data.append(match_data)
 
+        # Счетчик позиций и все соответствия позиции - одной транзакцией: позиция не бывает записана наполовину
+        position_rows = PositionResultRows(
+            tender_id=position.tender_id,
+            tender_position_id=position.id,
+            matches=tender_matches_data,
+            attribute_matches=attributes_matches_data,
+            delivery_id=delivery_id,
+        )
+        if settings.RESULT_SINK_ENABLED and pending_writes is not None:
+            # Запись в фоне групповым commit вместе с другими позициями; обработчик дождется ее перед подтверждением
+            future = result_sink.submit(position_rows)
+            future.add_done_callback(partial(_log_position_persisted, position=position, matches_count=len(processed_candidates)))
+            pending_writes.append(future)
+            return
+
         async for fresh_session in get_session():
-            try:
-                fresh_pg_service = PostgresRepository(fresh_session)
-                position_number = await fresh_pg_service.increment_processed_positions(
-                    tender_id=position.tender_id
-                )
-                if tender_matches_data:
-                    await fresh_pg_service.create_tender_matches_batch(
-                        tender_matches_data
-                    )
-                if attributes_matches_data:
-                    await fresh_pg_service.create_tender_position_attribute_matches_bulk(
-                        attributes_matches_data
-                    )
-
-            except Exception as e:
-                logger.error(f"Database operation failed: {e}")
-                await fresh_session.rollback()
-                raise
+            position_numbers = await PostgresRepository(fresh_session).save_positions_results([position_rows])
+            if position_numbers is None:
+                raise RuntimeError(f"Результаты позиции {position.id} не записаны")
+            position_number = position_numbers.get(position.id)
 
             logger.info(
                 f"[№{position_number}] ✅ Позиция '{position.title}' обработана! "
                 f"Подобрано {len(processed_candidates)} товаров.\n"
             )
     except Exception as e:
-        logger.error(e)
+        logger.error(f"Результаты позиции {position.id} не записаны: {e}")
+        if pending_writes is not None:
+            failed = asyncio.get_running_loop().create_future()
+            failed.set_exception(e)
+            pending_writes.append(failed)
+
+
+def _log_position_persisted(future: asyncio.Future, position: TenderPositions, matches_count: int):
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        logger.error(future.exception())
+        return
+    logger.info(
+        f"[№{future.result()}] ✅ Позиция '{position.title}' обработана! "
+        f"Подобрано {matches_count} товаров.\n"
+    )
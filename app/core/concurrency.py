@@ -0,0 +1,29 @@
+import asyncio
+
+
+class WeightedSemaphore:
+    """Семафор с весом захвата - ограничивает суммарный объем (например, кандидатов в памяти)"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._available = capacity
+        self._condition = asyncio.Condition()
+
+    @property
+    def in_use(self) -> int:
+        return self.capacity - self._available
+
+    async def acquire(self, weight: int) -> int:
+        """Захват веса (не больше емкости, чтобы крупный запрос не завис навсегда)"""
+        weight = min(max(weight, 0), self.capacity)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._available >= weight)
+            self._available -= weight
+        return weight
+
+    async def release(self, weight: int):
+        if weight <= 0:
+            return
+        async with self._condition:
+            self._available = min(self._available + weight, self.capacity)
+            self._condition.notify_all()
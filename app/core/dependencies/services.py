@@ -1,8 +1,7 @@
-from fastapi import Depends, HTTPException, Request
-
 from app.broker.broker import broker
 from app.core.dependencies.repositories import get_es_repository
 from app.core.logger import get_logger
+from app.core.model_registry import model_registry
 from app.services.es_selector import ElasticSelector
 from app.services.publisher_service import TenderNotifier
 from app.services.shrinker.shrinker_main import Shrinker
@@ -21,24 +20,25 @@ def get_service_es_selector() -> ElasticSelector:
 
 
 def get_service_trigrammer() -> Trigrammer:
-    """Внедрение зависимости сервиса Trigrammer"""
-    logger.debug("⏺️ Создаем экземпляр Trigrammer сервиса...")
-    return Trigrammer()
+    """Внедрение зависимости сервиса Trigrammer (из реестра моделей)"""
+    return model_registry.trigrammer
 
-def get_service_vectorizer(request: Request) -> SemanticMatcher:
-    vectorizer = getattr(request.app.state, 'vectorizer', None)
-    if vectorizer is None:
-        raise HTTPException(status_code=500, detail="Векторизатор не инициализирован")
-    return vectorizer
+def get_service_vectorizer() -> SemanticMatcher:
+    """Внедрение зависимости сервиса SemanticMatcher (из реестра моделей)"""
+    return model_registry.vectorizer
 
 async def get_tender_notifier() -> TenderNotifier:
     """Внедрение зависимости сервиса TenderNotifier"""
     return TenderNotifier(broker=broker)  # Передаем нужный broker
 
-def get_service_shrinker(
-        trigrammer: Trigrammer = Depends(get_service_trigrammer),
-        vectorizer: SemanticMatcher = Depends(get_service_vectorizer)
-) -> Shrinker:
-    """Внедрение зависимости сервиса Shrinker"""
+def get_service_shrinker() -> Shrinker:
+    """Внедрение зависимости сервиса Shrinker (модели берутся из реестра)"""
     logger.debug("⏺️ Создаем экземпляр Shrinker сервиса...")
-    return Shrinker(trigrammer=trigrammer, vectorizer=vectorizer)
\ No newline at end of file
+    return Shrinker(
+        vectorizer=model_registry.vectorizer,
+        attrs_sorter=model_registry.attrs_sorter,
+        unit_normalizer=model_registry.unit_normalizer,
+        trigrammer=model_registry.trigrammer,
+        lemmatizator=model_registry.lemmatizator,
+        stemmer=model_registry.stemmer,
+    )
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Optional
 
 from app.core.settings import settings
 from app.models.tenders import TenderPositions
@@ -7,6 +7,27 @@ from app.models.tenders import TenderPositions
 class ElasticQueries:
     """Агрегация поисковоых запросов для ElasticSearch"""
 
+    # Поля кандидата, которые используются в скоринге (ShrinkerProducts) и при сохранении результатов
+    SOURCE_FIELDS = {
+        "v5": ["id", "title", "attributes", "features_version"],
+        "v6": ["id", "title", "attributes", "features_version"],
+    }
+
+    @staticmethod
+    def apply_source_filter(query: Dict, version: str) -> Dict:
+        """Ограничение _source полями, нужными для запроса версии version"""
+        if settings.ES_SOURCE_FILTERING:
+            includes = [
+                field for field in ElasticQueries.SOURCE_FIELDS[version]
+                if field not in settings.ES_DOCVALUE_FIELDS
+            ]
+            query["_source"] = {"includes": includes, "excludes": list(settings.ES_SOURCE_EXCLUDES)}
+
+        if settings.ES_DOCVALUE_FIELDS:
+            query["docvalue_fields"] = list(settings.ES_DOCVALUE_FIELDS)
+
+        return query
+
     @staticmethod
     def get_query_v5(position: TenderPositions, size: Optional[int] = 200):
         """
@@ -139,7 +160,7 @@ class ElasticQueries:
         # logger.info(f"🔍 Построен запрос для позиции: {position.title}")
         # logger.debug(f"🔍 Запрос: {query}")
 
-        return query
+        return ElasticQueries.apply_source_filter(query, "v5")
 
     @staticmethod
     def get_query_v6(
@@ -246,4 +267,4 @@ class ElasticQueries:
         # logger.info(f"🔍 Построен запрос для позиции: {position.title}")
         # logger.debug(f"🔍 Запрос: {query}")
 
-        return query
+        return ElasticQueries.apply_source_filter(query, "v6")
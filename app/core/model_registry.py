@@ -0,0 +1,138 @@
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.logger import get_logger
+from app.services.attrs_standardizer import AttrsStandardizer
+from app.services.lemmatization_service import LemmatizationService
+from app.services.stemming_service import StemmingService
+from app.services.trigrammer import Trigrammer
+from app.services.unit_standardizer import UnitStandardizer
+from app.services.vectorizer import SemanticMatcher
+
+logger = get_logger(name=__name__)
+
+
+def _get_rss_mb() -> float:
+    """Текущий RSS процесса в МБ (с фолбэком на пиковое значение)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except Exception:
+        # ru_maxrss на linux отдается в КБ
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelRegistry:
+    """Реестр NLP моделей и общих клиентов - один экземпляр на воркер"""
+
+    # Фабрики компонентов реестра (порядок = порядок загрузки)
+    _factories: Dict[str, Callable[[], Any]] = {
+        "lemmatizator": LemmatizationService,
+        "stemmer": StemmingService,
+        "trigrammer": Trigrammer,
+        "vectorizer": SemanticMatcher,
+        "attrs_sorter": AttrsStandardizer,
+        "unit_normalizer": UnitStandardizer,
+    }
+
+    def __init__(self):
+        self._instances: Dict[str, Any] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> Any:
+        """Получить компонент, при необходимости загрузив его (ленивая инициализация)"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                rss_before = _get_rss_mb()
+                ts = time.perf_counter()
+
+                self._instances[name] = self._factories[name]()
+
+                self._metrics[name] = {
+                    "load_time_sec": round(time.perf_counter() - ts, 3),
+                    "rss_delta_mb": round(_get_rss_mb() - rss_before, 1),
+                }
+                logger.info(
+                    f"✅ {name} загружен за {self._metrics[name]['load_time_sec']} сек. "
+                    f"(+{self._metrics[name]['rss_delta_mb']} МБ)"
+                )
+
+            return self._instances[name]
+
+    def load_all(self):
+        """Загрузка всех моделей и клиентов (вызывается из lifespan)"""
+        logger.info("🧠 Загрузка моделей в реестр...")
+        ts = time.perf_counter()
+
+        for name in self._factories:
+            self._get(name)
+
+        logger.info(f"✅ Реестр моделей готов за {round(time.perf_counter() - ts, 2)} сек. | RSS: {round(_get_rss_mb(), 1)} МБ")
+
+    def unload_all(self):
+        """Сохранение кэшей на диск и освобождение ссылок на модели"""
+        for instance in list(self._instances.values()):
+            if hasattr(instance, "save_cache"):
+                instance.save_cache()
+
+        with self._lock:
+            self._instances.clear()
+            self._metrics.clear()
+
+    @property
+    def is_loaded(self) -> bool:
+        return all(name in self._instances for name in self._factories)
+
+    @property
+    def lemmatizator(self) -> LemmatizationService:
+        return self._get("lemmatizator")
+
+    @property
+    def stemmer(self) -> StemmingService:
+        return self._get("stemmer")
+
+    @property
+    def trigrammer(self) -> Trigrammer:
+        return self._get("trigrammer")
+
+    @property
+    def vectorizer(self) -> SemanticMatcher:
+        return self._get("vectorizer")
+
+    @property
+    def attrs_sorter(self) -> AttrsStandardizer:
+        return self._get("attrs_sorter")
+
+    @property
+    def unit_normalizer(self) -> UnitStandardizer:
+        return self._get("unit_normalizer")
+
+    def get_metrics(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Метрики загрузки: время и прирост памяти по каждому компоненту"""
+        if name is not None:
+            return dict(self._metrics.get(name, {}))
+
+        return {
+            "loaded": list(self._instances.keys()),
+            "total_load_time_sec": round(sum(m["load_time_sec"] for m in self._metrics.values()), 3),
+            "rss_mb": round(_get_rss_mb(), 1),
+            "components": {name: dict(metrics) for name, metrics in self._metrics.items()},
+            "caches": {
+                name: instance.get_cache_stats()
+                for name, instance in self._instances.items()
+                if hasattr(instance, "get_cache_stats")
+            },
+        }
+
+
+# Глобальный экземпляр
+model_registry = ModelRegistry()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from enum import Enum
+from typing import List
 
 
 class EnvironmentMode(str, Enum):
@@ -48,14 +49,111 @@ class Settings(BaseSettings):
     ES_INDEX: str = "super_duper_index"
     ES_CANDIDATES_QTY: int = 2000
     ES_MAX_RETRIES: int = 3
+    # Версия предвычисленных признаков атрибутов в документах ES (поднять при изменении парсинга)
+    ES_FEATURES_VERSION: int = 2
+    # Фильтрация _source в запросах кандидатов: тянем только поля, нужные скорингу и сохранению результатов
+    ES_SOURCE_FILTERING: bool = True
+    # Дополнительные исключения из _source (например, сырые поля атрибутов, когда весь индекс обогащен)
+    ES_SOURCE_EXCLUDES: List[str] = []
+    # Скалярные поля, которые берутся из doc values, а не из _source (подставляются обратно в _source)
+    ES_DOCVALUE_FIELDS: List[str] = []
+    # Поиск кандидатов для нескольких позиций тендера одним _msearch
+    ES_MSEARCH_ENABLED: bool = True
+    # Позиций в одном _msearch (резерв окна * ES_CANDIDATES_QTY кандидатов в MAX_INFLIGHT_CANDIDATES берется до запроса)
+    ES_MSEARCH_WINDOW: int = 4
+    # Потоковая выдача кандидатов страницами (search_after + PIT): скоринг начинается с первой страницы
+    ES_STREAM_ENABLED: bool = False
+    ES_STREAM_PAGE_SIZE: int = 250
+    ES_STREAM_KEEP_ALIVE: str = "1m"
+
+    # Массовая переиндексация/обогащение индекса (app.services.es_reindex)
+    ES_REINDEX_BATCH_SIZE: int = 1000  # документов в одной странице чтения (search_after)
+    ES_BULK_CHUNK_SIZE: int = 500  # документов в одном bulk-запросе
+    ES_BULK_CONCURRENCY: int = 4  # одновременных bulk-запросов
+    ES_BULK_MAX_RETRIES: int = 3  # повторов для неуспешных документов (429, 5xx, сетевые ошибки)
+    ES_BULK_RETRY_BACKOFF: float = 2.0  # начальная пауза перед повтором, сек. (удваивается)
+    ES_REINDEX_SORT_FIELD: str = "id"  # уникальное поле сортировки - по нему продолжается прерванный проход
+    ES_REINDEX_CHECKPOINT_DIR: str = "checkpoints"  # каталог чекпоинтов
 
     # Внешние сервисы
     SERVICE_LINK_ATTRS_STANDARDIZER: str = "http://localhost:8000"
     SERVICE_LINK_UNIT_STANDARDIZER: str = "http://localhost:8001"
     SERVICE_LINK_SEMANTIC_MATCHER: str = "http://localhost:8081"
 
+    # Пакетный разбор характеристик позиций (все строки позиции/тендера одним запросом к /standardize)
+    ATTRS_STANDARDIZER_BATCH_ENABLED: bool = True
+    # Макс. кол-во строк в одном запросе к стандартизатору атрибутов
+    ATTRS_STANDARDIZER_BATCH_SIZE: int = 200
+    # Размер кэша разборов по исходной строке "name: value unit"
+    ATTRS_STANDARDIZER_CACHE_SIZE: int = 100_000
+    # Макс. кол-во одновременных запросов к стандартизатору атрибутов (пачки и одиночные повторы)
+    ATTRS_STANDARDIZER_CONCURRENCY: int = 8
+    # Сколько секунд не переспрашивать строку, которую сервис не разобрал (пустой ответ)
+    ATTRS_STANDARDIZER_EMPTY_TTL: float = 300
+    # Версия разбора атрибутов (стандартизатор + нормализация единиц): смена версии инвалидирует постоянный кэш
+    ATTRS_STANDARDIZER_VERSION: str = "2"
+    # Постоянный кэш разобранных атрибутов позиций в Postgres (одинаковые характеристики в разных тендерах)
+    PARSED_ATTRS_CACHE_ENABLED: bool = True
+    PARSED_ATTRS_CACHE_TTL_DAYS: int = 30
+
+    # Локальный пересчет известных единиц (длина, масса, объем, мощность и т.д.) без запроса в сервис
+    UNIT_LOCAL_CONVERSION_ENABLED: bool = True
+
+    # Одновременных запросов к стандартизатору единиц и размер кэша его ответов по (значение, единица)
+    UNIT_STANDARDIZER_CONCURRENCY: int = 20
+    UNIT_STANDARDIZER_CACHE_SIZE: int = 200_000
+
+    # Семантический матчер: макс. размер микро-батча, макс. ожидание его наполнения (мс) и размер кэша пар
+    SEMANTIC_BATCH_MAX_SIZE: int = 256
+    SEMANTIC_BATCH_MAX_WAIT_MS: int = 5
+    SEMANTIC_CACHE_SIZE: int = 200_000
+
+    # Режим семантического матчера: remote - пары в сервис; embeddings - векторы из сервиса и локальный косинус;
+    # local_embeddings - локальные хэш-эмбеддинги (офлайн/тесты)
+    SEMANTIC_MATCHER_MODE: str = "remote"
+    SEMANTIC_VECTOR_CACHE_SIZE: int = 500_000
+
+    # Размер кэша интернированных n-граммных сигнатур строк (Trigrammer)
+    TRIGRAM_SIGNATURE_CACHE_SIZE: int = 200_000
+
     # Кол-во одновременно обрабатываемых кандидатов
     SHRINKER_SEMAPHORE_SIZE: int = 100
+    # Сравнение numeric/range атрибутов сразу по всем кандидатам позиции (NumPy)
+    SHRINKER_VECTORIZED_NUMERIC: bool = True
+    # Отсев кандидатов по оценке сверху достижимого балла до полного скоринга
+    SHRINKER_PREFILTER_ENABLED: bool = True
+    # Адаптивный порядок проверки атрибутов позиции (дешевые и селективные - первыми) для раннего выхода
+    SHRINKER_ADAPTIVE_ATTR_ORDER: bool = True
+    # Потоковый режим: прекратить чтение ES после N сильных кандидатов (0 - читать всю выдачу)
+    SHRINKER_STREAM_STOP_AFTER: int = 0
+    # Доля от макс. балла позиции, начиная с которой кандидат считается сильным
+    SHRINKER_STREAM_STOP_SCORE: float = 1.0
+
+    # Режим скоринга кандидатов: "async" - в event loop, "process" - шардами в пуле процессов
+    SHRINKER_EXECUTION_MODE: str = "async"
+    # Кол-во процессов пула (0 - по числу ядер), размер шарда кандидатов и способ запуска процессов
+    SHRINKER_PROCESS_WORKERS: int = 0
+    SHRINKER_PROCESS_SHARD_SIZE: int = 250
+    SHRINKER_PROCESS_START_METHOD: str = "spawn"
+
+    # Макс. кол-во позиций тендера в конвейере одновременно, по всем стадиям (1 - строго последовательно)
+    POSITIONS_CONCURRENCY: int = 8
+    # Конвейер позиций тендера: кол-во воркеров на стадиях и размер очередей между ними
+    PIPELINE_RETRIEVE_WORKERS: int = 4
+    PIPELINE_PARSE_WORKERS: int = 2
+    PIPELINE_SCORE_WORKERS: int = 2
+    PIPELINE_PERSIST_WORKERS: int = 2
+    PIPELINE_QUEUE_SIZE: int = 4
+    # Макс. кол-во кандидатов ES в памяти одновременно по всем позициям тендера
+    MAX_INFLIGHT_CANDIDATES: int = 8000
+
+    # Реестр моделей: загружать ли NLP модели при старте (иначе - лениво при первом обращении)
+    MODELS_PRELOAD_ON_STARTUP: bool = True
+
+    # Кэш лемм/стемм: размер LRU и директория для прогрева между рестартами (пусто - без диска)
+    NLP_WORDS_CACHE_SIZE: int = 200_000
+    NLP_STRINGS_CACHE_SIZE: int = 100_000
+    NLP_CACHE_DIR: str = ""
 
     # Настройки RabbitMQ для FastStream
     RABBITMQ_HOST: str = 'localhost'
@@ -83,6 +181,23 @@ class Settings(BaseSettings):
     DB_AUTOFLUSH: bool = False
     DB_AUTOCOMMIT: bool = False
 
+    # Массовая запись результатов: COPY через asyncpg (False - пачками executemany)
+    PG_COPY_ENABLED: bool = True
+    # Строк в одной пачке COPY/executemany
+    PG_BULK_CHUNK_SIZE: int = 5000
+    # Отложенная запись результатов позиций: групповой commit по размеру буфера или по времени
+    RESULT_SINK_ENABLED: bool = True
+    RESULT_SINK_MAX_POSITIONS: int = 50
+    RESULT_SINK_MAX_ROWS: int = 20_000
+    RESULT_SINK_FLUSH_INTERVAL: float = 0.5
+    # Отметки записи позиций по доставке сообщения: повторная доставка перезаписывает, а не дублирует результаты
+    RESULT_WRITES_DEDUP_ENABLED: bool = True
+    # Сколько дней хранить отметки записи позиций
+    RESULT_WRITES_TTL_DAYS: int = 7
+    # Dead letter exchange очереди matching_queue для тендеров, не записанных и после повторной доставки
+    # (пусто - очередь объявляется без аргументов; смена аргументов требует пересоздания очереди в RabbitMQ)
+    MATCHING_QUEUE_DEAD_LETTER_EXCHANGE: str = ""
+
     # Получение ссылки для подключения к ElasticSearch
     @property
     def get_elastic_dsn(self) -> str:
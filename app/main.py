@@ -9,6 +9,10 @@ from app.core.logger import get_logger
 from app.core.settings import settings
 
 from app.core.connection_pool import connection_pool
+from app.core.model_registry import model_registry
+from app.services.parsed_attrs_cache import parsed_attrs_store
+from app.services.result_sink import result_sink
+from app.services.shrinker.shrinker_process_pool import shrinker_process_pool
 import app.broker.handlers
 
 logger = get_logger(name=__name__)
@@ -21,6 +25,28 @@ async def lifespan(app: FastAPI):
     logger.info(f"⚡️ Режим: {settings.ENV_MODE.upper()}")
     logger.info(f'📝 Уровень логирования: {settings.LOG_LEVEL}')
 
+    # Загружаем NLP модели один раз на воркер до приема сообщений
+    if settings.MODELS_PRELOAD_ON_STARTUP:
+        model_registry.load_all()
+
+    # Процессный режим скоринга: модели загружаются в каждом воркере пула
+    if settings.SHRINKER_EXECUTION_MODE == "process":
+        shrinker_process_pool.start()
+
+    # Постоянный кэш разобранных атрибутов: таблица и очистка записей прошлых версий разбора
+    if settings.PARSED_ATTRS_CACHE_ENABLED:
+        await parsed_attrs_store.ensure_table()
+        await parsed_attrs_store.cleanup()
+
+    # Отметки записи позиций по доставке: повторная доставка тендера перезаписывает, а не дублирует результаты
+    if settings.RESULT_WRITES_DEDUP_ENABLED:
+        await result_sink.ensure_table()
+        await result_sink.cleanup()
+
+    # Фоновая запись результатов позиций запускается до приема сообщений
+    if settings.RESULT_SINK_ENABLED:
+        result_sink.start()
+
     if settings.is_production_mode:
         await broker.start()
         logger.info("✅ RabbitMQ consumer запущен!")
@@ -34,7 +60,11 @@ async def lifespan(app: FastAPI):
     logger.info(f"🛑 Остановка {settings.PROJECT_NAME}")
 
     await broker.close()
+    # После остановки приема сообщений дописываем все накопленные результаты
+    await result_sink.close()
     await connection_pool.close_all()  # Добавить эту строку
+    shrinker_process_pool.shutdown()
+    model_registry.unload_all()
 
     logger.info("✅ Все соединения закрыты")
 
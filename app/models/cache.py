@@ -0,0 +1,16 @@
+from sqlalchemy import Text, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.tenders import Base
+
+
+class ParsedAttributeCache(Base):
+    """Разобранные и нормализованные атрибуты позиций (постоянный кэш стандартизатора)"""
+    __tablename__ = 'matcher_parsed_attributes_cache'
+
+    # sha256 от версии стандартизатора, названия, значения и единицы атрибута
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    version: Mapped[str] = mapped_column(Text, index=True)
+    parsed: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,14 @@
+from sqlalchemy import Text, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.tenders import Base
+
+
+class PositionWrite(Base):
+    """Записанные результаты позиций по доставке сообщения из RabbitMQ (повторная доставка не дублирует строки)"""
+    __tablename__ = 'matcher_position_writes'
+
+    # message_id (или correlation_id) сообщения о тендере - одинаковый у всех доставок одного сообщения
+    delivery_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    tender_position_id: Mapped[int] = mapped_column(primary_key=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -1,6 +1,7 @@
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 
+from elasticsearch import helpers
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.core.connection_pool import connection_pool
@@ -178,9 +179,281 @@ class ElasticRepository:
             total_hits = response.body["hits"]["total"]
             logger.debug(f"📊 Total hits: {total_hits}")
             logger.debug(f"📊 Returned docs: {len(response.body['hits']['hits'])}")
+            self._log_payload(response, len(response.body["hits"]["hits"]))
+
+            if body.get("docvalue_fields"):
+                self._merge_docvalue_fields(response.body["hits"]["hits"])
 
             return response.body
 
         except Exception as e:
             logger.error(f"❌ Error: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    async def stream_query(
+            self,
+            index_name: str,
+            body: Dict[str, Any],
+            page_size: int = 250,
+            keep_alive: str = "1m"
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Результаты поиска страницами по мере чтения (point in time + search_after), не больше body["size"]"""
+        client = await self._get_client()
+        limit = body.get("size", 10)
+        pit_id = None
+        read = 0
+        try:
+            pit = await client.open_point_in_time(index=index_name, keep_alive=keep_alive)
+            pit_id = pit["id"]
+            search_after = None
+
+            while read < limit:
+                page_body = {
+                    **body,
+                    "size": min(page_size, limit - read),
+                    "pit": {"id": pit_id, "keep_alive": keep_alive},
+                    # По релевантности, как и обычный поиск; _shard_doc для PIT добавляется неявно
+                    "sort": body.get("sort", [{"_score": "desc"}]),
+                    "track_total_hits": False,
+                }
+                if search_after is not None:
+                    page_body["search_after"] = search_after
+
+                response = await client.search(body=page_body)
+                pit_id = response.body.get("pit_id", pit_id)
+                hits = response.body["hits"]["hits"]
+                if not hits:
+                    break
+
+                self._log_payload(response, len(hits))
+                if body.get("docvalue_fields"):
+                    self._merge_docvalue_fields(hits)
+
+                read += len(hits)
+                yield hits
+                search_after = hits[-1]["sort"]
+
+        except Exception as e:
+            logger.error(f"❌ Error streaming query on {index_name}: {e}")
+
+        finally:
+            # Срабатывает и при досрочной остановке потребителем (aclose)
+            if pit_id is not None:
+                try:
+                    await client.close_point_in_time(id=pit_id)
+                except Exception as e:
+                    logger.warning(f"⚠️ Error closing point in time: {e}")
+
+    async def multi_search(self, index_name: str, bodies: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Несколько поисков одним _msearch; ответы в порядке запросов (None - подзапрос упал)"""
+        try:
+            searches = []
+            for body in bodies:
+                searches.append({"index": index_name})
+                searches.append(body)
+
+            client = await self._get_client()
+            response = await client.msearch(searches=searches)
+
+            results = []
+            for body, item in zip(bodies, response.body["responses"]):
+                if "error" in item:
+                    logger.error(f"❌ Msearch item error: {item['error']}")
+                    results.append(None)
+                    continue
+                if body.get("docvalue_fields"):
+                    self._merge_docvalue_fields(item["hits"]["hits"])
+                results.append(item)
+
+            self._log_payload(response, sum(len(item["hits"]["hits"]) for item in results if item))
+            return results
+
+        except Exception as e:
+            logger.error(f"❌ Msearch error ({len(bodies)} queries): {e}")
+            return [None] * len(bodies)
+
+    @staticmethod
+    def _log_payload(response, hits: int):
+        """Размер ответа ES (по content-length, при сжатии - в сжатом виде) и время поиска"""
+        size = response.meta.headers.get("content-length")
+        size_kb = f"{round(int(size) / 1024, 1)} KB" if size else "размер неизвестен"
+        logger.info(f"📦 ES ответ: {hits} документов, {size_kb}, took {response.body.get('took')} ms")
+
+    @staticmethod
+    def _merge_docvalue_fields(hits: List[Dict[str, Any]]):
+        """Подстановка скалярных полей из doc values в _source (потребители читают только _source)"""
+        for hit in hits:
+            source = hit.setdefault("_source", {})
+            for field, values in hit.get("fields", {}).items():
+                if field not in source and values:
+                    source[field] = values[0] if len(values) == 1 else values
+
+    async def put_mapping(self, index_name: str, properties: Dict[str, Any]) -> bool:
+        """Добавление полей в маппинг существующего индекса"""
+        try:
+            client = await self._get_client()
+            await client.indices.put_mapping(index=index_name, properties=properties)
+            logger.info(f"✅ Mapping of {index_name} updated: {list(properties)}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error updating mapping of {index_name}: {e}")
+            return False
+
+    async def update_document(self, index_name: str, doc_id: str, fields: Dict[str, Any]) -> bool:
+        """Частичное обновление документа (только переданные поля)"""
+        try:
+            client = await self._get_client()
+            response = await client.update(index=index_name, id=doc_id, doc=fields)
+            return response.get("result") in ["updated", "noop"]
+
+        except Exception as e:
+            logger.error(f"❌ Error updating document {doc_id} in {index_name}: {e}")
+            return False
+
+    async def iter_documents(
+            self,
+            index_name: str,
+            query: Dict[str, Any] = None,
+            batch_size: int = 1000,
+            keep_alive: str = "5m",
+            sort: List[Any] = None,
+            search_after: List[Any] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Обход всех документов индекса пачками (point in time + search_after)
+
+        Чтобы продолжить прерванный обход, нужна сортировка по уникальному полю (sort)
+        и значения sort последнего обработанного документа (search_after)
+        """
+        client = await self._get_client()
+        pit_id = None
+        try:
+            pit = await client.open_point_in_time(index=index_name, keep_alive=keep_alive)
+            pit_id = pit["id"]
+
+            while True:
+                body = {
+                    "query": query or {"match_all": {}},
+                    "size": batch_size,
+                    "pit": {"id": pit_id, "keep_alive": keep_alive},
+                    "sort": sort or ["_shard_doc"],
+                }
+                if search_after is not None:
+                    body["search_after"] = search_after
+
+                response = await client.search(body=body)
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                if not hits:
+                    break
+
+                yield hits
+                search_after = hits[-1]["sort"]
+
+        except Exception as e:
+            # Пробрасываем: вызывающему важно отличить обрыв обхода от его окончания (чекпоинт)
+            logger.error(f"❌ Error iterating documents of {index_name}: {e}")
+            raise
+
+        finally:
+            if pit_id is not None:
+                try:
+                    await client.close_point_in_time(id=pit_id)
+                except Exception as e:
+                    logger.warning(f"⚠️ Error closing point in time: {e}")
+
+    async def bulk(
+            self,
+            actions: List[Dict[str, Any]],
+            chunk_size: int = settings.ES_BULK_CHUNK_SIZE
+    ) -> Tuple[int, List[Tuple[Dict[str, Any], int]]]:
+        """Пакетная запись (index/update/delete); возвращает (кол-во успешных, [(действие, статус ошибки)])
+
+        Статус 0 - документ не записан из-за сетевой ошибки. Ответы 429 повторяет сам helpers
+        """
+        done = set()
+        success = 0
+        failed = []
+        by_id = {action["_id"]: action for action in actions}
+        try:
+            client = await self._get_client()
+            async for ok, item in helpers.async_streaming_bulk(
+                client,
+                actions,
+                chunk_size=chunk_size,
+                max_retries=settings.ES_BULK_MAX_RETRIES,
+                raise_on_error=False,
+                raise_on_exception=False,
+            ):
+                info = next(iter(item.values()))
+                doc_id = info.get("_id")
+                done.add(doc_id)
+                if ok:
+                    success += 1
+                elif doc_id in by_id:
+                    logger.debug(f"⚠️ Bulk item {doc_id} failed: {info.get('error')}")
+                    failed.append((by_id[doc_id], info.get("status") or 0))
+
+        except Exception as e:
+            logger.error(f"❌ Bulk request error: {e}")
+            failed.extend((action, 0) for doc_id, action in by_id.items() if doc_id not in done)
+
+        return success, failed
+
+    async def get_index(self, index_name: str) -> Dict[str, Any]:
+        """Маппинг, настройки и алиасы индекса (или всех индексов за алиасом)"""
+        try:
+            client = await self._get_client()
+            response = await client.indices.get(index=index_name)
+            return response.body
+
+        except Exception as e:
+            logger.error(f"❌ Error getting index {index_name}: {e}")
+            return {}
+
+    async def get_alias_indices(self, alias: str) -> List[str]:
+        """Индексы, на которые указывает алиас (пусто, если алиаса нет)"""
+        try:
+            client = await self._get_client()
+            if not await client.indices.exists_alias(name=alias):
+                return []
+            response = await client.indices.get_alias(name=alias)
+            return list(response.body)
+
+        except Exception as e:
+            logger.error(f"❌ Error getting alias {alias}: {e}")
+            return []
+
+    async def update_aliases(self, actions: List[Dict[str, Any]]) -> bool:
+        """Атомарное изменение алиасов"""
+        try:
+            client = await self._get_client()
+            await client.indices.update_aliases(actions=actions)
+            logger.info(f"✅ Aliases updated: {actions}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error updating aliases: {e}")
+            return False
+
+    async def put_settings(self, index_name: str, index_settings: Dict[str, Any]) -> bool:
+        """Изменение динамических настроек индекса"""
+        try:
+            client = await self._get_client()
+            await client.indices.put_settings(index=index_name, settings=index_settings)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error updating settings of {index_name}: {e}")
+            return False
+
+    async def refresh(self, index_name: str) -> bool:
+        """Принудительный refresh индекса"""
+        try:
+            client = await self._get_client()
+            await client.indices.refresh(index=index_name)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error refreshing {index_name}: {e}")
+            return False
@@ -1,13 +1,22 @@
-from typing import Optional, List, Sequence, Dict, Any, Union
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, List, Sequence, Dict, Any, Union, Type
 
 from fastapi import Depends
-from sqlalchemy import insert, update
+from sqlalchemy import insert, update, delete, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import select, text
 
 from app.core.logger import get_logger
+from app.core.settings import settings
+from app.models.cache import ParsedAttributeCache
+from app.models.results import PositionWrite
 from app.models.tenders import (
+    Base,
     TenderPositions,
     TenderPositionAttributesMatches,
     Matches,
@@ -16,6 +25,53 @@ from app.models.tenders import (
 
 logger = get_logger(name=__name__)
 
+
+@dataclass
+class PositionResultRows:
+    """Строки результата одной позиции: пишутся вместе с увеличением счетчика обработанных позиций"""
+    tender_id: int
+    tender_position_id: int
+    matches: List[Dict[str, Any]] = field(default_factory=list)
+    attribute_matches: List[Dict[str, Any]] = field(default_factory=list)
+    # Идентификатор доставки сообщения: при повторной доставке строки позиции заменяются, счетчик не растет
+    delivery_id: Optional[str] = None
+
+
+@dataclass
+class WriteMetrics:
+    """Метрики транзакций записи результатов (для /healthz/db)"""
+    transactions: int = 0
+    failed: int = 0
+    positions: int = 0
+    rows: int = 0
+    commit_time: float = 0.0
+    max_commit_latency: float = 0.0
+    total_time: float = 0.0
+
+    def record(self, positions: int, rows: int, commit_latency: float, total_latency: float):
+        self.transactions += 1
+        self.positions += positions
+        self.rows += rows
+        self.commit_time += commit_latency
+        self.max_commit_latency = max(self.max_commit_latency, commit_latency)
+        self.total_time += total_latency
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "transactions": self.transactions,
+            "failed": self.failed,
+            "positions_per_transaction": round(self.positions / self.transactions, 2) if self.transactions else 0.0,
+            "rows_per_transaction": round(self.rows / self.transactions, 1) if self.transactions else 0.0,
+            "avg_commit_latency_sec": round(self.commit_time / self.transactions, 4) if self.transactions else 0.0,
+            "max_commit_latency_sec": round(self.max_commit_latency, 4),
+            "avg_transaction_sec": round(self.total_time / self.transactions, 4) if self.transactions else 0.0,
+        }
+
+
+# Метрики записи результатов по всем сессиям воркера
+write_metrics = WriteMetrics()
+
+
 class PostgresRepository:
     def __init__(self, session: AsyncSession):
         self.db = session
@@ -143,6 +199,174 @@ class PostgresRepository:
             logger.error(f"Ошибка батчевого создания соответствий тендера: {e}")
             return None
 
+    async def save_positions_results(self, positions: List[PositionResultRows]) -> Dict[int, int] | None:
+        """Unit of work: счетчики обработанных позиций, соответствия и соответствия атрибутов одной транзакцией
+
+        Позиции можно передавать пачкой - тогда на все один commit. Возвращает номер обработки
+        по tender_position_id (у повторно доставленных позиций номера нет); None - транзакция откатана,
+        не записано ничего
+        """
+        if not positions:
+            return {}
+
+        ts = time.perf_counter()
+        try:
+            # Позиции, уже записанные прошлой доставкой того же сообщения, не считаются заново
+            repeated = await self._replace_delivered_positions(positions)
+
+            position_ids_by_tender = defaultdict(list)
+            for position in positions:
+                if position.tender_position_id not in repeated:
+                    position_ids_by_tender[position.tender_id].append(position.tender_position_id)
+
+            # Один UPDATE на тендер; тендеры по порядку id, чтобы параллельные транзакции не ловили взаимоблокировку
+            position_numbers = {}
+            for tender_id in sorted(position_ids_by_tender):
+                position_ids = position_ids_by_tender[tender_id]
+                stmt = (
+                    update(TenderInfo)
+                    .where(TenderInfo.id == tender_id)
+                    .values(processed_positions=TenderInfo.processed_positions + len(position_ids))
+                    .returning(TenderInfo.processed_positions)
+                )
+                last_number = (await self.db.execute(stmt)).scalar()
+                if last_number is not None:
+                    first_number = last_number - len(position_ids) + 1
+                    position_numbers.update(
+                        {position_id: first_number + i for i, position_id in enumerate(position_ids)}
+                    )
+
+            rows = len(position_ids_by_tender)
+            rows += await self._bulk_insert(Matches, [row for position in positions for row in position.matches])
+            rows += await self._bulk_insert(
+                TenderPositionAttributesMatches, [row for position in positions for row in position.attribute_matches]
+            )
+
+            ts_commit = time.perf_counter()
+            await self.db.commit()
+            commit_latency = time.perf_counter() - ts_commit
+
+            write_metrics.record(len(positions), rows, commit_latency, time.perf_counter() - ts)
+            return position_numbers
+
+        except Exception as e:
+            await self.db.rollback()
+            write_metrics.failed += 1
+            logger.error(f"Ошибка записи результатов позиций {[p.tender_position_id for p in positions]}: {e}")
+            return None
+
+    async def _replace_delivered_positions(self, positions: List[PositionResultRows]) -> set:
+        """Отметка позиций записанными в рамках доставки; для уже отмеченных - удаление прежних строк
+
+        Возвращает id позиций, которые эта доставка уже записывала (в той же транзакции, что и запись)
+        """
+        marks = [
+            {"delivery_id": position.delivery_id, "tender_position_id": position.tender_position_id}
+            for position in positions
+            if position.delivery_id
+        ]
+        if not marks:
+            return set()
+
+        stmt = (
+            pg_insert(PositionWrite)
+            .values(marks)
+            .on_conflict_do_nothing(index_elements=[PositionWrite.delivery_id, PositionWrite.tender_position_id])
+            .returning(PositionWrite.tender_position_id)
+        )
+        inserted = set((await self.db.execute(stmt)).scalars().all())
+        repeated = {mark["tender_position_id"] for mark in marks} - inserted
+        if repeated:
+            repeated_ids = sorted(repeated)
+            await self.db.execute(delete(Matches).where(Matches.tender_position_id.in_(repeated_ids)))
+            await self.db.execute(
+                delete(TenderPositionAttributesMatches).where(
+                    TenderPositionAttributesMatches.tender_position_id.in_(repeated_ids)
+                )
+            )
+            logger.warning(f"♻️ Повторная доставка: соответствия позиций {repeated_ids} перезаписаны")
+        return repeated
+
+    async def delete_stale_position_writes(self, min_created_at: datetime) -> int | None:
+        """Удаление отметок записи позиций старше TTL (повторных доставок таких сообщений уже не будет)"""
+        try:
+            result = await self.db.execute(delete(PositionWrite).where(PositionWrite.created_at < min_created_at))
+            await self.db.commit()
+            return result.rowcount
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Ошибка очистки отметок записи позиций: {e}")
+            return None
+
+    async def bulk_insert_tender_matches(self, matches_data: List[Dict[str, Any]]) -> int | None:
+        """Массовая запись соответствий тендера через COPY/executemany (без ORM-объектов на каждую строку)"""
+        try:
+            written = await self._bulk_insert(Matches, matches_data)
+            await self.db.commit()
+            return written
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Ошибка массовой записи соответствий тендера: {e}")
+            return None
+
+    async def bulk_insert_position_attribute_matches(self, matches_data: List[Dict[str, Any]]) -> int | None:
+        """Массовая запись соответствий атрибутов пачками (число строк не упирается в лимит параметров запроса)"""
+        try:
+            written = await self._bulk_insert(TenderPositionAttributesMatches, matches_data)
+            await self.db.commit()
+            return written
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Ошибка массовой записи соответствий атрибутов: {e}")
+            return None
+
+    async def _bulk_insert(
+        self, model: Type[Base], rows: List[Dict[str, Any]], chunk_size: int = settings.PG_BULK_CHUNK_SIZE
+    ) -> int:
+        """Вставка строк пачками в текущей транзакции сессии (без commit); исключения пробрасываются"""
+        if not rows:
+            return 0
+
+        ts = time.perf_counter()
+        table = model.__table__
+        # Только переданные колонки: остальные (id, server_default) заполнит сама БД
+        columns = [column.name for column in table.columns if column.name in rows[0]]
+
+        connection = await self.db.connection()
+        driver_connection = None
+        if settings.PG_COPY_ENABLED:
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = getattr(raw_connection, "driver_connection", None)
+            if not hasattr(driver_connection, "copy_records_to_table"):
+                driver_connection = None
+
+        if driver_connection is not None:
+            # COPY идет мимо SQLAlchemy: транзакция сессии должна быть открыта, иначе каждая пачка зафиксируется сама
+            if not driver_connection.is_in_transaction():
+                await connection.exec_driver_sql("SELECT 1")
+            for chunk_start in range(0, len(rows), chunk_size):
+                records = [
+                    tuple(row.get(column) for column in columns)
+                    for row in rows[chunk_start:chunk_start + chunk_size]
+                ]
+                await driver_connection.copy_records_to_table(
+                    table.name, records=records, columns=columns, schema_name=table.schema
+                )
+            method = "COPY"
+        else:
+            for chunk_start in range(0, len(rows), chunk_size):
+                chunk = [{column: row.get(column) for column in columns} for row in rows[chunk_start:chunk_start + chunk_size]]
+                await self.db.execute(insert(model), chunk)
+            method = "executemany"
+
+        elapsed = time.perf_counter() - ts
+        rows_per_sec = round(len(rows) / elapsed) if elapsed > 0 else 0
+        logger.info(f"💾 {table.name}: {len(rows)} строк за {elapsed:.3f} сек ({rows_per_sec} строк/сек, {method})")
+        return len(rows)
+
     async def increment_processed_positions(self, tender_id: int) -> Union[int, None]:
         """Увеличивает поле processed_positions на 1 для указанного тендера"""
         try:
@@ -164,3 +388,58 @@ class PostgresRepository:
                 f"Ошибка увеличения processed_positions для тендера {tender_id}: {e}"
             )
             return None
+
+    async def get_parsed_attributes(
+        self, keys: List[str], version: str, min_created_at: datetime
+    ) -> Dict[str, dict]:
+        """Разобранные атрибуты из постоянного кэша по ключам (только актуальной версии и не старше TTL)"""
+        try:
+            stmt = select(ParsedAttributeCache.key, ParsedAttributeCache.parsed).where(
+                ParsedAttributeCache.key.in_(keys),
+                ParsedAttributeCache.version == version,
+                ParsedAttributeCache.created_at >= min_created_at,
+            )
+            result = await self.db.execute(stmt)
+            return {row.key: row.parsed for row in result}
+
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша разобранных атрибутов: {e}")
+            return {}
+
+    async def save_parsed_attributes(self, rows: List[Dict[str, Any]]) -> bool:
+        """Сохранение разобранных атрибутов в постоянный кэш (повторный ключ перезаписывается)"""
+        if not rows:
+            return True
+
+        try:
+            stmt = pg_insert(ParsedAttributeCache).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ParsedAttributeCache.key],
+                set_={"parsed": stmt.excluded.parsed, "version": stmt.excluded.version, "created_at": func.now()},
+            )
+            await self.db.execute(stmt)
+            await self.db.commit()
+            return True
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Ошибка сохранения кэша разобранных атрибутов: {e}")
+            return False
+
+    async def delete_stale_parsed_attributes(self, version: str, min_created_at: datetime) -> int | None:
+        """Удаление из кэша записей другой версии стандартизатора и старше TTL"""
+        try:
+            stmt = delete(ParsedAttributeCache).where(
+                or_(
+                    ParsedAttributeCache.version != version,
+                    ParsedAttributeCache.created_at < min_created_at,
+                )
+            )
+            result = await self.db.execute(stmt)
+            await self.db.commit()
+            return result.rowcount
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Ошибка очистки кэша разобранных атрибутов: {e}")
+            return None
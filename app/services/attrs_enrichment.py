@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+from typing import Dict, List, Optional
+
+from app.core.connection_pool import connection_pool
+from app.core.logger import get_logger
+from app.core.model_registry import model_registry
+from app.core.settings import settings
+from app.repository.elastic import ElasticRepository
+from app.services.es_reindex import BulkReindexer
+from app.services.shrinker.shrinker_products_service import ShrinkerProducts
+
+logger = get_logger(name=__name__)
+
+# Признаки хранятся только в _source: по ним не ищут, поэтому не индексируются
+FEATURES_MAPPING = {
+    "features_version": {"type": "integer"},
+    "attributes": {
+        "properties": {
+            "features": {"type": "object", "enabled": False},
+        }
+    },
+}
+
+
+class AttrsEnricher:
+    """Офлайн обогащение документов ES предвычисленными признаками атрибутов (тип, значение, единица, леммы)"""
+
+    def __init__(
+        self,
+        es_repo: Optional[ElasticRepository] = None,
+        shrinker_products: Optional[ShrinkerProducts] = None,
+        reindexer: Optional[BulkReindexer] = None,
+    ):
+        self.es_repo = es_repo or ElasticRepository()
+        self.reindexer = reindexer or BulkReindexer(es_repo=self.es_repo)
+        self.shrinker_products = shrinker_products or ShrinkerProducts(
+            vectorizer=model_registry.vectorizer,
+            attrs_sorter=model_registry.attrs_sorter,
+            unit_normalizer=model_registry.unit_normalizer,
+            trigrammer=model_registry.trigrammer,
+            lemmatizator=model_registry.lemmatizator,
+            stemmer=model_registry.stemmer,
+        )
+
+    async def enrich_source(self, source: Dict) -> Dict:
+        """Атрибуты документа с признаками - те же, что ShrinkerProducts вычисляет при скоринге"""
+        attributes = []
+        for attr in source.get("attributes", []) or []:
+            attr = dict(attr)
+            try:
+                parsed = await self.shrinker_products.parse_candidate_attr(attr)
+                attr["features"] = parsed.to_features()
+            except Exception as e:
+                # Без признаков атрибут распарсится при скоринге как раньше
+                logger.error(f"Ошибка вычисления признаков атрибута {attr.get('original_name')}: {e}")
+                attr.pop("features", None)
+            attributes.append(attr)
+
+        return {"attributes": attributes, "features_version": settings.ES_FEATURES_VERSION}
+
+    async def enrich_batch(self, hits: List[Dict], full_documents: bool = False) -> List[Optional[Dict]]:
+        """Признаки для пачки документов (full_documents - весь документ для записи в новый индекс)"""
+        # Значения с единицами всей пачки разрешаются параллельно до нормализации
+        await self.shrinker_products.unit_normalizer.prefetch(
+            self.shrinker_products.collect_candidate_unit_values(hits)
+        )
+
+        documents = []
+        for hit in hits:
+            source = hit["_source"]
+            if full_documents and self.shrinker_products.has_features(source):
+                # Уже обогащен актуальной версией - переносим как есть
+                documents.append(source)
+                continue
+            enriched = await self.enrich_source(source)
+            documents.append({**source, **enriched} if full_documents else enriched)
+        return documents
+
+    async def run(self, index_name: str = settings.ES_INDEX, only_missing: bool = True, resume: bool = True) -> Dict:
+        """Обогащение индекса на месте; only_missing - только документы без признаков актуальной версии"""
+        if not await self.es_repo.put_mapping(index_name, FEATURES_MAPPING):
+            return {"completed": False}
+
+        query = None
+        if only_missing:
+            query = {"bool": {"must_not": {"term": {"features_version": settings.ES_FEATURES_VERSION}}}}
+
+        return await self.reindexer.run(
+            job=f"enrich_{index_name}",
+            source_index=index_name,
+            transform=self.enrich_batch,
+            query=query,
+            op_type="update",
+            resume=resume,
+        )
+
+    async def rebuild(self, alias: str = settings.ES_INDEX, remove_old_index: bool = False) -> Dict:
+        """Обогащение через запись в новый индекс и переключение алиаса (без нагрузки обновлениями на рабочий индекс)"""
+
+        async def transform(hits: List[Dict]) -> List[Optional[Dict]]:
+            return await self.enrich_batch(hits, full_documents=True)
+
+        return await self.reindexer.rebuild(
+            alias=alias,
+            transform=transform,
+            mapping_properties=FEATURES_MAPPING,
+            remove_old_index=remove_old_index,
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Обогащение индекса ES признаками атрибутов")
+    parser.add_argument("--index", default=settings.ES_INDEX)
+    parser.add_argument("--all", action="store_true", help="пересчитать и уже обогащенные документы")
+    parser.add_argument("--restart", action="store_true", help="начать заново, игнорируя чекпоинт")
+    parser.add_argument("--rebuild", action="store_true", help="записать в новый индекс и переключить алиас")
+    parser.add_argument("--remove-old-index", action="store_true", help="удалить старый индекс при переключении")
+    args = parser.parse_args()
+
+    try:
+        enricher = AttrsEnricher()
+        if args.rebuild:
+            await enricher.rebuild(args.index, remove_old_index=args.remove_old_index)
+        else:
+            await enricher.run(args.index, only_missing=not args.all, resume=not args.restart)
+    finally:
+        await connection_pool.close_all()
+        model_registry.unload_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,13 @@
+import asyncio
+import copy
 import logging
+import time
+from typing import Dict, List, Optional
 
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.core.connection_pool import connection_pool
+from app.services.text_cache import TextCache
 
 logger = get_logger(name=__name__)
 
@@ -10,13 +15,129 @@ logger = get_logger(name=__name__)
 class AttrsStandardizer:
     def __init__(self, api_url=settings.SERVICE_LINK_ATTRS_STANDARDIZER):
         self.api_url = api_url
+        # Результаты разбора по исходной строке "name: value unit" - одинаковые характеристики частые у типовых товаров
+        self._cache = TextCache(max_size=settings.ATTRS_STANDARDIZER_CACHE_SIZE, name="attrs_standardizer")
+        # Строки, которые сервис разобрать не смог: срок, до которого их не переспрашиваем
+        self._empty = TextCache(max_size=settings.ATTRS_STANDARDIZER_CACHE_SIZE, name="attrs_standardizer_empty")
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._semaphore = asyncio.Semaphore(settings.ATTRS_STANDARDIZER_CONCURRENCY)
+        self.batches_sent = 0
+        self.strings_sent = 0
+        self.fallback_calls = 0
 
     async def extract_attr_data(self, string_to_handle: str):
+        cached = self._cache.get(string_to_handle)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        if self._known_empty(string_to_handle):
+            return []
+
+        result = await self._post_single(string_to_handle)
+        if result:
+            self._cache.set(string_to_handle, copy.deepcopy(result))
+        return result
+
+    async def extract_attr_data_batch(self, strings: List[str]) -> List[Optional[List[Dict]]]:
+        """Разбор списка строк: из кэша, недостающие - пачками по одному запросу; ответы по индексу строки"""
+        results: Dict[str, Optional[List[Dict]]] = {}
+        pending = []
+        waiters = {}
+
+        for string in dict.fromkeys(strings):
+            cached = self._cache.get(string)
+            if cached is not None:
+                results[string] = cached
+            elif self._known_empty(string):
+                results[string] = None
+            elif string in self._in_flight:
+                # Ту же строку уже разбирает другая позиция - ждем ее ответ
+                waiters[string] = self._in_flight[string]
+            else:
+                self._in_flight[string] = asyncio.get_running_loop().create_future()
+                pending.append(string)
+
+        if pending:
+            try:
+                results.update(await self._resolve(pending))
+            finally:
+                # Ответы отдаются ожидающим по мере готовности пачек; здесь - недоразобранные (ошибка, отмена)
+                for string in pending:
+                    self._complete(string, None)
+
+        if waiters:
+            for string, result in zip(waiters, await asyncio.gather(*waiters.values(), return_exceptions=True)):
+                results[string] = None if isinstance(result, BaseException) else result
+
+        # Копии: разобранные атрибуты дальше изменяются при нормализации единиц
+        return [copy.deepcopy(results.get(string)) if results.get(string) else None for string in strings]
+
+    async def _resolve(self, strings: List[str]) -> Dict[str, List[Dict]]:
+        """Запрос разбора пачками параллельно (с ограничением конкурентности)"""
+        chunks = [
+            strings[chunk_start:chunk_start + settings.ATTRS_STANDARDIZER_BATCH_SIZE]
+            for chunk_start in range(0, len(strings), settings.ATTRS_STANDARDIZER_BATCH_SIZE)
+        ]
+        resolved = {}
+        for chunk_resolved in await asyncio.gather(*[self._resolve_chunk(chunk) for chunk in chunks]):
+            resolved.update(chunk_resolved)
+        return resolved
+
+    async def _resolve_chunk(self, chunk: List[str]) -> Dict[str, List[Dict]]:
+        """Разбор одной пачки; строки, не разобранные в пачке, повторяются по одной"""
+        self.batches_sent += 1
+        self.strings_sent += len(chunk)
+        async with self._semaphore:
+            response = await self._post(chunk)
+
+        resolved = {}
+        failed = []
+        if not isinstance(response, list) or len(response) != len(chunk):
+            logger.warning(f"⚠️ Пакетный разбор не удался для {len(chunk)} строк, повторяем по одной")
+            failed = list(chunk)
+        else:
+            for string, item in zip(chunk, response):
+                # Ответ на строку - разобранный атрибут (как в ответе на одиночный запрос - список из одного)
+                parsed = ([item] if item else None) if isinstance(item, dict) else item
+                if parsed:
+                    resolved[string] = parsed
+                    self._complete(string, parsed)
+                else:
+                    failed.append(string)
+
+        if failed:
+            self.fallback_calls += len(failed)
+            for string, parsed in zip(failed, await asyncio.gather(*[self._post_single(string) for string in failed])):
+                if parsed:
+                    resolved[string] = parsed
+                self._complete(string, parsed or None)
+
+        return resolved
+
+    def _complete(self, string: str, parsed: Optional[List[Dict]]):
+        """Ответ по строке: в кэш и позициям, которые ждут эту строку"""
+        if parsed:
+            self._cache.set(string, copy.deepcopy(parsed))
+        future = self._in_flight.pop(string, None)
+        if future is not None and not future.done():
+            future.set_result(parsed)
+
+    async def _post_single(self, string: str):
+        """Одиночный запрос; пустой ответ сервиса запоминается на ATTRS_STANDARDIZER_EMPTY_TTL секунд"""
+        async with self._semaphore:
+            parsed = await self._post([string])
+        if parsed is not None and not parsed:
+            self._empty.set(string, time.monotonic() + settings.ATTRS_STANDARDIZER_EMPTY_TTL)
+        return parsed
+
+    def _known_empty(self, string: str) -> bool:
+        expires_at = self._empty.get(string)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    async def _post(self, payload: List[str]):
         for attempt in range(1, 4):
             try:
                 session = await connection_pool.get_http_session('attrs_standardizer')
                 url = f"{self.api_url}/standardize"
-                payload = [string_to_handle]
 
                 async with session.post(url, json=payload) as response:
                     if response.status == 200:
@@ -31,4 +152,14 @@ class AttrsStandardizer:
             except Exception as e:
                 logger.error(f"Ошибка при вычленении сущностей из названия и значения характеристики, попытка {attempt}: {e}")
                 continue
-        return None
\ No newline at end of file
+        return None
+
+    def get_cache_stats(self) -> dict:
+        """Статистика кэша разбора и пакетных запросов"""
+        return {
+            **self._cache.get_stats(),
+            "batches_sent": self.batches_sent,
+            "avg_batch_size": round(self.strings_sent / self.batches_sent, 1) if self.batches_sent else 0.0,
+            "fallback_calls": self.fallback_calls,
+            "empty_cached": len(self._empty),
+        }
@@ -0,0 +1,145 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.core.logger import get_logger
+
+logger = get_logger(name=__name__)
+
+
+class VectorCache:
+    """LRU кэш нормализованных эмбеддингов строк в одной NumPy матрице (строки матрицы переиспользуются при вытеснении)"""
+
+    def __init__(self, max_size: int, name: str = "vectors"):
+        self.name = name
+        self.max_size = max_size
+        # Строка -> номер строки матрицы, в порядке давности использования
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._allocated = 0
+        self._matrix: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._index
+
+    def missing(self, texts: Iterable[str]) -> List[str]:
+        """Строки, для которых еще нет вектора (без дублей, с сохранением порядка)"""
+        return [text for text in dict.fromkeys(texts) if text not in self._index]
+
+    def add(self, texts: List[str], vectors: np.ndarray) -> np.ndarray:
+        """Добавление векторов с вытеснением давно не использованных; возвращает нормированные векторы
+
+        Векторы нормируются по L2, чтобы скалярное произведение = косинус. Если строк больше max_size,
+        в кэше остаются последние, но возвращаются векторы для всех
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError(f"Некорректная форма эмбеддингов: {vectors.shape} для {len(texts)} строк")
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.max_size <= 0:
+            return vectors
+
+        with self._lock:
+            if self._matrix.shape[1] not in (0, vectors.shape[1]):
+                raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с кэшем {self._matrix.shape[1]}")
+
+            start = max(len(texts) - self.max_size, 0)
+            for text, vector in zip(texts[start:], vectors[start:]):
+                row = self._index.get(text)
+                if row is None:
+                    row = self._allocate_row(vectors.shape[1])
+                    self._index[text] = row
+                self._index.move_to_end(text)
+                self._matrix[row] = vector
+
+        return vectors
+
+    def _allocate_row(self, dim: int) -> int:
+        """Свободная строка матрицы: новая или занятая самой давно использованной строкой"""
+        if self._allocated < self.max_size:
+            if self._matrix.shape[0] <= self._allocated:
+                # Растим матрицу с запасом, чтобы не копировать ее на каждое добавление
+                capacity = min(max(self._matrix.shape[0] * 2, 1024), self.max_size)
+                grown = np.zeros((capacity, dim), dtype=np.float32)
+                if self._allocated:
+                    grown[:self._allocated] = self._matrix[:self._allocated]
+                self._matrix = grown
+            self._allocated += 1
+            return self._allocated - 1
+
+        _, row = self._index.popitem(last=False)
+        self.evicted += 1
+        return row
+
+    def lookup(self, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Векторы строк, которые есть в кэше (копии - последующее вытеснение их не затрагивает)"""
+        with self._lock:
+            present = [text for text in dict.fromkeys(texts) if text in self._index]
+            for text in present:
+                self._index.move_to_end(text)
+            rows = self._matrix[[self._index[text] for text in present]]
+        return dict(zip(present, rows))
+
+    def load(self, path: str) -> int:
+        """Загрузка векторов с диска (.npz со строками и матрицей)"""
+        if not path or not os.path.exists(path):
+            return 0
+
+        try:
+            data = np.load(path, allow_pickle=False)
+            texts = [str(text) for text in data["texts"]]
+            self.add(texts, data["vectors"])
+            logger.info(f"♻️ Кэш векторов '{self.name}' загружен с диска: {len(texts)} строк")
+            return len(texts)
+
+        except Exception as e:
+            logger.error(f"Ошибка загрузки кэша векторов '{self.name}' из {path}: {e}")
+            return 0
+
+    def dump(self, path: str) -> bool:
+        """Сохранение векторов на диск"""
+        if not path or not self._index:
+            return False
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._lock:
+                texts = np.array(list(self._index.keys()))
+                vectors = self._matrix[list(self._index.values())]
+
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path, texts=texts, vectors=vectors)
+            os.replace(tmp_path, path)
+
+            logger.info(f"💾 Кэш векторов '{self.name}' сохранен на диск: {len(texts)} строк")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша векторов '{self.name}' в {path}: {e}")
+            return False
+
+
+class HashingEmbedder:
+    """Локальная замена модели эмбеддингов: хэширование символьных триграмм (для тестов и офлайна)"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            padded = f" {text} "
+            for j in range(max(len(padded) - 2, 0)):
+                # crc32 вместо hash(): одинаковый результат во всех процессах
+                vectors[i, zlib.crc32(padded[j:j + 3].encode("utf-8")) % self.dim] += 1.0
+        return vectors
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.logger import get_logger
+from app.core.settings import settings
+from app.repository.elastic import ElasticRepository
+
+logger = get_logger(name=__name__)
+
+# Пачка документов ES -> документы для записи (None - документ пропускается)
+BatchTransform = Callable[[List[Dict]], Awaitable[List[Optional[Dict]]]]
+
+
+def _is_retryable(status: int) -> bool:
+    # 0 - сетевая ошибка, 429 - перегрузка, 5xx - ошибка на стороне кластера; 4xx повторять бессмысленно
+    return status == 0 or status == 429 or status >= 500
+
+
+def _merge(base: Dict, extra: Dict) -> Dict:
+    """Рекурсивное слияние словарей маппинга (extra дополняет base)"""
+    merged = dict(base)
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class ReindexCheckpoint:
+    """Чекпоинт прохода по индексу: sort последнего записанного документа и статистика"""
+
+    def __init__(self, job: str, directory: str = settings.ES_REINDEX_CHECKPOINT_DIR):
+        self.path = Path(directory) / f"{job}.json"
+
+    def load(self) -> Optional[Dict]:
+        try:
+            if self.path.exists():
+                return json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения чекпоинта {self.path}: {e}")
+        return None
+
+    def save(self, state: Dict):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Через временный файл, чтобы обрыв процесса не оставил битый чекпоинт
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи чекпоинта {self.path}: {e}")
+
+    def clear(self):
+        try:
+            self.path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления чекпоинта {self.path}: {e}")
+
+
+class BulkReindexer:
+    """Потоковая переиндексация/обогащение: чтение search_after + PIT, запись bulk-пачками с повторами"""
+
+    def __init__(
+        self,
+        es_repo: Optional[ElasticRepository] = None,
+        batch_size: int = settings.ES_REINDEX_BATCH_SIZE,
+        chunk_size: int = settings.ES_BULK_CHUNK_SIZE,
+        concurrency: int = settings.ES_BULK_CONCURRENCY,
+        max_retries: int = settings.ES_BULK_MAX_RETRIES,
+        retry_backoff: float = settings.ES_BULK_RETRY_BACKOFF,
+    ):
+        self.es_repo = es_repo or ElasticRepository()
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.concurrency = max(concurrency, 1)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    async def run(
+        self,
+        job: str,
+        source_index: str,
+        dest_index: Optional[str] = None,
+        transform: Optional[BatchTransform] = None,
+        query: Optional[Dict] = None,
+        op_type: str = "index",
+        resume: bool = True,
+    ) -> Dict:
+        """Проход по source_index с записью в dest_index (update без dest_index - обновление на месте)
+
+        Прерванный проход с тем же job продолжается с чекпоинта (resume=False - начать заново)
+        """
+        ts = time.perf_counter()
+        checkpoint = ReindexCheckpoint(job)
+        job_key = {"source": source_index, "dest": dest_index, "op_type": op_type}
+
+        state = checkpoint.load() if resume else None
+        if state and {key: state.get(key) for key in job_key} != job_key:
+            logger.warning(f"⚠️ Чекпоинт {job} от другого прохода ({state}) - начинаем заново")
+            state = None
+
+        search_after = state["search_after"] if state else None
+        stats = state["stats"] if state else {"read": 0, "written": 0, "skipped": 0, "failed": 0}
+        if state:
+            logger.info(f"🔁 Продолжаем {job} с чекпоинта: {stats}")
+        read_before = stats["read"]
+
+        # Пачки пишутся параллельно, но чекпоинт двигается строго по порядку чтения
+        pending: deque = deque()
+        completed = False
+        try:
+            async for hits in self.es_repo.iter_documents(
+                source_index,
+                query=query,
+                batch_size=self.batch_size,
+                sort=[{settings.ES_REINDEX_SORT_FIELD: "asc"}],
+                search_after=search_after,
+            ):
+                task = asyncio.create_task(self._write_batch(hits, dest_index, transform, op_type))
+                pending.append((task, len(hits), hits[-1]["sort"]))
+
+                while len(pending) >= self.concurrency:
+                    await self._complete(pending.popleft(), job, job_key, stats, checkpoint)
+
+            while pending:
+                await self._complete(pending.popleft(), job, job_key, stats, checkpoint)
+            completed = True
+
+        except Exception as e:
+            logger.error(f"❌ Проход {job} прерван, продолжится с чекпоинта: {e}")
+            for task, _, _ in pending:
+                task.cancel()
+
+        if completed:
+            checkpoint.clear()
+
+        elapsed = time.perf_counter() - ts
+        result = dict(stats)
+        result["completed"] = completed
+        result["elapsed_sec"] = round(elapsed, 2)
+        result["docs_per_sec"] = round((stats["read"] - read_before) / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(f"✅ Проход {job}: {result}")
+        return result
+
+    async def _complete(
+        self, pending_batch: Tuple[asyncio.Task, int, List[Any]], job: str, job_key: Dict, stats: Dict, checkpoint: ReindexCheckpoint
+    ):
+        task, read, last_sort = pending_batch
+        written, skipped, failed = await task
+
+        stats["read"] += read
+        stats["written"] += written
+        stats["skipped"] += skipped
+        stats["failed"] += failed
+        checkpoint.save({**job_key, "search_after": last_sort, "stats": stats})
+        logger.info(f"📦 {job}: прочитано {stats['read']}, записано {stats['written']}, ошибок {stats['failed']}")
+
+    async def _write_batch(
+        self, hits: List[Dict], dest_index: Optional[str], transform: Optional[BatchTransform], op_type: str
+    ) -> Tuple[int, int, int]:
+        """Запись одной пачки; возвращает (записано, пропущено, не записано)"""
+        try:
+            documents = await transform(hits) if transform else [hit["_source"] for hit in hits]
+        except Exception as e:
+            logger.error(f"❌ Ошибка преобразования пачки: {e}")
+            return 0, 0, len(hits)
+
+        actions = []
+        for hit, document in zip(hits, documents):
+            if document is None:
+                continue
+            action = {"_op_type": op_type, "_index": dest_index or hit["_index"], "_id": hit["_id"]}
+            if op_type == "update":
+                action["doc"] = document
+            else:
+                action["_source"] = document
+            actions.append(action)
+
+        written, failed = await self._bulk_with_retries(actions)
+        return written, len(hits) - len(actions), failed
+
+    async def _bulk_with_retries(self, actions: List[Dict]) -> Tuple[int, int]:
+        if not actions:
+            return 0, 0
+
+        written, failed = await self.es_repo.bulk(actions, chunk_size=self.chunk_size)
+        for attempt in range(self.max_retries):
+            retry = [action for action, status in failed if _is_retryable(status)]
+            if not retry:
+                break
+
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            logger.warning(f"🔄 Повтор bulk ({attempt + 1}/{self.max_retries}): {len(retry)} документов")
+            retry_written, retry_failed = await self.es_repo.bulk(retry, chunk_size=self.chunk_size)
+            written += retry_written
+            failed = [(action, status) for action, status in failed if not _is_retryable(status)] + retry_failed
+
+        if failed:
+            sample = [(action["_id"], status) for action, status in failed[:10]]
+            logger.error(f"❌ Не записано {len(failed)} документов, например: {sample}")
+
+        return written, len(failed)
+
+    async def rebuild(
+        self,
+        alias: str = settings.ES_INDEX,
+        transform: Optional[BatchTransform] = None,
+        mapping_properties: Optional[Dict] = None,
+        remove_old_index: bool = False,
+        resume: bool = True,
+    ) -> Dict:
+        """Переиндексация alias в новый индекс и атомарное переключение алиаса (без простоя поиска)
+
+        Поиск идет по старому индексу, пока новый не будет полностью записан и проверен
+        """
+        job = f"rebuild_{alias}"
+        state = ReindexCheckpoint(job).load() if resume else None
+
+        new_index = state.get("dest") if state else None
+        index_body = await self._index_body(alias, mapping_properties)
+        if not new_index or not await self.es_repo.index_exists(new_index):
+            new_index = f"{alias}_{time.strftime('%Y%m%d%H%M%S')}"
+            # На время загрузки без реплик и refresh - так bulk в разы быстрее
+            load_body = _merge(index_body, {"settings": {"number_of_replicas": 0, "refresh_interval": "-1"}})
+            if not await self.es_repo.create_index(new_index, load_body):
+                return {"completed": False, "index": new_index}
+
+        stats = await self.run(job, alias, dest_index=new_index, transform=transform, resume=resume)
+        stats["index"] = new_index
+        if not stats["completed"] or stats["failed"]:
+            logger.error(f"❌ Алиас {alias} не переключен: {new_index} записан не полностью")
+            return stats
+
+        await self.es_repo.put_settings(new_index, {
+            "number_of_replicas": index_body.get("settings", {}).get("number_of_replicas", 1),
+            "refresh_interval": None,
+        })
+        await self.es_repo.refresh(new_index)
+
+        count = await self.es_repo.get_document_count(new_index)
+        if count < stats["written"]:
+            logger.error(f"❌ Алиас {alias} не переключен: в {new_index} {count} документов из {stats['written']}")
+            return stats
+
+        stats["swapped"] = await self.swap_alias(alias, new_index, remove_old_index)
+        return stats
+
+    async def _index_body(self, alias: str, mapping_properties: Optional[Dict]) -> Dict:
+        """Маппинг и переносимые настройки текущего индекса за алиасом"""
+        indices = await self.es_repo.get_index(alias)
+        current = next(iter(indices.values()), {})
+        index_settings = current.get("settings", {}).get("index", {})
+
+        body = {
+            "mappings": current.get("mappings", {}),
+            "settings": {
+                key: index_settings[key]
+                for key in ("number_of_shards", "number_of_replicas", "analysis")
+                if key in index_settings
+            },
+        }
+        if mapping_properties:
+            body = _merge(body, {"mappings": {"properties": mapping_properties}})
+        return body
+
+    async def swap_alias(self, alias: str, new_index: str, remove_old_index: bool = False) -> bool:
+        """Атомарное переключение алиаса на new_index (remove_old_index - удалить старые индексы)"""
+        current = await self.es_repo.get_alias_indices(alias)
+        actions = []
+
+        if not current and await self.es_repo.index_exists(alias):
+            # Пока ES_INDEX - обычный индекс, алиас с тем же именем появится только вместе с его удалением
+            if not remove_old_index:
+                logger.error(f"❌ {alias} - индекс, а не алиас: переключение возможно только с remove_old_index=True")
+                return False
+            actions.append({"remove_index": {"index": alias}})
+
+        for index in current:
+            if index == new_index:
+                continue
+            if remove_old_index:
+                actions.append({"remove_index": {"index": index}})
+            else:
+                actions.append({"remove": {"index": index, "alias": alias}})
+
+        actions.append({"add": {"index": new_index, "alias": alias}})
+        return await self.es_repo.update_aliases(actions)
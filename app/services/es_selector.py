@@ -1,5 +1,8 @@
+from typing import AsyncIterator, Dict, List, Sequence
+
 from app.core.es_settings import ElasticQueries
 from app.core.logger import get_logger
+from app.core.settings import settings
 from app.models.tenders import TenderPositions
 from app.repository.elastic import ElasticRepository
 
@@ -35,3 +38,31 @@ class ElasticSelector:
         except Exception as e:
             logger.error(f'Ошибка при поиске кандидатов в селекторе: {e}')
             return []
+
+    async def find_candidates_multi(self, index_name: str, positions: Sequence[TenderPositions]) -> List:
+        """Поиск кандидатов сразу для нескольких позиций одним _msearch (ответы в порядке позиций)"""
+        try:
+            bodies = [ElasticQueries.get_query_v6(position=position) for position in positions]
+            responses = await self.es_repo.multi_search(index_name=index_name, bodies=bodies)
+
+        except Exception as e:
+            logger.error(f'Ошибка при пакетном поиске кандидатов в селекторе: {e}')
+            responses = [None] * len(positions)
+
+        results = []
+        for position, response in zip(positions, responses):
+            if response is None:
+                # Упавший подзапрос повторяем обычным поиском
+                response = await self.find_candidates_for_rabbit(index_name=index_name, position=position)
+            results.append(response)
+        return results
+
+    def stream_candidates(self, index_name: str, position: TenderPositions) -> AsyncIterator[List[Dict]]:
+        """Кандидаты позиции страницами по мере чтения из ES (поиск прекращается при закрытии генератора)"""
+        body = ElasticQueries.get_query_v6(position=position)
+        return self.es_repo.stream_query(
+            index_name=index_name,
+            body=body,
+            page_size=settings.ES_STREAM_PAGE_SIZE,
+            keep_alive=settings.ES_STREAM_KEEP_ALIVE,
+        )
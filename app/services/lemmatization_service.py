@@ -7,6 +7,8 @@ import nltk
 import os
 
 from app.core.logger import get_logger
+from app.core.settings import settings
+from app.services.text_cache import TextCache
 
 logger = get_logger(name=__name__)
 
@@ -39,6 +41,11 @@ class LemmatizationService:
         self.nlp_en = spacy.load("en_core_web_sm")
         self.morph_ru = pymorphy3.MorphAnalyzer()
 
+        # Кэши: пословный и построчный (повторяющаяся лексика каталога -> поиск по словарю)
+        self._words_cache = TextCache(max_size=settings.NLP_WORDS_CACHE_SIZE, name="lemma_words")
+        self._strings_cache = TextCache(max_size=settings.NLP_STRINGS_CACHE_SIZE, name="lemma_strings")
+        self.load_cache()
+
         logger.info("✓ LemmatizationService инициализирован")
 
     def _detect_language(self, text: str) -> str:
@@ -67,12 +74,22 @@ class LemmatizationService:
     def _lemmatize_word(self, word: str, lang: str) -> str:
         """Лемматизация одного слова"""
         try:
+            if lang not in ("ru", "en"):
+                return word
+
+            # Лемма зависит от анализатора (pymorphy для ru, spaCy для en) - язык входит в ключ кэша
+            cache_key = f"{lang}:{word}"
+            cached = self._words_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
             if lang == "ru":
-                return self.morph_ru.parse(word)[0].normal_form
-            elif lang == "en":
-                return self.nlp_en(word)[0].lemma_
+                lemma = self.morph_ru.parse(word)[0].normal_form
             else:
-                return word
+                lemma = self.nlp_en(word)[0].lemma_
+
+            self._words_cache.set(cache_key, lemma)
+            return lemma
         except Exception as e:
             logger.warning(f"Ошибка при лемматизации слова '{word}': {e}")
             return word
@@ -101,6 +118,10 @@ class LemmatizationService:
                 logger.debug(f"Булево значение передано: {text}")
                 return text
 
+            cached = self._strings_cache.get(text)
+            if cached is not None:
+                return cached
+
             # Определяем язык
             lang = self._detect_language(text)
 
@@ -125,9 +146,30 @@ class LemmatizationService:
                 lemmas.append(lemma)
 
             result = " ".join(lemmas)
+            self._strings_cache.set(text, result)
 
             return result
 
         except Exception as e:
             logger.error(f"Ошибка при лемматизации строки '{text}': {e}")
             return text
+
+    def _cache_path(self, cache: TextCache) -> str:
+        return os.path.join(settings.NLP_CACHE_DIR, f"{cache.name}.json") if settings.NLP_CACHE_DIR else ""
+
+    def load_cache(self):
+        """Прогрев кэшей с диска (если задан NLP_CACHE_DIR)"""
+        for cache in (self._words_cache, self._strings_cache):
+            cache.load(self._cache_path(cache))
+
+    def save_cache(self):
+        """Сохранение кэшей на диск (если задан NLP_CACHE_DIR)"""
+        for cache in (self._words_cache, self._strings_cache):
+            cache.dump(self._cache_path(cache))
+
+    def get_cache_stats(self) -> dict:
+        """Статистика попаданий/промахов кэшей"""
+        return {
+            "words": self._words_cache.get_stats(),
+            "strings": self._strings_cache.get_stats(),
+        }
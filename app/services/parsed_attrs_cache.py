@@ -0,0 +1,105 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from app.core.logger import get_logger
+from app.core.settings import settings
+from app.db.database import engine
+from app.db.session import get_session
+from app.models.cache import ParsedAttributeCache
+from app.repository.postgres import PostgresRepository
+
+logger = get_logger(name=__name__)
+
+
+class ParsedAttrsStore:
+    """Постоянный кэш разобранных атрибутов позиций в Postgres: переживает рестарты и общий для всех воркеров
+
+    Ключ - хэш названия, значения и единицы вместе с версией разбора, поэтому смена
+    ATTRS_STANDARDIZER_VERSION сразу делает старые записи недостижимыми
+    """
+
+    def __init__(
+        self,
+        version: str = settings.ATTRS_STANDARDIZER_VERSION,
+        ttl_days: int = settings.PARSED_ATTRS_CACHE_TTL_DAYS,
+    ):
+        self.version = version
+        self.ttl = timedelta(days=ttl_days)
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    def make_key(self, name: str, value: str, unit: Optional[str]) -> str:
+        raw = json.dumps([self.version, name, value, unit or ""], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _min_created_at(self) -> datetime:
+        return datetime.now(timezone.utc) - self.ttl
+
+    async def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """Найденные в кэше разобранные атрибуты по ключам (отсутствующих ключей в ответе нет)"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        found = {}
+        try:
+            async for session in get_session():
+                found = await PostgresRepository(session).get_parsed_attributes(
+                    keys, self.version, self._min_created_at()
+                )
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения постоянного кэша атрибутов: {e}")
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def put_many(self, entries: Dict[str, dict]):
+        """Сохранение разобранных атрибутов (ошибка записи не мешает обработке позиции)"""
+        if not entries:
+            return
+
+        rows = [{"key": key, "version": self.version, "parsed": parsed} for key, parsed in entries.items()]
+        try:
+            async for session in get_session():
+                if await PostgresRepository(session).save_parsed_attributes(rows):
+                    self.saved += len(rows)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи постоянного кэша атрибутов: {e}")
+
+    async def ensure_table(self):
+        """Создание таблицы кэша, если ее еще нет"""
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(ParsedAttributeCache.__table__.create, checkfirst=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы {ParsedAttributeCache.__tablename__}: {e}")
+
+    async def cleanup(self):
+        """Удаление записей прошлых версий разбора и старше TTL"""
+        try:
+            async for session in get_session():
+                deleted = await PostgresRepository(session).delete_stale_parsed_attributes(
+                    self.version, self._min_created_at()
+                )
+                if deleted:
+                    logger.info(f"🧹 Из постоянного кэша атрибутов удалено устаревших записей: {deleted}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки постоянного кэша атрибутов: {e}")
+
+    def get_cache_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved": self.saved,
+        }
+
+
+# Глобальный экземпляр
+parsed_attrs_store = ParsedAttrsStore()
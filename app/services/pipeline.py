@@ -0,0 +1,159 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.core.logger import get_logger
+
+logger = get_logger(name=__name__)
+
+# Маркер завершения очереди стадии
+_STOP = object()
+
+# Метрики последнего запуска по имени конвейера (для /healthz/pipeline)
+last_pipeline_metrics: Dict[str, Dict] = {}
+
+
+@dataclass
+class PipelineStage:
+    """Стадия конвейера: обработчик элемента, кол-во воркеров и размер входной очереди"""
+    name: str
+    handler: Callable[[Any], Awaitable[Any]]
+    workers: int = 1
+    queue_size: int = 1
+
+
+@dataclass
+class StageMetrics:
+    processed: int = 0
+    errors: int = 0
+    busy_time: float = 0.0
+    max_latency: float = 0.0
+    wait_time: float = 0.0
+    max_queue_depth: int = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "avg_latency_sec": round(self.busy_time / self.processed, 3) if self.processed else 0.0,
+            "max_latency_sec": round(self.max_latency, 3),
+            "avg_queue_wait_sec": round(self.wait_time / (self.processed + self.errors), 3) if self.processed + self.errors else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+@dataclass
+class _Envelope:
+    index: int
+    item: Any
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class StagedPipeline:
+    """Конвейер из стадий с ограниченными очередями между ними (backpressure)"""
+
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        name: str = "pipeline",
+        on_finish: Optional[Callable[[Any, Optional[BaseException]], Awaitable[None]]] = None,
+    ):
+        self.name = name
+        self.stages = stages
+        self.on_finish = on_finish
+        self.metrics: Dict[str, StageMetrics] = {stage.name: StageMetrics() for stage in stages}
+
+    async def run(self, items: Iterable[Any]) -> List[Any]:
+        """Прогон элементов через все стадии; результаты в порядке входа (исключение - на месте элемента)"""
+        items = list(items)
+        results: List[Any] = [None] * len(items)
+        queues = [asyncio.Queue(maxsize=max(stage.queue_size, 1)) for stage in self.stages]
+        ts = time.perf_counter()
+
+        async def produce():
+            for index, item in enumerate(items):
+                await self._put(queues[0], self.stages[0], _Envelope(index=index, item=item))
+            for _ in range(self.stages[0].workers):
+                await queues[0].put(_STOP)
+
+        async def run_stage(position: int):
+            stage = self.stages[position]
+            next_queue = queues[position + 1] if position + 1 < len(queues) else None
+            await asyncio.gather(
+                *[self._worker(position, queues[position], next_queue, results) for _ in range(stage.workers)]
+            )
+            # Все воркеры стадии закончили - закрываем очередь следующей стадии
+            if next_queue is not None:
+                for _ in range(self.stages[position + 1].workers):
+                    await next_queue.put(_STOP)
+
+        await asyncio.gather(produce(), *[run_stage(position) for position in range(len(self.stages))])
+
+        last_pipeline_metrics[self.name] = self.get_metrics(total_time=time.perf_counter() - ts, items=len(items))
+        return results
+
+    async def _put(self, queue: asyncio.Queue, stage: PipelineStage, envelope: _Envelope):
+        envelope.enqueued_at = time.perf_counter()
+        await queue.put(envelope)
+        metrics = self.metrics[stage.name]
+        metrics.max_queue_depth = max(metrics.max_queue_depth, queue.qsize())
+
+    async def _worker(
+        self,
+        position: int,
+        queue: asyncio.Queue,
+        next_queue: Optional[asyncio.Queue],
+        results: List[Any],
+    ):
+        stage = self.stages[position]
+        metrics = self.metrics[stage.name]
+        next_stage = self.stages[position + 1] if next_queue is not None else None
+
+        while True:
+            envelope = await queue.get()
+            if envelope is _STOP:
+                return
+
+            started = time.perf_counter()
+            metrics.wait_time += started - envelope.enqueued_at
+            try:
+                output = await stage.handler(envelope.item)
+            except Exception as e:
+                metrics.errors += 1
+                logger.error(f"Ошибка на стадии '{stage.name}' для элемента №{envelope.index}: {e}")
+                results[envelope.index] = e
+                await self._finish(envelope.item, e)
+                continue
+
+            latency = time.perf_counter() - started
+            metrics.processed += 1
+            metrics.busy_time += latency
+            metrics.max_latency = max(metrics.max_latency, latency)
+
+            if next_queue is not None:
+                # Блокируется, если следующая стадия не успевает (backpressure)
+                await self._put(next_queue, next_stage, _Envelope(index=envelope.index, item=output))
+            else:
+                results[envelope.index] = output
+                await self._finish(envelope.item, None)
+
+    async def _finish(self, item: Any, error: Optional[BaseException]):
+        if self.on_finish is None:
+            return
+        try:
+            await self.on_finish(item, error)
+        except Exception as e:
+            logger.error(f"Ошибка завершения элемента конвейера '{self.name}': {e}")
+
+    def get_metrics(self, total_time: Optional[float] = None, items: Optional[int] = None) -> Dict:
+        """Метрики стадий: пропускная способность, задержки и глубина очередей"""
+        metrics = {
+            "stages": {name: stage_metrics.as_dict() for name, stage_metrics in self.metrics.items()},
+            "workers": {stage.name: stage.workers for stage in self.stages},
+        }
+        if total_time is not None:
+            metrics["total_time_sec"] = round(total_time, 3)
+        if items is not None:
+            metrics["items"] = items
+        return metrics
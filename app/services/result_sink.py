@@ -0,0 +1,180 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from app.core.logger import get_logger
+from app.core.settings import settings
+from app.db.database import engine
+from app.db.session import get_session
+from app.models.results import PositionWrite
+from app.repository.postgres import PostgresRepository, PositionResultRows
+
+logger = get_logger(name=__name__)
+
+
+class ResultSink:
+    """Отложенная запись результатов позиций: фоновая задача пишет накопленное групповыми commit
+
+    Позиции разных тендеров копятся в буфере и уходят одной транзакцией по размеру (позиций/строк)
+    или по времени. submit возвращает future, который завершается только после commit
+    """
+
+    def __init__(
+        self,
+        max_positions: int = settings.RESULT_SINK_MAX_POSITIONS,
+        max_rows: int = settings.RESULT_SINK_MAX_ROWS,
+        flush_interval: float = settings.RESULT_SINK_FLUSH_INTERVAL,
+    ):
+        self.max_positions = max(max_positions, 1)
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+
+        self._buffer: List[Tuple[PositionResultRows, asyncio.Future]] = []
+        self._buffer_rows = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.flushes = 0
+        self.positions_written = 0
+        self.positions_failed = 0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"✅ Отложенная запись результатов запущена: до {self.max_positions} позиций / "
+            f"{self.max_rows} строк или {self.flush_interval} сек на commit"
+        )
+
+    def submit(self, position_rows: PositionResultRows) -> asyncio.Future:
+        """Результаты позиции в буфер; future - номер обработки позиции после commit (исключение - не записано)"""
+        future = asyncio.get_running_loop().create_future()
+        if self._closing:
+            # Ошибка через future: ожидающий обработчик не подтвердит сообщение
+            future.set_exception(RuntimeError("Отложенная запись результатов остановлена"))
+            return future
+        if self._task is None or self._task.done():
+            self.start()
+
+        self._buffer.append((position_rows, future))
+        self._buffer_rows += len(position_rows.matches) + len(position_rows.attribute_matches)
+
+        if len(self._buffer) >= self.max_positions or self._buffer_rows >= self.max_rows:
+            self._wakeup.set()
+        return future
+
+    @staticmethod
+    async def ensure_table():
+        """Создание таблицы отметок записи позиций по доставке, если ее еще нет"""
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(PositionWrite.__table__.create, checkfirst=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы {PositionWrite.__tablename__}: {e}")
+
+    @staticmethod
+    async def cleanup():
+        """Удаление отметок записи позиций старше RESULT_WRITES_TTL_DAYS"""
+        try:
+            min_created_at = datetime.now(timezone.utc) - timedelta(days=settings.RESULT_WRITES_TTL_DAYS)
+            async for session in get_session():
+                deleted = await PostgresRepository(session).delete_stale_position_writes(min_created_at)
+                if deleted:
+                    logger.info(f"🧹 Удалено устаревших отметок записи позиций: {deleted}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки отметок записи позиций: {e}")
+
+    @staticmethod
+    async def wait_durable(futures: List[asyncio.Future]) -> int:
+        """Ожидание записи всех переданных позиций; возвращает число незаписанных"""
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        return sum(isinstance(result, BaseException) for result in results)
+
+    async def close(self):
+        """Запись всего накопленного и остановка (вызывается при остановке сервиса)"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logger.info(f"✅ Отложенная запись результатов остановлена: {self.get_stats()}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            # Ошибка одной группы не должна останавливать запись следующих
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"❌ Ошибка отложенной записи результатов: {e}")
+
+            if self._closing and not self._buffer:
+                break
+
+    async def _flush(self):
+        batch, self._buffer, self._buffer_rows = self._buffer, [], 0
+        if not batch:
+            return
+
+        ts = time.perf_counter()
+        try:
+            position_numbers = await self._save([position_rows for position_rows, _ in batch])
+            if position_numbers is None and len(batch) > 1:
+                # Группа откатана целиком - пишем позиции по одной, чтобы одна плохая позиция не потеряла остальные
+                logger.warning(f"⚠️ Групповая запись {len(batch)} позиций не удалась, повторяем по одной")
+                for position_rows, future in batch:
+                    self._resolve(future, position_rows, await self._save([position_rows]))
+            else:
+                for position_rows, future in batch:
+                    self._resolve(future, position_rows, position_numbers)
+        finally:
+            # Ожидающие обработчики не должны зависнуть: все, что не записано, завершается ошибкой
+            for position_rows, future in batch:
+                self._resolve(future, position_rows, None)
+
+        self.flushes += 1
+        logger.info(f"💾 Групповая запись: {len(batch)} позиций за {time.perf_counter() - ts:.3f} сек")
+
+    @staticmethod
+    async def _save(positions: List[PositionResultRows]):
+        position_numbers = None
+        try:
+            async for session in get_session():
+                position_numbers = await PostgresRepository(session).save_positions_results(positions)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сессии при записи результатов: {e}")
+        return position_numbers
+
+    def _resolve(self, future: asyncio.Future, position_rows: PositionResultRows, position_numbers):
+        if future.done():
+            return
+        if position_numbers is None:
+            self.positions_failed += 1
+            future.set_exception(RuntimeError(f"Результаты позиции {position_rows.tender_position_id} не записаны"))
+        else:
+            self.positions_written += 1
+            future.set_result(position_numbers.get(position_rows.tender_position_id))
+
+    def get_stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "positions_written": self.positions_written,
+            "positions_failed": self.positions_failed,
+            "avg_positions_per_flush": round(self.positions_written / self.flushes, 2) if self.flushes else 0.0,
+            "buffered_positions": len(self._buffer),
+        }
+
+
+# Глобальный экземпляр
+result_sink = ResultSink()
@@ -0,0 +1,79 @@
+from typing import Dict, List
+
+# Стоимость проверки атрибута по типу (сек.): numeric/range читаются из векторной маски,
+# string - сравнение лемм, boolean и multiple - триграммы. Фиксированная: время проверки внутри
+# параллельных задач кандидатов меряет ожидание других задач и сети, а не сам атрибут
+_TYPE_COST = {
+    "numeric": 2e-6,
+    "range": 2e-6,
+    "string": 5e-6,
+    "boolean": 2e-5,
+    "multiple": 5e-5,
+}
+_DEFAULT_COST = 5e-5
+_PRIOR_REJECTION = 0.5
+# Вес априорной доли отсевов в числе наблюдений
+_PRIOR_WEIGHT = 8
+
+
+class AttributeOrder:
+    """Адаптивный порядок проверки атрибутов позиции: дешевые и чаще отсекающие - первыми
+
+    Стоимость берется по типу атрибута, из наблюдений учится только доля отсевов
+    """
+
+    def __init__(self, position_attrs: List[Dict], reorder_every: int = 16):
+        self.attrs = list(position_attrs)
+        self.reorder_every = max(reorder_every, 1)
+
+        self._index = {id(attr): i for i, attr in enumerate(self.attrs)}
+        self._evaluations = [0] * len(self.attrs)
+        self._rejections = [0] * len(self.attrs)
+        self._since_reorder = 0
+
+        self._order = self._sorted()
+
+    def current(self) -> List[Dict]:
+        """Текущий порядок проверки (пересчитывается раз в reorder_every кандидатов)"""
+        if self._since_reorder >= self.reorder_every * len(self.attrs):
+            self._order = self._sorted()
+            self._since_reorder = 0
+        return self._order
+
+    def observe(self, pos_attr: Dict, matched: bool):
+        """Учет результата проверки атрибута на очередном кандидате"""
+        i = self._index.get(id(pos_attr))
+        if i is None:
+            return
+        self._evaluations[i] += 1
+        self._rejections[i] += not matched
+        self._since_reorder += 1
+
+    def _estimates(self, i: int):
+        cost = _TYPE_COST.get(self.attrs[i].get("type"), _DEFAULT_COST)
+        weight = _PRIOR_WEIGHT + self._evaluations[i]
+        rejection = (_PRIOR_WEIGHT * _PRIOR_REJECTION + self._rejections[i]) / weight
+        return cost, rejection
+
+    def _sorted(self) -> List[Dict]:
+        # Ожидаемая стоимость одного отсева: чем меньше, тем раньше проверяем атрибут
+        def key(i: int) -> float:
+            cost, rejection = self._estimates(i)
+            return cost / max(rejection, 1e-3)
+
+        return [self.attrs[i] for i in sorted(range(len(self.attrs)), key=key)]
+
+    def get_stats(self) -> List[Dict]:
+        """Стоимость по типу и наблюдаемая доля отсевов по атрибутам в текущем порядке"""
+        stats = []
+        for attr in self._order:
+            i = self._index[id(attr)]
+            cost, rejection = self._estimates(i)
+            stats.append({
+                "name": attr.get("name"),
+                "type": attr.get("type"),
+                "evaluations": self._evaluations[i],
+                "rejection_rate": round(rejection, 3),
+                "cost_us": round(cost * 1e6, 1),
+            })
+        return stats
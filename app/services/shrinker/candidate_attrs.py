@@ -0,0 +1,146 @@
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass(slots=True)
+class CandidateAttr:
+    """Распаршенный атрибут кандидата (вместо словаря на каждый атрибут)"""
+    name: Optional[str]
+    type: str
+    original_name: Any
+    original_value: Any
+    # Для simple - значение, для range/multiple - None (значения лежат в items)
+    value: Any = None
+    unit: Optional[str] = None
+    # Значения range (начало, конец) и multiple
+    items: Optional[Tuple[Any, ...]] = None
+    # Числовое значение numeric атрибута (None - не число)
+    number: Optional[float] = None
+    lemma: Any = ""
+    stem: Any = ""
+    # Строка в NumericColumns (-1 - атрибут не числовой или колонки не строились)
+    row: int = -1
+
+    @property
+    def texts(self) -> List[str]:
+        """Значения в нижнем регистре для сравнения с multiple атрибутами"""
+        values = self.items if self.items is not None else (self.value,)
+        return [str(value).lower() for value in values]
+
+    def to_features(self) -> Dict:
+        """Предвычисленные признаки атрибута для хранения в ES (результат парсинга без сети и моделей)"""
+        return {
+            "name": self.name,
+            "type": self.type,
+            "value": _json_safe(self.value),
+            "unit": self.unit,
+            "items": [_json_safe(item) for item in self.items] if self.items is not None else None,
+            "number": _json_safe(self.number),
+            "lemma": self.lemma,
+            "stem": self.stem,
+        }
+
+    @classmethod
+    def from_features(cls, attr: Dict, features: Dict) -> "CandidateAttr":
+        """Атрибут кандидата из признаков, сохраненных в ES при индексации"""
+        items = features.get("items")
+        return cls(
+            name=features.get("name"),
+            type=features.get("type") or "unknown",
+            original_name=attr.get("original_name", ""),
+            original_value=attr.get("original_value", ""),
+            value=features.get("value"),
+            unit=features.get("unit"),
+            items=tuple(items) if items is not None else None,
+            number=features.get("number"),
+            lemma=features.get("lemma", ""),
+            stem=features.get("stem", ""),
+        )
+
+
+def _json_safe(value):
+    # nan/inf не сериализуются в JSON для ES - для сравнений они равносильны отсутствию числа
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+@dataclass(slots=True)
+class CandidateAttrGroups:
+    """Атрибуты кандидата, сгруппированные по типам"""
+    boolean: List[CandidateAttr] = field(default_factory=list)
+    numeric: List[CandidateAttr] = field(default_factory=list)
+    string: List[CandidateAttr] = field(default_factory=list)
+    range: List[CandidateAttr] = field(default_factory=list)
+    multiple: List[CandidateAttr] = field(default_factory=list)
+    unknown: List[CandidateAttr] = field(default_factory=list)
+    all: List[CandidateAttr] = field(default_factory=list)
+
+    def get(self, group: str) -> List[CandidateAttr]:
+        return getattr(self, group) if group in _GROUPS else []
+
+    def add(self, attr: CandidateAttr) -> bool:
+        """Добавление в группу своего типа (False - тип неизвестен, атрибут ушел в unknown)"""
+        known = attr.type in _GROUPS
+        getattr(self, attr.type if known else "unknown").append(attr)
+        self.all.append(attr)
+        return known
+
+
+_GROUPS = frozenset(("boolean", "numeric", "string", "range", "multiple", "unknown"))
+
+
+def range_bound(value, infinity: str) -> float:
+    """Граница диапазона числом: маркер бесконечности -> ±inf, не число -> nan (сравнение всегда False)"""
+    if value == infinity:
+        return float("-inf") if infinity == "_inf-" else float("inf")
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float("nan")
+
+
+class NumericColumns:
+    """Числовые и диапазонные атрибуты всех кандидатов позиции в колонках NumPy"""
+
+    __slots__ = ("attrs", "is_range", "numbers", "lows", "highs", "unit_codes", "unit_names", "unit_present")
+
+    def __init__(self, groups: List[CandidateAttrGroups]):
+        self.attrs: List[CandidateAttr] = [
+            attr for candidate_groups in groups for attr in (*candidate_groups.numeric, *candidate_groups.range)
+        ]
+
+        rows = len(self.attrs)
+        self.is_range = np.zeros(rows, dtype=bool)
+        self.numbers = np.full(rows, np.nan)
+        self.lows = np.full(rows, np.nan)
+        self.highs = np.full(rows, np.nan)
+        self.unit_codes = np.zeros(rows, dtype=np.int32)
+
+        unit_index: Dict[Any, int] = {}
+        for row, attr in enumerate(self.attrs):
+            attr.row = row
+            self.unit_codes[row] = unit_index.setdefault(attr.unit, len(unit_index))
+
+            if attr.type == "range":
+                self.is_range[row] = True
+                if attr.items is not None and len(attr.items) >= 2:
+                    self.lows[row] = range_bound(attr.items[0], "_inf-")
+                    self.highs[row] = range_bound(attr.items[1], "_inf+")
+            elif attr.number is not None:
+                self.numbers[row] = attr.number
+
+        self.unit_names: List[Any] = list(unit_index)
+        self.unit_present = np.array([bool(unit) for unit in self.unit_names], dtype=bool)[self.unit_codes]
+
+    def __len__(self) -> int:
+        return len(self.attrs)
+
+    def same_unit(self, unit) -> np.ndarray:
+        """Маска строк с той же единицей, что и у атрибута позиции"""
+        try:
+            return self.unit_codes == self.unit_names.index(unit)
+        except ValueError:
+            return np.zeros(len(self.attrs), dtype=bool)
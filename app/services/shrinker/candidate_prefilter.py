@@ -0,0 +1,161 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Set
+
+import numpy as np
+
+from app.core.logger import get_logger
+
+logger = get_logger(name=__name__)
+
+# Типы атрибутов кандидата, с которыми вообще может совпасть атрибут позиции
+_COMPATIBLE_TYPES = {
+    "numeric": ("numeric", "range"),
+    "range": ("numeric", "range"),
+    "string": ("multiple",),
+    "multiple": ("string", "boolean", "multiple"),
+    "boolean": ("string", "boolean", "multiple"),
+}
+
+
+class CandidatePrefilter:
+    """Инвертированный индекс по атрибутам кандидатов (типы, леммы, стеммы) для оценки сверху баллов"""
+
+    def __init__(
+        self,
+        candidates_hits: List[Dict],
+        determine_subtype: Callable[[Any], str],
+        has_features: Callable[[Dict], bool] = lambda source: False,
+    ):
+        self.size = len(candidates_hits)
+        self.by_type: Dict[str, Set[int]] = defaultdict(set)
+        self.named_by_type: Dict[str, Set[int]] = defaultdict(set)
+        self.by_lemma: Dict[Any, Set[int]] = defaultdict(set)
+        self.by_stem: Dict[Any, Set[int]] = defaultdict(set)
+        # Те же индексы по названиям атрибутов - для выбора пар названий, которые реально дойдут до сравнения
+        self.names_by_type: Dict[str, Set[str]] = defaultdict(set)
+        self.names_by_lemma: Dict[Any, Set[str]] = defaultdict(set)
+        self.names_by_stem: Dict[Any, Set[str]] = defaultdict(set)
+        # Кандидаты, которые не удалось проиндексировать - никогда не отбрасываем
+        self.unindexed: Set[int] = set()
+        self.unindexed_names: Set[str] = set()
+
+        for index, candidate in enumerate(candidates_hits):
+            try:
+                source = candidate["_source"]
+                use_features = has_features(source)
+                for attr in source.get("attributes", []):
+                    if use_features and attr.get("features"):
+                        self._add_features(index, attr["features"])
+                    else:
+                        self._add_attr(index, attr, determine_subtype)
+            except Exception as e:
+                logger.debug(f"Кандидат {index} не проиндексирован для префильтра: {e}")
+                self.unindexed.add(index)
+                self.unindexed_names |= self._raw_names(candidate)
+
+    def _add_attr(self, index: int, attr: Dict, determine_subtype: Callable[[Any], str]):
+        # Те же правила определения имени, значения и типа, что и в ShrinkerProducts._parse_candidate_attributes
+        name = attr.get("standardized_name") or attr.get("original_name", None)
+        value = attr.get("standardized_value") or attr.get("original_value", None)
+        attribute_type = attr.get("attribute_type", None) or "unknown"
+
+        attr_type = determine_subtype(value) if attribute_type == "simple" else attribute_type
+        self.by_type[attr_type].add(index)
+        if name:
+            self.named_by_type[attr_type].add(index)
+            self.names_by_type[attr_type].add(name)
+
+        if attribute_type == "simple":
+            if attr_type == "string":
+                lemma = attr.get("standardized_value_lemma", value)
+                self.by_lemma[lemma].add(index)
+                if name:
+                    self.names_by_lemma[lemma].add(name)
+            if attr_type in ("string", "boolean"):
+                stem = attr.get("standardized_value_stem", value)
+                self.by_stem[stem].add(index)
+                if name:
+                    self.names_by_stem[stem].add(name)
+
+    def _add_features(self, index: int, features: Dict):
+        # Тип, лемма и стемма уже вычислены при индексации (см. AttrsEnricher)
+        attr_type = features.get("type") or "unknown"
+        name = features.get("name")
+        self.by_type[attr_type].add(index)
+        if name:
+            self.named_by_type[attr_type].add(index)
+            self.names_by_type[attr_type].add(name)
+
+        if attr_type == "string":
+            self.by_lemma[features.get("lemma")].add(index)
+            if name:
+                self.names_by_lemma[features.get("lemma")].add(name)
+        if attr_type in ("string", "boolean"):
+            self.by_stem[features.get("stem")].add(index)
+            if name:
+                self.names_by_stem[features.get("stem")].add(name)
+
+    @staticmethod
+    def _raw_names(candidate: Dict) -> Set[str]:
+        try:
+            return {
+                attr.get("standardized_name") or attr.get("original_name")
+                for attr in candidate["_source"].get("attributes", [])
+                if attr.get("standardized_name") or attr.get("original_name")
+            }
+        except Exception:
+            return set()
+
+    def _possible_matches(self, pos_attr: Dict) -> Set[int]:
+        """Кандидаты, у которых атрибут позиции в принципе может найти совпадение"""
+        pos_type = pos_attr.get("type")
+        index = self.named_by_type if pos_type == "boolean" else self.by_type
+
+        possible = set(self.unindexed)
+        for attr_type in _COMPATIBLE_TYPES.get(pos_type, ()):
+            possible |= index.get(attr_type, set())
+
+        if pos_type == "string":
+            # Строки совпадают по равенству лемм, а при их отсутствии - по равенству стемм
+            compiled = pos_attr.get("compiled", {})
+            if "lemma" in compiled and "stem" in compiled:
+                possible |= self.by_lemma.get(compiled["lemma"], set())
+                possible |= self.by_stem.get(compiled["stem"], set())
+            else:
+                possible |= self.by_type.get("string", set()) | self.by_type.get("boolean", set())
+
+        return possible
+
+    def scorable_names(self, pos_attr: Dict) -> Set[str]:
+        """Названия атрибутов кандидатов, схожесть с которыми может понадобиться при скоринге атрибута позиции
+
+        Названия сравниваются только у атрибутов, совпавших по значению, поэтому набор повторяет
+        _possible_matches: совместимые типы, а для строк - только совпадения по лемме или стемме
+        """
+        pos_type = pos_attr.get("type")
+        names = set(self.unindexed_names)
+        for attr_type in _COMPATIBLE_TYPES.get(pos_type, ()):
+            names |= self.names_by_type.get(attr_type, set())
+
+        if pos_type == "string":
+            compiled = pos_attr.get("compiled", {})
+            if "lemma" in compiled and "stem" in compiled:
+                names |= self.names_by_lemma.get(compiled["lemma"], set())
+                names |= self.names_by_stem.get(compiled["stem"], set())
+            else:
+                names |= self.names_by_type.get("string", set()) | self.names_by_type.get("boolean", set())
+
+        return names
+
+    def upper_bounds(self, position_attrs: List[Dict]) -> np.ndarray:
+        """Максимально достижимый балл каждого кандидата"""
+        bounds = np.zeros(self.size, dtype=np.int32)
+        for pos_attr in position_attrs:
+            try:
+                possible = self._possible_matches(pos_attr)
+            except TypeError:
+                # Нехэшируемая лемма/стемма позиции - атрибут может совпасть с кем угодно
+                possible = range(self.size)
+            if possible:
+                bounds[list(possible)] += 1
+        return bounds
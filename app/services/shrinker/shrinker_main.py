@@ -1,16 +1,22 @@
-from typing import Optional, List, Dict
+from contextlib import aclosing
+from typing import AsyncIterator, Optional, List, Dict, Tuple
 
 from app.core.logger import get_logger
+from app.core.model_registry import model_registry
 from app.core.settings import settings
 from app.db.session import get_session
 from app.models.tenders import TenderPositions
 from app.repository.postgres import PostgresRepository
 from app.services.attrs_standardizer import AttrsStandardizer
+from app.services.lemmatization_service import LemmatizationService
+from app.services.stemming_service import StemmingService
 from app.services.trigrammer import Trigrammer
 from app.services.unit_standardizer import UnitStandardizer
 from app.services.vectorizer import SemanticMatcher
 
+from app.services.shrinker.attribute_order import AttributeOrder
 from app.services.shrinker.shrinker_positions_service import ShrinkerPositions
+from app.services.shrinker.shrinker_process_pool import ShrinkerProcessPool, shrinker_process_pool
 from app.services.shrinker.shrinker_products_service import ShrinkerProducts
 
 logger = get_logger(name=__name__)
@@ -21,64 +27,193 @@ import asyncio
 class Shrinker:
     def __init__(
         self,
+        vectorizer: Optional[SemanticMatcher] = None,
+        attrs_sorter: Optional[AttrsStandardizer] = None,
+        unit_normalizer: Optional[UnitStandardizer] = None,
+        trigrammer: Optional[Trigrammer] = None,
+        lemmatizator: Optional[LemmatizationService] = None,
+        stemmer: Optional[StemmingService] = None,
+        process_pool: Optional[ShrinkerProcessPool] = None,
     ):
-        self.vectorizer = SemanticMatcher()
-        self.attrs_sorter = AttrsStandardizer()
-        self.unit_normalizer = UnitStandardizer()
-        self.trigrammer = Trigrammer()
-
-        self.shrinker_positions = ShrinkerPositions()
-        self.shrinker_products = ShrinkerProducts()
-
+        # Тяжелые модели и клиенты берутся из реестра (загружаются один раз на воркер)
+        self.vectorizer = vectorizer or model_registry.vectorizer
+        self.attrs_sorter = attrs_sorter or model_registry.attrs_sorter
+        self.unit_normalizer = unit_normalizer or model_registry.unit_normalizer
+        self.trigrammer = trigrammer or model_registry.trigrammer
+        self.lemmatizator = lemmatizator or model_registry.lemmatizator
+        self.stemmer = stemmer or model_registry.stemmer
+
+        # Общий лимит конкурентности: парсинг кандидатов и их скоринг
         self.semaphore = asyncio.Semaphore(settings.SHRINKER_SEMAPHORE_SIZE)
 
+        self.shrinker_positions = ShrinkerPositions(
+            attrs_sorter=self.attrs_sorter,
+            unit_normalizer=self.unit_normalizer,
+        )
+        self.shrinker_products = ShrinkerProducts(
+            vectorizer=self.vectorizer,
+            attrs_sorter=self.attrs_sorter,
+            unit_normalizer=self.unit_normalizer,
+            trigrammer=self.trigrammer,
+            lemmatizator=self.lemmatizator,
+            stemmer=self.stemmer,
+            semaphore=self.semaphore,
+        )
+
+        # В процессном режиме CPU-bound скоринг уходит в пул, сетевые шаги остаются здесь
+        if process_pool is None and settings.SHRINKER_EXECUTION_MODE == "process":
+            process_pool = shrinker_process_pool
+        self.process_pool = process_pool
+
     async def shrink(self, candidates: dict, position: TenderPositions):
         """Основной метод для оценки кандидатов"""
         try:
-            # ЭТАП 1: ПОДГОТОВКА
-            logger.info(f"Начало обработки позиции {position.title.upper()}")
-            logger.info(f"Присвоенная категория: {position.category}")
-
-            # Парсим атрибуты позиции с группировкой
-            position_attrs = await self.shrinker_positions.parse_position_attributes(position.attributes)
-
-            if len(position_attrs.get('attrs', [])) == 0:
-                logger.warning("❌ Нет атрибутов для сравнения")
+            position_attrs, candidates_hits = await self.prepare(candidates=candidates, position=position)
+            if position_attrs is None:
                 return
 
+            return await self.score(candidates_hits=candidates_hits, position=position, position_attrs=position_attrs)
+
+        except Exception as e:
+            logger.error(f'Error: {e}')
+            return None
 
-            # ЭТАП 2: ОБРАБОТКА КАНДИДАТОВ
-            logger.info(f"🔍 Начинаем обработку {len(candidates['hits']['hits'])} кандидатов")
+    async def shrink_stream(
+        self, pages: AsyncIterator[List[Dict]], position: TenderPositions, position_attrs: Optional[Dict] = None
+    ) -> Optional[List[Dict]]:
+        """Оценка кандидатов по мере поступления страниц из ES; чтение прекращается, когда сильных кандидатов достаточно"""
+        async with aclosing(pages):
+            if position_attrs is None:
+                position_attrs = await self.prepare_position(position)
+            if position_attrs is None:
+                return None
+
+            stop_after = settings.SHRINKER_STREAM_STOP_AFTER
+            strong_points = len(position.attributes) * settings.SHRINKER_STREAM_STOP_SCORE
+
+            processed_candidates = []
+            read, strong = 0, 0
+            async for hits in pages:
+                read += len(hits)
+                page_hits = await self.prepare_page(hits, position, position_attrs)
+                page_results = await self.score(candidates_hits=page_hits, position=position, position_attrs=position_attrs)
+
+                processed_candidates.extend(page_results)
+                strong += sum(1 for result in page_results if result["points"] >= strong_points)
+                if stop_after and strong >= stop_after:
+                    logger.info(f"⏹️ Найдено {strong} сильных кандидатов после {read} из ES - дальше не читаем")
+                    break
+
+            logger.info(f"📥 Потоковая обработка: прочитано {read}, подобрано {len(processed_candidates)}")
+            return processed_candidates
 
-            position_max_points = len(position.attributes)
-            min_required_points = position_max_points * settings.CANDIDATES_TRASHOLD_SCORE
-            logger.info(f"Макс. балл: {position_max_points}  | Мин. балл для прохода: {min_required_points}")
+    async def prepare(self, candidates: dict, position: TenderPositions) -> Tuple[Optional[Dict], List[Dict]]:
+        """ЭТАП 1: атрибуты позиции и подготовленные кандидаты (атрибуты None - нечего сравнивать)"""
+        position_attrs = await self.prepare_position(position)
+        if position_attrs is None:
+            return None, []
 
-            # Создаем tasks для параллельного выполнения
-            tasks = [
-                self._process_with_semaphore(candidate, position_attrs, min_required_points)
-                for candidate in candidates["hits"]["hits"]
-            ]
-            # Выполняем все tasks параллельно
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        candidates_hits = await self.prepare_page(candidates["hits"]["hits"], position, position_attrs)
+        return position_attrs, candidates_hits
 
-            # Фильтруем успешные результаты
-            processed_candidates = [
-                result for result in results
-                if isinstance(result, dict) and result is not None
-            ]
+    async def prepare_position(self, position: TenderPositions) -> Optional[Dict]:
+        """Парсинг атрибутов позиции и их предвычисленные признаки (None - нечего сравнивать)"""
+        logger.info(f"Начало обработки позиции {position.title.upper()}")
+        logger.info(f"Присвоенная категория: {position.category}")
 
-            return processed_candidates
+        # Парсим атрибуты позиции с группировкой
+        position_attrs = await self.shrinker_positions.parse_position_attributes(position.attributes)
 
-        except Exception as e:
-            logger.error(f'Error: {e}')
+        if len(position_attrs.get('attrs', [])) == 0:
+            logger.warning("❌ Нет атрибутов для сравнения")
             return None
 
+        # Предвычисляем признаки позиции (леммы, стеммы, n-граммы) один раз на позицию
+        return self.shrinker_products.compile_position_attributes(position_attrs)
+
+    async def prepare_page(
+        self, candidates_hits: List[Dict], position: TenderPositions, position_attrs: Dict
+    ) -> List[Dict]:
+        """Подготовка кандидатов к скорингу (вся выдача ES или очередная страница): префильтр и сетевые шаги
+
+        Возвращает кандидатов, прошедших префильтр, - их и нужно передать в score
+        """
+        # Отсекаем безнадежных кандидатов до сетевых запросов по ним
+        if settings.SHRINKER_PREFILTER_ENABLED:
+            candidates_hits = self.shrinker_products.prefilter_candidates(
+                candidates_hits, position_attrs, self._min_required_points(position)
+            )
+
+        # Одним батчем разрешаем единицы кандидатов. В режиме эмбеддингов схожесть названий позиции
+        # и кандидатов считается одной матрицей, в процессном режиме - заранее и только для пар,
+        # которые могут дойти до сравнения, чтобы воркеры не ходили в сервис
+        tasks = [self.unit_normalizer.prefetch(self.shrinker_products.collect_candidate_unit_values(candidates_hits))]
+        if self.vectorizer.uses_embeddings or self.process_pool is not None:
+            tasks.append(self.shrinker_products.compile_name_scores(position_attrs, candidates_hits))
+        await asyncio.gather(*tasks)
+        return candidates_hits
+
+    async def score(self, candidates_hits: List[Dict], position: TenderPositions, position_attrs: Dict) -> List[Dict]:
+        """ЭТАП 2: оценка кандидатов (результат prepare/prepare_page) по подготовленным атрибутам позиции"""
+        logger.info(f"🔍 Начинаем обработку {len(candidates_hits)} кандидатов")
+
+        position_max_points = len(position.attributes)
+        min_required_points = self._min_required_points(position)
+        logger.info(f"Макс. балл: {position_max_points}  | Мин. балл для прохода: {min_required_points}")
+
+        if self.process_pool is not None:
+            # Воркеры не ходят в сеть - значения позиции и кандидатов разрешаются заранее и передаются с шардом
+            unit_values = (
+                self.shrinker_products.collect_position_unit_values(position_attrs)
+                | self.shrinker_products.collect_candidate_unit_values(candidates_hits)
+            )
+            await self.unit_normalizer.prefetch(unit_values)
+            return await self.process_pool.score(
+                candidates_hits=candidates_hits,
+                position_attrs=position_attrs,
+                min_required_points=min_required_points,
+                unit_results=self.unit_normalizer.export_results(unit_values),
+            )
+
+        # Парсим всех кандидатов заранее: numeric/range атрибуты сравниваются сразу по всем кандидатам
+        grouped_attrs, numeric_matches = await self.shrinker_products.prepare_candidates(
+            candidates_hits, position_attrs
+        )
+
+        # Порядок проверки атрибутов подстраивается под наблюдаемую стоимость и долю отсевов
+        attr_order = AttributeOrder(position_attrs["attrs"]) if settings.SHRINKER_ADAPTIVE_ATTR_ORDER else None
+
+        # Создаем tasks для параллельного выполнения
+        tasks = [
+            self._process_with_semaphore(
+                candidate, position_attrs, min_required_points, groups, numeric_matches, attr_order
+            )
+            for candidate, groups in zip(candidates_hits, grouped_attrs)
+            if groups is not None
+        ]
+        # Выполняем все tasks параллельно
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Фильтруем успешные результаты
+        processed_candidates = [
+            result for result in results
+            if isinstance(result, dict) and result is not None
+        ]
+
+        if attr_order is not None:
+            logger.debug(f"Порядок проверки атрибутов: {attr_order.get_stats()}")
+
+        return processed_candidates
+
+    @staticmethod
+    def _min_required_points(position: TenderPositions) -> float:
+        return len(position.attributes) * settings.CANDIDATES_TRASHOLD_SCORE
+
     async def _process_with_semaphore(
-        self, candidate, position_attrs, min_required_points
+        self, candidate, position_attrs, min_required_points, grouped_attrs=None, numeric_matches=None, attr_order=None
     ):
         async with self.semaphore:
             return await self.shrinker_products.process_single_candidate(
-                candidate, position_attrs, min_required_points
+                candidate, position_attrs, min_required_points, grouped_attrs, numeric_matches, attr_order
             )
 
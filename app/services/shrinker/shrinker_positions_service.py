@@ -1,17 +1,30 @@
-from typing import Optional, List, Dict
+import copy
+from typing import Optional, List, Dict, Sequence, Tuple
 
 from app.core.logger import get_logger
+from app.core.settings import settings
+from app.models.tenders import TenderPositions
 
 from app.services.attrs_standardizer import AttrsStandardizer
+from app.services.parsed_attrs_cache import ParsedAttrsStore, parsed_attrs_store
 from app.services.unit_standardizer import UnitStandardizer
 
 logger = get_logger(name=__name__)
 
 
 class ShrinkerPositions:
-    def __init__(self):
-        self.attrs_sorter = AttrsStandardizer()
-        self.unit_normalizer = UnitStandardizer()
+    def __init__(
+        self,
+        attrs_sorter: Optional[AttrsStandardizer] = None,
+        unit_normalizer: Optional[UnitStandardizer] = None,
+        parsed_store: Optional[ParsedAttrsStore] = None,
+    ):
+        self.attrs_sorter = attrs_sorter or AttrsStandardizer()
+        self.unit_normalizer = unit_normalizer or UnitStandardizer()
+        # Постоянный кэш готовых (разобранных и нормализованных) атрибутов
+        self.parsed_store = parsed_store or (parsed_attrs_store if settings.PARSED_ATTRS_CACHE_ENABLED else None)
+        # Атрибуты тендера, найденные в постоянном кэше при prefetch_attributes
+        self._stored: Dict[str, dict] = {}
 
     async def parse_position_attributes(self, attributes) -> Dict:
         """Парсинг атрибутов позиции с группировкой по типам"""
@@ -20,16 +33,39 @@ class ShrinkerPositions:
         # Инициализация групп
         attrs_data = {"attrs": []}
 
+        # Атрибуты, уже разобранные раньше (в этом или другом тендере), берутся из постоянного кэша
+        keys = [self._store_key(attr) for attr in attributes] if self.parsed_store else []
+        stored = await self._load_stored(keys)
+        to_parse = [i for i in range(len(attributes)) if not keys or keys[i] not in stored]
+        new_entries = {}
+
+        # Остальные характеристики позиции разбираются одним запросом (по кэшу - вовсе без запроса)
+        batch_parsed = None
+        if settings.ATTRS_STANDARDIZER_BATCH_ENABLED and to_parse:
+            try:
+                batch_parsed = dict(zip(to_parse, await self.attrs_sorter.extract_attr_data_batch(
+                    [self._raw_string(attributes[i]) for i in to_parse]
+                )))
+            except Exception as e:
+                logger.error(f"Ошибка пакетного разбора характеристик позиции: {e}")
+
         for i, attr in enumerate(attributes):
             logger.info(f"- АТРИБУТ ПОЗИЦИИ {i+1}/{len(attributes)}")
 
+            if keys and keys[i] in stored:
+                attrs_data["attrs"].append(self._from_stored(stored[keys[i]], attr))
+                continue
+
             try:
                 parsed = None
                 try:
                     # Распаршиваем характеристику позиции
                     unit = getattr(attr, "unit", "") or ""
-                    raw_string = f"{attr.name}: {attr.value} {unit}".strip()
-                    parsed = await self.attrs_sorter.extract_attr_data(raw_string)
+                    raw_string = self._raw_string(attr)
+                    if batch_parsed is not None:
+                        parsed = batch_parsed[i]
+                    else:
+                        parsed = await self.attrs_sorter.extract_attr_data(raw_string)
 
                     logger.info(f"ИСХОДНЫЕ ДАННЫЕ | unit: '{unit}' | raw_string: '{raw_string}'")
                     logger.info(f"РАСПАРШЕННЫЕ ДАННЫЕ | '{parsed}'")
@@ -56,9 +92,12 @@ class ShrinkerPositions:
                     normalized_parsed['original_unit'] = attr.unit
                     normalized_parsed['pg_id'] = attr.id
                     normalized_parsed['type'] = final_type
-                    normalized_parsed = await self._standardize_units_and_values(final_type=final_type, parsed=parsed, normalized_parsed=normalized_parsed)
+                    normalized_parsed, units_normalized = await self._standardize_units_and_values(final_type=final_type, parsed=parsed, normalized_parsed=normalized_parsed)
 
                     attrs_data["attrs"].append(normalized_parsed)
+                    # Атрибут с ненормализованной единицей не сохраняем - в следующий раз попробуем снова
+                    if keys and units_normalized:
+                        new_entries[keys[i]] = self._to_stored(normalized_parsed)
                 else:
                     logger.warning(f"❌ Final parsed result: '{parsed}' | '{attr.name}', '{attr.value}'")
 
@@ -66,10 +105,63 @@ class ShrinkerPositions:
                 logger.error(f"CRITICAL ERROR for '{attr.name}': {e}")
                 logger.error(f"Exception type: {type(e)}")
 
-        logger.info(f"--- Этап 1/3 ЗАВЕРШЕН: успешной распаршено {len(attrs_data['attrs'])}/{len(attributes)}")
+        if new_entries:
+            await self.parsed_store.put_many(new_entries)
+            self._stored.update(new_entries)
+
+        logger.info(f"--- Этап 1/3 ЗАВЕРШЕН: успешной распаршено {len(attrs_data['attrs'])}/{len(attributes)}"
+                    f" (из постоянного кэша: {len(attributes) - len(to_parse)})")
 
         return attrs_data
 
+    async def prefetch_attributes(self, positions: Sequence[TenderPositions]):
+        """Разбор характеристик всех позиций тендера заранее пакетными запросами (результаты остаются в кэше)"""
+        attributes = [attr for position in positions for attr in position.attributes]
+        if self.parsed_store and attributes:
+            # Одним запросом в Postgres; стандартизатору уходит только то, чего там нет
+            await self._load_stored([self._store_key(attr) for attr in attributes])
+            attributes = [attr for attr in attributes if self._store_key(attr) not in self._stored]
+            logger.info(f"🗄️ Постоянный кэш атрибутов тендера: найдено {len(self._stored)} уникальных")
+
+        raw_strings = [self._raw_string(attr) for attr in attributes]
+        if raw_strings:
+            await self.attrs_sorter.extract_attr_data_batch(raw_strings)
+            logger.info(f"📦 Характеристики тендера разобраны заранее: {len(set(raw_strings))} уникальных строк")
+
+    def _store_key(self, attr) -> str:
+        return self.parsed_store.make_key(attr.name, attr.value, attr.unit)
+
+    async def _load_stored(self, keys: List[str]) -> Dict[str, dict]:
+        """Атрибуты из постоянного кэша: найденные раньше в этом тендере - без повторного запроса"""
+        missing = [key for key in keys if key not in self._stored]
+        if missing:
+            self._stored.update(await self.parsed_store.get_many(missing))
+        return {key: self._stored[key] for key in keys if key in self._stored}
+
+    @staticmethod
+    def _to_stored(normalized_parsed: Dict) -> Dict:
+        """Разобранный атрибут без полей конкретной позиции - их значения берутся из атрибута при чтении"""
+        return copy.deepcopy({
+            key: value for key, value in normalized_parsed.items()
+            if key not in ("original_name", "original_value", "original_unit", "pg_id")
+        })
+
+    @staticmethod
+    def _from_stored(stored: Dict, attr) -> Dict:
+        # Копия: атрибут позиции дальше дополняется при компиляции
+        normalized_parsed = copy.deepcopy(stored)
+        normalized_parsed['original_name'] = attr.name
+        normalized_parsed['original_value'] = attr.value
+        normalized_parsed['original_unit'] = attr.unit
+        normalized_parsed['pg_id'] = attr.id
+        return normalized_parsed
+
+    @staticmethod
+    def _raw_string(attr) -> str:
+        """Строка характеристики для стандартизатора (она же ключ кэша разбора)"""
+        unit = getattr(attr, "unit", "") or ""
+        return f"{attr.name}: {attr.value} {unit}".strip()
+
     @staticmethod
     def _determine_value_subtype(value) -> str:
         """Определение подтипа простого значения: boolean, numeric или string"""
@@ -126,7 +218,9 @@ class ShrinkerPositions:
             logger.error(f"Error determining value subtype for {value}: {e}")
             return "string"
 
-    async def _standardize_units_and_values(self, final_type, parsed, normalized_parsed):
+    async def _standardize_units_and_values(self, final_type, parsed, normalized_parsed) -> Tuple[Dict, bool]:
+        """Приведение значений к базовым единицам; флаг - все единицы нормализованы (или нормализовать нечего)"""
+        units_normalized = True
         if final_type == "numeric":
             value = parsed.get("value", {}).get("unit")
             unit = parsed.get("value", {}).get("value")
@@ -146,11 +240,13 @@ class ShrinkerPositions:
                             "base_unit", unit
                         )
                     else:
+                        units_normalized = False
                         logger.warning(
                             f"⚠️ Unit normalization failed for {value} {unit}"
                         )
 
                 except Exception as e:
+                    units_normalized = False
                     logger.error(f"💥 Error normalizing unit: {e}")
 
         elif final_type == "range":
@@ -178,6 +274,8 @@ class ShrinkerPositions:
                                     normalized_parsed["value"][j]["unit"] = (
                                         normalized_result.get("base_unit", unit)
                                     )
+                                else:
+                                    units_normalized = False
                             else:
                                 # Для обычных чисел стандартизируем и значение, и единицу
                                 normalized_result = (
@@ -192,6 +290,9 @@ class ShrinkerPositions:
                                     normalized_parsed["value"][j]["unit"] = (
                                         normalized_result.get("base_unit", unit)
                                     )
+                                else:
+                                    units_normalized = False
                         except Exception as e:
+                            units_normalized = False
                             logger.error(f"Error normalizing range unit: {e}")
-        return normalized_parsed
+        return normalized_parsed, units_normalized
@@ -0,0 +1,172 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.core.logger import get_logger
+from app.core.settings import settings
+from app.services.shrinker.attribute_order import AttributeOrder
+
+logger = get_logger(name=__name__)
+
+# Состояние процесса-воркера: модели и event loop создаются один раз в initializer
+_worker_products = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _init_worker():
+    """Initializer воркера: загрузка NLP моделей один раз на процесс"""
+    global _worker_products, _worker_loop
+
+    from app.core.model_registry import model_registry
+    from app.services.shrinker.shrinker_products_service import ShrinkerProducts
+    from app.services.unit_standardizer import UnitStandardizer
+
+    # Воркер считает только CPU: значения с единицами пересчитываются по ответам сервиса, полученным родителем
+    unit_normalizer = UnitStandardizer()
+    unit_normalizer.remote_enabled = False
+
+    _worker_products = ShrinkerProducts(
+        vectorizer=model_registry.vectorizer,
+        attrs_sorter=model_registry.attrs_sorter,
+        unit_normalizer=unit_normalizer,
+        trigrammer=model_registry.trigrammer,
+        lemmatizator=model_registry.lemmatizator,
+        stemmer=model_registry.stemmer,
+    )
+    # Названия сравниваются по name_scores, предвычисленным родителем
+    _worker_products.remote_enabled = False
+    _worker_loop = asyncio.new_event_loop()
+    logger.info(f"✅ Воркер скоринга {os.getpid()} готов")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _score_shard(
+    shard: List[Tuple[int, Dict]],
+    position_attrs: Dict,
+    min_required_points: float,
+    unit_results: Dict[str, Dict],
+) -> List[Tuple[int, Dict]]:
+    """Скоринг шарда кандидатов в воркере; возвращает (индекс кандидата, результат) для прошедших"""
+    _worker_products.unit_normalizer.import_results(unit_results)
+    return _worker_loop.run_until_complete(
+        _score_shard_async(shard, position_attrs, min_required_points)
+    )
+
+
+async def _score_shard_async(
+    shard: List[Tuple[int, Dict]], position_attrs: Dict, min_required_points: float
+) -> List[Tuple[int, Dict]]:
+    candidates = [{"_source": source} for _, source in shard]
+    grouped_attrs, numeric_matches = await _worker_products.prepare_candidates(candidates, position_attrs)
+    attr_order = AttributeOrder(position_attrs["attrs"]) if settings.SHRINKER_ADAPTIVE_ATTR_ORDER else None
+
+    results = []
+    for (index, source), candidate, groups in zip(shard, candidates, grouped_attrs):
+        if groups is None:
+            continue
+        try:
+            result = await _worker_products.process_single_candidate(
+                candidate, position_attrs, min_required_points, groups, numeric_matches, attr_order
+            )
+        except Exception as e:
+            logger.error(f"Ошибка скоринга кандидата {source.get('id')} в воркере: {e}")
+            continue
+
+        if result is not None:
+            # Сам кандидат остается в родителе - обратно едет только результат
+            result["candidate"] = None
+            results.append((index, result))
+    return results
+
+
+class ShrinkerProcessPool:
+    """Пул процессов для CPU-bound скоринга кандидатов (шардирование кандидатов позиции)"""
+
+    def __init__(
+        self,
+        workers: int = settings.SHRINKER_PROCESS_WORKERS,
+        shard_size: int = settings.SHRINKER_PROCESS_SHARD_SIZE,
+        start_method: str = settings.SHRINKER_PROCESS_START_METHOD,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = max(shard_size, 1)
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def start(self):
+        """Запуск всех воркеров заранее, чтобы загрузка моделей не попала на первый тендер"""
+        ts = time.perf_counter()
+        executor = self._get_executor()
+        for future in [executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"✅ Пул скоринга запущен: {self.workers} процессов за {round(time.perf_counter() - ts, 2)} сек.")
+
+    async def score(
+        self,
+        candidates_hits: List[Dict],
+        position_attrs: Dict,
+        min_required_points: float,
+        unit_results: Dict[str, Dict],
+    ) -> List[Dict]:
+        """Скоринг кандидатов позиции шардами в пуле; порядок результатов = порядок кандидатов"""
+        # В воркеры уходят только id, атрибуты и версия признаков кандидата, а не весь ответ ES
+        payloads = [
+            (
+                index,
+                {
+                    "id": hit["_source"].get("id"),
+                    "attributes": hit["_source"].get("attributes", []),
+                    "features_version": hit["_source"].get("features_version"),
+                },
+            )
+            for index, hit in enumerate(candidates_hits)
+        ]
+        # Шардов не меньше числа воркеров, чтобы нагрузить все ядра
+        shard_size = min(self.shard_size, max(len(payloads) // self.workers, 1))
+        shards = [payloads[i:i + shard_size] for i in range(0, len(payloads), shard_size)]
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        shard_results = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    executor, _score_shard, shard, position_attrs, min_required_points, unit_results
+                )
+                for shard in shards
+            ],
+            return_exceptions=True,
+        )
+
+        processed_candidates = []
+        for shard_result in shard_results:
+            if isinstance(shard_result, BaseException):
+                logger.error(f"Ошибка шарда скоринга: {shard_result}")
+                continue
+            for index, result in shard_result:
+                result["candidate"] = candidates_hits[index]
+                processed_candidates.append(result)
+
+        return processed_candidates
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+shrinker_process_pool = ShrinkerProcessPool()
@@ -1,5 +1,8 @@
+import asyncio
 from typing import Optional, List, Dict, Tuple
 
+import numpy as np
+
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.services.attrs_standardizer import AttrsStandardizer
@@ -8,6 +11,9 @@ from app.services.trigrammer import Trigrammer
 from app.services.unit_standardizer import UnitStandardizer
 from app.services.vectorizer import SemanticMatcher
 from app.services.stemming_service import StemmingService
+from app.services.shrinker.candidate_attrs import CandidateAttr, CandidateAttrGroups, NumericColumns, range_bound
+from app.services.shrinker.attribute_order import AttributeOrder
+from app.services.shrinker.candidate_prefilter import CandidatePrefilter
 
 logger = get_logger(name=__name__)
 
@@ -15,19 +21,203 @@ logger = get_logger(name=__name__)
 class ShrinkerProducts:
     def __init__(
         self,
+        vectorizer: Optional[SemanticMatcher] = None,
+        attrs_sorter: Optional[AttrsStandardizer] = None,
+        unit_normalizer: Optional[UnitStandardizer] = None,
+        trigrammer: Optional[Trigrammer] = None,
+        lemmatizator: Optional[LemmatizationService] = None,
+        stemmer: Optional[StemmingService] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
     ):
-        self.vectorizer = SemanticMatcher()
-        self.attrs_sorter = AttrsStandardizer()
-        self.unit_normalizer = UnitStandardizer()
-        self.trigrammer = Trigrammer()
-        self.lemmatizator = LemmatizationService()
-        self.stemmer = StemmingService()
+        # Модели лучше передавать из реестра (app.core.model_registry), иначе загрузятся заново
+        self.vectorizer = vectorizer or SemanticMatcher()
+        self.attrs_sorter = attrs_sorter or AttrsStandardizer()
+        self.unit_normalizer = unit_normalizer or UnitStandardizer()
+        self.trigrammer = trigrammer or Trigrammer()
+        self.lemmatizator = lemmatizator or LemmatizationService()
+        self.stemmer = stemmer or StemmingService()
+        self.semaphore = semaphore or asyncio.Semaphore(settings.SHRINKER_SEMAPHORE_SIZE)
+
+        # False - схожесть названий только из предвычисленных name_scores (воркеры процессного пула не ходят в сеть)
+        self.remote_enabled = True
+        self.offline_name_misses = 0
+
+    def compile_position_attributes(self, position_attrs: Dict) -> Dict:
+        """Предвычисление признаков позиции - один раз на позицию, а не на каждого кандидата"""
+        for index, pos_attr in enumerate(position_attrs.get("attrs", [])):
+            try:
+                pos_attr["compiled"] = self._compile_position_attr(pos_attr)
+                pos_attr["compiled"]["index"] = index
+            except Exception as e:
+                logger.error(f"Ошибка предвычисления признаков атрибута '{pos_attr.get('name')}': {e}")
+
+        return position_attrs
+
+    def _compile_position_attr(self, pos_attr: Dict) -> Dict:
+        """Признаки одного атрибута позиции, которые потребляют компараторы кандидатов"""
+        pos_type = pos_attr.get("type")
+        pos_name = pos_attr.get("name", "")
+
+        compiled = {
+            "name_lower": pos_name.lower() if pos_name else "",
+            "name_signature": self.trigrammer.build_signature(pos_name) if pos_name else None,
+        }
+
+        if pos_type == "string":
+            raw_value = str(pos_attr.get("value", {}).get("value", ""))
+            compiled["lemma"] = self.lemmatizator.lemmatize(raw_value)
+            compiled["stem"] = self.stemmer.stem(raw_value)
+
+        if pos_type in ("string", "multiple"):
+            compiled["multiple_values"] = [
+                (value_str, self.trigrammer.build_signature(value_str))
+                for value_str in self._prepare_multiple_values(pos_attr.get("value", []))
+            ]
+
+        return compiled
+
+    @staticmethod
+    def _prepare_multiple_values(values) -> List[str]:
+        """Приведение значений multiple-атрибута к списку строк в нижнем регистре"""
+        if not isinstance(values, list):
+            values = [values]
+        return [str(value.get("value", value)).lower() for value in values]
+
+    @staticmethod
+    def collect_candidate_unit_values(candidates_hits: List[Dict]) -> set:
+        """Сбор пар (значение, единица) из атрибутов кандидатов (для разрешения до скоринга)"""
+        pairs = set()
+        for candidate in candidates_hits:
+            source = candidate.get("_source", {})
+            use_features = ShrinkerProducts.has_features(source)
+            for attr in source.get("attributes", []) or []:
+                if use_features and attr.get("features"):
+                    # У обогащенных документов значение уже приведено к базовой единице при индексации
+                    features = attr["features"]
+                    values = [features.get("number")] + list(features.get("items") or [])
+                    unit = features.get("unit")
+                else:
+                    value = attr.get("standardized_value")
+                    values = value if isinstance(value, list) else [value]
+                    unit = attr.get("standardized_unit")
+                    if not unit and values and isinstance(values[0], dict):
+                        unit = values[0].get("unit")
+                for value in values:
+                    if isinstance(value, dict):
+                        value = value.get("value")
+                    if unit and isinstance(value, (int, float, str)):
+                        pairs.add((str(value), unit))
+        return pairs
+
+    @staticmethod
+    def collect_position_unit_values(position_attrs: Dict) -> set:
+        """Сбор пар (значение, единица) атрибутов позиции"""
+        pairs = set()
+        for pos_attr in position_attrs.get("attrs", []):
+            values = pos_attr.get("value")
+            for value in values if isinstance(values, list) else [values]:
+                if isinstance(value, dict) and value.get("unit") and isinstance(value.get("value"), (int, float, str)):
+                    pairs.add((str(value["value"]), value["unit"]))
+        return pairs
+
+    @staticmethod
+    def collect_candidate_attr_names(candidates_hits: List[Dict]) -> List[str]:
+        """Уникальные названия атрибутов кандидатов (как их видит _parse_candidate_attributes)"""
+        names = {}
+        for candidate in candidates_hits:
+            for attr in candidate.get("_source", {}).get("attributes", []) or []:
+                name = attr.get("standardized_name") or attr.get("original_name")
+                if name:
+                    names[name] = None
+        return list(names)
+
+    async def compile_name_scores(self, position_attrs: Dict, candidates_hits: List[Dict]):
+        """Предвычисление схожести названий атрибутов позиции с названиями кандидатов (name_scores)"""
+        attrs = [attr for attr in position_attrs.get("attrs", []) if attr.get("name")]
+        candidate_names = self.collect_candidate_attr_names(candidates_hits)
+        if not attrs or not candidate_names:
+            return
+
+        if self.vectorizer.uses_embeddings:
+            # Эмбеддинги локальные - все пары одной матрицей дешевле, чем отбор пар
+            matrix = await self.vectorizer.similarity_matrix(
+                [attr["name"] for attr in attrs], candidate_names
+            )
+            if matrix is None:
+                return
+            attr_names = [candidate_names] * len(attrs)
+            rows = matrix.tolist()
+        else:
+            # Без эмбеддингов пары идут в сервис - берем только те, что могут дойти до сравнения названий
+            prefilter = CandidatePrefilter(candidates_hits, self._determine_value_subtype, self.has_features)
+            attr_names = []
+            for attr in attrs:
+                try:
+                    attr_names.append(sorted(prefilter.scorable_names(attr)))
+                except TypeError:
+                    attr_names.append(candidate_names)
+
+            pairs = [[attr["name"], name] for attr, names in zip(attrs, attr_names) for name in names]
+            scores = await self.vectorizer.compare_strings_batch(pairs) if pairs else []
+            if len(scores) != len(pairs):
+                return
+            rows, offset = [], 0
+            for names in attr_names:
+                rows.append(scores[offset:offset + len(names)])
+                offset += len(names)
+            logger.debug(
+                f"Схожесть названий: {len(pairs)} пар вместо {len(attrs) * len(candidate_names)}"
+            )
+
+        for attr, names, row in zip(attrs, attr_names, rows):
+            attr.setdefault("compiled", {})["name_scores"] = {
+                self.vectorizer.normalize_text(name): score for name, score in zip(names, row)
+            }
+
+    def prefilter_candidates(
+        self, candidates_hits: List[Dict], position_attrs: Dict, min_required_points: float
+    ) -> List[Dict]:
+        """Отсев кандидатов, которые даже при лучшем раскладе не наберут минимальный балл"""
+        prefilter = CandidatePrefilter(candidates_hits, self._determine_value_subtype, self.has_features)
+        bounds = prefilter.upper_bounds(position_attrs.get("attrs", []))
+
+        passed = [candidate for candidate, bound in zip(candidates_hits, bounds) if bound >= min_required_points]
+        logger.info(f"🧹 Префильтр: осталось {len(passed)} из {len(candidates_hits)} кандидатов")
+        return passed
+
+    async def prepare_candidates(
+        self, candidates_hits: List[Dict], position_attrs: Dict
+    ) -> Tuple[List[Optional[CandidateAttrGroups]], Dict[int, np.ndarray]]:
+        """Парсинг атрибутов всех кандидатов и векторная проверка числовых значений (None - кандидат не распарсен)"""
+        # Кандидаты парсятся параллельно (единицы без кэша уходят в сервис), gather сохраняет порядок
+        grouped_attrs = await asyncio.gather(
+            *[self._parse_candidate_with_semaphore(candidate) for candidate in candidates_hits]
+        )
+
+        numeric_matches = {}
+        if settings.SHRINKER_VECTORIZED_NUMERIC:
+            columns = NumericColumns([groups for groups in grouped_attrs if groups is not None])
+            numeric_matches = await self.match_numeric_columns(position_attrs, columns)
+
+        return grouped_attrs, numeric_matches
+
+    async def _parse_candidate_with_semaphore(self, candidate: Dict) -> Optional[CandidateAttrGroups]:
+        async with self.semaphore:
+            try:
+                source = candidate["_source"]
+                return await self._parse_candidate_attributes(source.get("attributes", []), self.has_features(source))
+            except Exception as e:
+                logger.error(f"Ошибка парсинга атрибутов кандидата {candidate.get('_id')}: {e}")
+                return None
 
     async def process_single_candidate(
         self,
         candidate: Dict,
         position_attrs: Dict,
         min_required_points: int,
+        grouped_attrs: Optional[CandidateAttrGroups] = None,
+        numeric_matches: Optional[Dict[int, np.ndarray]] = None,
+        attr_order: Optional[AttributeOrder] = None,
     ) -> Optional[Dict]:
         """Обработка одного кандидата с группировкой"""
 
@@ -45,11 +235,15 @@ class ShrinkerProducts:
             "early_exit": False,
         }
 
-        # Парсим атрибуты кандидата с группировкой
-        candidate_grouped_attrs = await self._parse_candidate_attributes(candidate_attrs)
+        # Парсим атрибуты кандидата с группировкой (если не распарсены заранее)
+        candidate_grouped_attrs = grouped_attrs
+        if candidate_grouped_attrs is None:
+            candidate_grouped_attrs = await self._parse_candidate_attributes(
+                candidate_attrs, self.has_features(candidate["_source"])
+            )
 
-        # Проверяем каждый атрибут позиции
-        for pos_attr in position_attrs:
+        # Проверяем каждый атрибут позиции (в адаптивном порядке, если он задан)
+        for pos_attr in attr_order.current() if attr_order is not None else position_attrs:
             pos_type = pos_attr.get("type", "unknown_pos_type")
             match_found = False
 
@@ -60,9 +254,13 @@ class ShrinkerProducts:
             match_found = await self._find_attribute_match_in_compitable_groups(
                 pos_attr=pos_attr,
                 compatible_groups=compatible_groups,
-                result=result
+                result=result,
+                numeric_matches=numeric_matches,
             )
 
+            if attr_order is not None:
+                attr_order.observe(pos_attr, match_found)
+
             # Обновляем результат
             if match_found:
                 result["points"] += 1
@@ -105,13 +303,22 @@ class ShrinkerProducts:
         return result
 
     async def _find_attribute_match_in_compitable_groups(
-        self, pos_attr: Dict, compatible_groups: List[Tuple], result: Dict
+        self,
+        pos_attr: Dict,
+        compatible_groups: List[Tuple],
+        result: Dict,
+        numeric_matches: Optional[Dict[int, np.ndarray]] = None,
     ) -> bool:
         """Поиск совпадения атрибута в совместимых группах кандидатов"""
         try:
             pos_type = pos_attr.get("type")
             pos_name = pos_attr.get("name", "")
 
+            # Маска совпадений numeric/range атрибута, посчитанная сразу по всем кандидатам
+            value_mask = None
+            if numeric_matches:
+                value_mask = numeric_matches.get(pos_attr.get("compiled", {}).get("index"))
+
             logger.debug(f"pos_type: {pos_type} | pos_name: {pos_name  }")
 
             # Словарь для хранения кандидатов с совпадающими значениями по типам
@@ -123,12 +330,15 @@ class ShrinkerProducts:
 
                 for cand_attr in group_attrs:
                     # Проверка совместимости по значению
-                    value_match = await self._check_value_compatibility(
-                        pos_attr,
-                        pos_type=pos_type,
-                        cand_parsed=cand_attr,
-                        cand_type=group_type,
-                    )
+                    if value_mask is not None and cand_attr.row >= 0:
+                        value_match = bool(value_mask[cand_attr.row])
+                    else:
+                        value_match = await self._check_value_compatibility(
+                            pos_attr,
+                            pos_type=pos_type,
+                            cand_parsed=cand_attr,
+                            cand_type=group_type,
+                        )
                     if value_match:
                         candidate_attrs_with_value_matches[group_type].append(cand_attr)
 
@@ -139,14 +349,15 @@ class ShrinkerProducts:
 
             # Если нет совпадений по леммам - ищем по стеммам
             if total_matches == 0 and pos_type == "string":
-                pos_stem = self.stemmer.stem(
-                    str(pos_attr.get("value", {}).get("value", ""))
-                )
+                pos_stem = pos_attr.get("compiled", {}).get("stem")
+                if pos_stem is None:
+                    pos_stem = self.stemmer.stem(
+                        str(pos_attr.get("value", {}).get("value", ""))
+                    )
 
                 for group_type, group_attrs in compatible_groups:
                     for cand_attr in group_attrs:
-                        cand_stem = cand_attr.get("stem", "")
-                        if pos_stem == cand_stem:
+                        if pos_stem == cand_attr.stem:
                             candidate_attrs_with_value_matches[group_type].append(
                                 cand_attr
                             )
@@ -155,29 +366,8 @@ class ShrinkerProducts:
                     len(attrs) for attrs in candidate_attrs_with_value_matches.values()
                 )
 
-                # Если и по стеммам ничего не нашли - проверяем названия
+                # Совпадение только по названию не засчитывается - сравнивать названия незачем
                 if total_matches == 0:
-                    all_candidate_names = []
-                    for group_type, group_attrs in compatible_groups:
-                        all_candidate_names.extend(
-                            [attr.get("name", "") for attr in group_attrs]
-                        )
-
-                    if all_candidate_names:
-                        comparison_pairs = [
-                            [pos_name, cand_name] for cand_name in all_candidate_names
-                        ]
-                        name_similarities = await self._check_names_similarity_batch(
-                            comparison_pairs
-                        )
-
-                        if (
-                            name_similarities
-                            and max(name_similarities)
-                            >= settings.THRESHOLD_ATTRIBUTE_MATCH
-                        ):
-                            return False  # Нашли совпадение по названию - не сохраняем
-
                     return False  # Ничего не нашли
 
             if total_matches == 0:
@@ -192,9 +382,8 @@ class ShrinkerProducts:
                         break
 
                 if single_candidate:
-                    cand_name = single_candidate.get("name", "")
-                    name_similarity = await self._check_names_similarity_batch(
-                        [[pos_name, cand_name]]
+                    name_similarity = await self._names_similarity(
+                        pos_attr, [single_candidate.name]
                     )
                     score = name_similarity[0] if name_similarity else 0.0
 
@@ -204,31 +393,26 @@ class ShrinkerProducts:
                             "original_position_attr_name": pos_attr["original_name"],
                             "original_position_attr_value": pos_attr["original_value"],
                             "original_position_attr_unit": pos_attr["original_unit"],
-                            "original_product_attr_name": single_candidate["original_name"],
-                            "original_product_attr_value": single_candidate["original_value"],
+                            "original_product_attr_name": single_candidate.original_name,
+                            "original_product_attr_value": single_candidate.original_value,
                             "name_similarity": score,
                             "value_similarity": 1,
                             "position_attr_type": pos_attr.get("type", "unknown"),
-                            "candidate_attr_type": single_candidate.get(
-                                "type", "unknown"
-                            ),
+                            "candidate_attr_type": single_candidate.type,
                         }
                     )
                     return True
                 return False
 
             # Несколько совпадений - ищем лучшее по названию
-            comparison_pairs = []
             flat_candidates = []
 
             for group_type, group_attrs in candidate_attrs_with_value_matches.items():
                 for cand_attr in group_attrs:
-                    cand_name = cand_attr.get("name", "")
-                    comparison_pairs.append([pos_name, cand_name])
                     flat_candidates.append(cand_attr)
 
-            name_similarities = await self._check_names_similarity_batch(
-                comparison_pairs
+            name_similarities = await self._names_similarity(
+                pos_attr, [cand_attr.name for cand_attr in flat_candidates]
             )
 
             if not name_similarities:
@@ -248,12 +432,12 @@ class ShrinkerProducts:
                     "original_position_attr_name": pos_attr["original_name"],
                     "original_position_attr_value": pos_attr["original_value"],
                     "original_position_attr_unit": pos_attr["original_unit"],
-                    "original_product_attr_name": best_candidate["original_name"],
-                    "original_product_attr_value": best_candidate["original_value"],
+                    "original_product_attr_name": best_candidate.original_name,
+                    "original_product_attr_value": best_candidate.original_value,
                     "name_similarity": max_score,
                     "value_similarity": 1,
                     "position_attr_type": pos_attr.get("type", "unknown"),
-                    "candidate_attr_type": best_candidate.get("type", "unknown"),
+                    "candidate_attr_type": best_candidate.type,
                 }
             )
 
@@ -263,8 +447,123 @@ class ShrinkerProducts:
             logger.error(f"Error in _find_attribute_match_in_compitable_groups: {e}")
             return False
 
+    async def match_numeric_columns(self, position_attrs: Dict, columns: NumericColumns) -> Dict[int, np.ndarray]:
+        """Маски совпадений по значению numeric/range атрибутов позиции сразу по всем кандидатам"""
+        numeric_matches = {}
+        if not len(columns):
+            return numeric_matches
+
+        # Нормализованные значения по (значение, единица) - общие для всех атрибутов позиции
+        normalized = {}
+
+        for pos_attr in position_attrs.get("attrs", []):
+            index = pos_attr.get("compiled", {}).get("index")
+            pos_type = pos_attr.get("type")
+            if index is None or pos_type not in ("numeric", "range"):
+                continue
+
+            try:
+                if pos_type == "numeric":
+                    numeric_matches[index] = await self._match_numeric_column(pos_attr, columns, normalized)
+                else:
+                    numeric_matches[index] = await self._match_range_column(pos_attr, columns, normalized)
+            except Exception as e:
+                # Без маски атрибут сравнивается попарно обычными компараторами
+                logger.debug(f"Векторное сравнение недоступно для '{pos_attr.get('name')}': {e}")
+
+        return numeric_matches
+
+    async def _match_numeric_column(self, pos_attr: Dict, columns: NumericColumns, normalized: Dict) -> np.ndarray:
+        """Numeric позиции против numeric (допуск) и range (вхождение) кандидатов"""
+        raw_pos_value = pos_attr.get("value", {}).get("value")
+        if isinstance(raw_pos_value, str):
+            raw_pos_value = raw_pos_value.replace(",", ".")
+
+        pos_value = float(raw_pos_value)
+        pos_unit = pos_attr.get("value", {}).get("unit")
+
+        is_numeric = ~columns.is_range
+        same_unit = columns.same_unit(pos_unit)
+
+        with np.errstate(invalid="ignore"):
+            mask = is_numeric & same_unit & self._within_tolerance(pos_value, columns.numbers)
+
+            # Разные единицы - сравниваем нормализованные значения
+            other_unit = is_numeric & ~same_unit & columns.unit_present & ~np.isnan(columns.numbers)
+            if pos_unit and other_unit.any():
+                pos_normalized = await self._normalized_value(str(pos_value), pos_unit, normalized)
+                if pos_normalized is not None:
+                    cand_normalized = np.full(len(columns), np.nan)
+                    for row in np.flatnonzero(other_unit):
+                        attr = columns.attrs[row]
+                        value = await self._normalized_value(str(attr.number), attr.unit, normalized)
+                        if value is not None:
+                            cand_normalized[row] = value
+                    mask |= other_unit & self._within_tolerance(pos_normalized, cand_normalized)
+
+            mask |= columns.is_range & (columns.lows <= pos_value) & (pos_value <= columns.highs)
+
+        return mask
+
+    async def _match_range_column(self, pos_attr: Dict, columns: NumericColumns, normalized: Dict) -> np.ndarray:
+        """Range позиции против numeric (вхождение) и range (пересечение) кандидатов"""
+        pos_range = pos_attr.get("value", [])
+        if len(pos_range) < 2:
+            return np.zeros(len(columns), dtype=bool)
+
+        pos_unit = pos_range[0].get("unit")
+        pos_low = range_bound(pos_range[0].get("value"), "_inf-")
+        pos_high = range_bound(pos_range[1].get("value"), "_inf+")
+
+        same_unit = columns.same_unit(pos_unit)
+        other_unit = columns.is_range & ~same_unit & columns.unit_present if pos_unit else np.zeros(len(columns), dtype=bool)
+
+        with np.errstate(invalid="ignore"):
+            mask = ~columns.is_range & (pos_low <= columns.numbers) & (columns.numbers <= pos_high)
+            mask |= (
+                columns.is_range & ~other_unit
+                & (pos_low <= columns.highs) & (columns.lows <= pos_high)
+            )
+
+            # Разные единицы - границы обоих диапазонов нормализуются
+            if other_unit.any():
+                pos_low_n, pos_high_n = [
+                    range_bound(await self._normalized_bound(item.get("value"), pos_unit, normalized), infinity)
+                    for item, infinity in zip(pos_range[:2], ("_inf-", "_inf+"))
+                ]
+                lows = np.full(len(columns), np.nan)
+                highs = np.full(len(columns), np.nan)
+                for row in np.flatnonzero(other_unit):
+                    attr = columns.attrs[row]
+                    if attr.items is None or len(attr.items) < 2:
+                        continue
+                    lows[row] = range_bound(await self._normalized_bound(attr.items[0], attr.unit, normalized), "_inf-")
+                    highs[row] = range_bound(await self._normalized_bound(attr.items[1], attr.unit, normalized), "_inf+")
+                mask |= other_unit & (pos_low_n <= highs) & (lows <= pos_high_n)
+
+        return mask
+
+    @staticmethod
+    def _within_tolerance(value, values: np.ndarray, tolerance: float = 0.1) -> np.ndarray:
+        return np.abs(value - values) / np.maximum(np.maximum(value, values), 1) <= tolerance
+
+    async def _normalized_value(self, value: str, unit: str, normalized: Dict) -> Optional[float]:
+        """Нормализованное значение (None - единица не нормализуется), с мемоизацией на позицию"""
+        key = (value, unit)
+        if key not in normalized:
+            result = await self.unit_normalizer.normalize_unit(value, unit)
+            normalized[key] = result.get("normalized_value") if result.get("success") else None
+        return normalized[key]
+
+    async def _normalized_bound(self, value, unit: str, normalized: Dict):
+        """Граница диапазона в нормализованных единицах (маркеры бесконечности не трогаем)"""
+        if not isinstance(value, (int, float)):
+            return value
+        normalized_value = await self._normalized_value(str(value), unit, normalized)
+        return value if normalized_value is None else normalized_value
+
     def _get_compatible_attribute_groups(
-        self, pos_type: str, candidate_grouped_attrs: Dict
+        self, pos_type: str, candidate_grouped_attrs: CandidateAttrGroups
     ) -> List[tuple]:
         """Определение совместимых групп атрибутов для кросс-типового сравнения"""
         compatibility_rules = {
@@ -279,170 +578,126 @@ class ShrinkerProducts:
         target_types = compatibility_rules.get(pos_type, [])
 
         for target_type in target_types:
-            group_attrs = candidate_grouped_attrs.get(target_type, [])
+            group_attrs = candidate_grouped_attrs.get(target_type)
             if group_attrs:
                 compatible_groups.append((target_type, group_attrs))
 
         return compatible_groups
 
     async def _parse_candidate_attributes(
-        self, candidate_attrs: List[Dict]
-    ) -> Dict[str, List[Dict]]:
-        """Парсинг атрибутов кандидата с группировкой по типам"""
-
-        # Инициализация групп
-        grouped_attrs = {
-            "boolean": [],
-            "numeric": [],
-            "string": [],
-            "range": [],
-            "multiple": [],
-            "unknown": [],
-            "all": [],
-        }
-        value_lemma = ''
-        value_stem = ''
+        self, candidate_attrs: List[Dict], use_features: bool = False
+    ) -> CandidateAttrGroups:
+        """Парсинг атрибутов кандидата с группировкой по типам (use_features - из признаков, сохраненных в ES)"""
+        grouped_attrs = CandidateAttrGroups()
 
         for attr in candidate_attrs:
             try:
-                standardized_name = attr.get("standardized_name")
-                if not standardized_name:
-                    standardized_name = attr.get("original_name", None)
-
-                standardized_value = attr.get("standardized_value")
-                if not standardized_value:
-                    standardized_value = attr.get("original_value", None)
-
-                attribute_type = attr.get("attribute_type", None)
-                if attribute_type is None:
-                    attribute_type = "unknown"
-
-                # Определение единицы измерения в зависимости от типа
-                if attribute_type == "simple":
-                    standardized_unit = attr.get("standardized_unit", "")
-                    value_lemma = attr.get("standardized_value_lemma", standardized_value)
-                    value_stem = attr.get("standardized_value_stem", standardized_value)
-                else:
-                    # Для range/multiple пытаемся извлечь unit из первого элемента
-                    if isinstance(standardized_value, list) and len(standardized_value) > 0:
-                        first_item = standardized_value[0]
-                        standardized_unit = first_item.get("unit") if isinstance(first_item, dict) else None
-                    else:
-                        standardized_unit = attr.get("standardized_unit")
-
-                # Создаем структуру совместимую с attrs_sorter
-                parsed_structure = {
-                    "original_name": attr.get("original_name", ""),
-                    "original_value": attr.get("original_value", ""),
-                    "name": standardized_name,
-                    "type": attribute_type,
-                    "value": self._convert_to_attrs_sorter_format(standardized_value, standardized_unit, attribute_type),
-                    "lemma": value_lemma,
-                    "stem": value_stem
-                }
-
-                # Определяем подтип для simple значений
-                if attribute_type == "simple":
-                    value_subtype = self._determine_value_subtype(standardized_value)
-                    final_type = value_subtype
-                    parsed_structure['type'] = final_type
+                features = attr.get("features") if use_features else None
+                if features:
+                    parsed = CandidateAttr.from_features(attr, features)
                 else:
-                    final_type = attribute_type
-                    parsed_structure['type'] = final_type
-
-                if final_type == "numeric":
-                    value = parsed_structure.get("value", {}).get("value")
-                    unit = parsed_structure.get("value", {}).get("unit")
-
-                    if unit and isinstance(value, (int, float)):
-                        try:
-                            normalized_result = (await self.unit_normalizer.normalize_unit(str(value), unit))
-
-                            if normalized_result.get("success", False):
-                                # Обновляем данные нормализованными значениями
-                                parsed_structure["value"]["value"] = normalized_result.get("base_value", value)
-                                parsed_structure["value"]["unit"] = normalized_result.get("base_unit", unit)
-                            else:
-                                # logger.warning(f"⚠️ Unit normalization failed for {attr}")
-                                pass
-
-                        except Exception as e:
-                            logger.error(f"💥 Error normalizing unit: {e}")
-                elif final_type == "range":
-                    pass
+                    parsed = await self.parse_candidate_attr(attr)
 
                 # Группировка по типам
-                if final_type in grouped_attrs:
-                    grouped_attrs[final_type].append(parsed_structure)
-                else:
-                    grouped_attrs["unknown"].append(parsed_structure)
-                    logger.warning(f"⚠️ Unknown attribute type: {final_type} for {attr.get('original_name', 'name does not defined')}")
-
-                # Добавляем в общий список для обратной совместимости
-                grouped_attrs["all"].append(parsed_structure)
+                if not grouped_attrs.add(parsed):
+                    logger.warning(f"⚠️ Unknown attribute type: {parsed.type} for {attr.get('original_name', 'name does not defined')}")
 
             except Exception as e:
                 logger.error(f"Ошибка конвертации атрибута кандидата: {attr} | с ошибкой: {e}")
 
-        # for group, attrs in grouped_attrs.items():
-        #     logger.info(f"\ngroup: {group} | attrs: {attrs}")
-        #
-        # logger.info(f"grouped_attrs: {grouped_attrs}")
-
         return grouped_attrs
 
-    def _convert_to_attrs_sorter_format(self, value, unit, attr_type):
-        """Конвертация предобработанных атрибутов в формат attrs_sorter"""
-        try:
-            if attr_type == "simple":
-                return {"value": value, "unit": unit}
+    async def parse_candidate_attr(self, attr: Dict) -> CandidateAttr:
+        """Парсинг одного атрибута кандидата: тип, значение, единица, леммы (используется и при обогащении ES)"""
+        standardized_name = attr.get("standardized_name")
+        if not standardized_name:
+            standardized_name = attr.get("original_name", None)
+
+        standardized_value = attr.get("standardized_value")
+        if not standardized_value:
+            standardized_value = attr.get("original_value", None)
+
+        attribute_type = attr.get("attribute_type", None)
+        if attribute_type is None:
+            attribute_type = "unknown"
+
+        parsed = CandidateAttr(
+            name=standardized_name,
+            type=attribute_type,
+            original_name=attr.get("original_name", ""),
+            original_value=attr.get("original_value", ""),
+        )
+
+        # Определение единицы измерения в зависимости от типа
+        if attribute_type == "simple":
+            parsed.unit = attr.get("standardized_unit", "")
+            parsed.lemma = attr.get("standardized_value_lemma", standardized_value)
+            parsed.stem = attr.get("standardized_value_stem", standardized_value)
+            # Определяем подтип для simple значений
+            parsed.type = self._determine_value_subtype(standardized_value)
+        else:
+            # Для range/multiple пытаемся извлечь unit из первого элемента
+            if isinstance(standardized_value, list) and len(standardized_value) > 0:
+                first_item = standardized_value[0]
+                parsed.unit = first_item.get("unit") if isinstance(first_item, dict) else None
+            else:
+                parsed.unit = attr.get("standardized_unit")
 
-            elif attr_type == "range":
-                if isinstance(value, list) and len(value) == 2:
-                    return [
-                        {
-                            "value": (
-                                value[0].get("value")
-                                if isinstance(value[0], dict)
-                                else value[0]
-                            ),
-                            "unit": unit,
-                        },
-                        {
-                            "value": (
-                                value[1].get("value")
-                                if isinstance(value[1], dict)
-                                else value[1]
-                            ),
-                            "unit": unit,
-                        },
-                    ]
-                else:
-                    return [
-                        {"value": value, "unit": unit},
-                        {"value": value, "unit": unit},
-                    ]
-
-            elif attr_type == "multiple":
-                if isinstance(value, list):
-                    return [
-                        {
-                            "value": (
-                                item.get("value") if isinstance(item, dict) else item
-                            ),
-                            "unit": unit,
-                        }
-                        for item in value
-                    ]
-                else:
-                    return [{"value": value, "unit": unit}]
+        self._set_candidate_value(parsed, standardized_value, attribute_type)
+
+        if parsed.type == "numeric":
+            if parsed.unit and isinstance(parsed.value, (int, float)):
+                try:
+                    normalized_result = await self.unit_normalizer.normalize_unit(str(parsed.value), parsed.unit)
+
+                    if normalized_result.get("success", False):
+                        # Обновляем данные нормализованными значениями
+                        parsed.value = normalized_result.get("base_value", parsed.value)
+                        parsed.unit = normalized_result.get("base_unit", parsed.unit)
+
+                except Exception as e:
+                    logger.error(f"💥 Error normalizing unit: {e}")
+
+            parsed.number = self._to_number(parsed.value)
 
+        return parsed
+
+    @staticmethod
+    def has_features(source: Dict) -> bool:
+        """Документ ES обогащен признаками атрибутов актуальной версии"""
+        return source.get("features_version") == settings.ES_FEATURES_VERSION
+
+    @staticmethod
+    def _set_candidate_value(parsed: CandidateAttr, value, attr_type: str):
+        """Раскладка значения атрибута кандидата: скаляр в value, значения range/multiple в items"""
+        if attr_type == "range":
+            if isinstance(value, list) and len(value) == 2:
+                parsed.items = tuple(
+                    item.get("value") if isinstance(item, dict) else item for item in value
+                )
             else:
-                return {"value": value, "unit": unit}
+                parsed.items = (value, value)
 
-        except Exception as e:
-            logger.error(f"Error converting value {value}: {e}")
-            return {"value": str(value), "unit": unit}
+        elif attr_type == "multiple":
+            if isinstance(value, list):
+                parsed.items = tuple(
+                    item.get("value") if isinstance(item, dict) else item for item in value
+                )
+            else:
+                parsed.items = (value,)
+
+        else:
+            parsed.value = value
+
+    @staticmethod
+    def _to_number(value) -> Optional[float]:
+        """Числовое значение атрибута (с запятой в качестве разделителя), None - не число"""
+        try:
+            if isinstance(value, str):
+                value = value.replace(",", ".")
+            return float(value)
+        except (TypeError, ValueError):
+            return None
 
     def _determine_value_subtype(self, value) -> str:
         """Определение подтипа простого значения: boolean, numeric или string"""
@@ -485,6 +740,28 @@ class ShrinkerProducts:
             logger.error(f"Error determining value subtype for {value}: {e}")
             return "string"
 
+    async def _names_similarity(self, pos_attr: Dict, cand_names: List[str]) -> List[float]:
+        """Схожесть названия атрибута позиции с названиями кандидата (из матрицы позиции, если есть)"""
+        name_scores = pos_attr.get("compiled", {}).get("name_scores")
+        if name_scores is not None:
+            scores = [name_scores.get(self.vectorizer.normalize_text(name)) for name in cand_names]
+            if all(score is not None for score in scores):
+                return scores
+
+            if not self.remote_enabled:
+                # Без сети непредвычисленная пара считается несовпадением по названию
+                self.offline_name_misses += sum(1 for score in scores if score is None)
+                return [0.0 if score is None else score for score in scores]
+
+        if not self.remote_enabled:
+            self.offline_name_misses += len(cand_names)
+            return [0.0] * len(cand_names)
+
+        pos_name = pos_attr.get("name", "")
+        return await self._check_names_similarity_batch(
+            [[pos_name, cand_name] for cand_name in cand_names]
+        )
+
     async def _check_names_similarity_batch(self, names_similarity_list):
         try:
             if not names_similarity_list:
@@ -510,7 +787,7 @@ class ShrinkerProducts:
             return 0.0
 
     async def _check_value_compatibility(
-        self, pos_parsed: Dict, pos_type: str, cand_parsed: Dict, cand_type: str
+        self, pos_parsed: Dict, pos_type: str, cand_parsed: CandidateAttr, cand_type: str
     ) -> bool:
         """Проверка совместимости значений атрибутов (обновленная версия)"""
         try:
@@ -528,11 +805,13 @@ class ShrinkerProducts:
 
             # Numeric ↔ Range
             elif pos_type == "numeric" and cand_type == "range":
-                return await self._value_in_range(pos_parsed, cand_parsed)
+                return self._value_in_range(pos_parsed.get("value", {}).get("value"), cand_parsed.items or ())
 
             # Диапазоны
             elif pos_type == "range" and cand_type == "numeric":
-                return await self._value_in_range(cand_parsed, pos_parsed)
+                return self._value_in_range(
+                    cand_parsed.number, [item.get("value") for item in pos_parsed.get("value", [])]
+                )
 
             elif pos_type == "range" and cand_type == "range":
                 return await self._compare_ranges(pos_parsed, cand_parsed)
@@ -551,19 +830,20 @@ class ShrinkerProducts:
             logger.error(f"Ошибка сравнения значений: {e}")
             return False
 
-    async def _compare_boolean_names(self, pos_data: Dict, cand_data: Dict) -> bool:
+    async def _compare_boolean_names(self, pos_data: Dict, cand_data: CandidateAttr) -> bool:
         """Сравнение булевых атрибутов по названиям, а не по значениям"""
         try:
             pos_name = pos_data.get("name", "")
-            cand_name = cand_data.get("name", "")
+            cand_name = cand_data.name
 
             if not pos_name or not cand_name:
                 return False
 
-            if pos_name.lower() == cand_name.lower():
+            compiled = pos_data.get("compiled", {})
+            if compiled.get("name_lower", pos_name.lower()) == cand_name.lower():
                 return True
 
-            similarity = await self.trigrammer.compare_two_strings(pos_name, cand_name)
+            similarity = self._compare_with_signature(compiled.get("name_signature"), pos_name, cand_name)
             # similarity = await self.vectorizer.compare_two_strings(pos_name, cand_name)
             logger.debug(
                 f"Boolean names comparison: '{pos_name}' vs '{cand_name}' = {similarity}"
@@ -576,17 +856,19 @@ class ShrinkerProducts:
             return False
 
     async def _compare_boolean_with_other_types(
-        self, bool_data: Dict, other_data: Dict
+        self, bool_data: Dict, other_data: CandidateAttr
     ) -> bool:
         """Сравнение булевого атрибута с другими типами по названию"""
         try:
             bool_name = bool_data.get("name", "")
-            other_name = other_data.get("name", "")
+            other_name = other_data.name
 
             if not bool_name or not other_name:
                 return False
 
-            similarity = await self.trigrammer.compare_two_strings(bool_name, other_name)
+            similarity = self._compare_with_signature(
+                bool_data.get("compiled", {}).get("name_signature"), bool_name, other_name
+            )
             # similarity = await self.vectorizer.compare_two_strings(pos_name, cand_name)
             logger.debug(
                 f"Boolean vs other type names: '{bool_name}' vs '{other_name}' = {similarity}"
@@ -598,11 +880,11 @@ class ShrinkerProducts:
             logger.error(f"Ошибка кросс-типового сравнения с boolean: {e}")
             return False
 
-    async def _compare_boolean_values(self, pos_data: Dict, cand_data: Dict) -> bool:
+    async def _compare_boolean_values(self, pos_data: Dict, cand_data: CandidateAttr) -> bool:
         """Сравнение булевых значений"""
         try:
             pos_value = pos_data.get("value", {}).get("value")
-            cand_value = cand_data.get("value", {}).get("value")
+            cand_value = cand_data.value
 
             pos_bool = self._normalize_boolean_value(pos_value)
             cand_bool = self._normalize_boolean_value(cand_value)
@@ -653,15 +935,23 @@ class ShrinkerProducts:
 
         return None
 
-    async def _compare_string_values(self, pos_data: Dict, cand_data: Dict) -> bool:
+    def _compare_with_signature(self, pos_signature, pos_string: str, cand_string: str) -> float:
+        """Триграммное сравнение с предвычисленной сигнатурой позиции (если она есть)"""
+        if pos_signature is None:
+            pos_signature = self.trigrammer.build_signature(pos_string)
+        return self.trigrammer.compare_signatures(pos_signature, self.trigrammer.build_signature(cand_string))
+
+    async def _compare_string_values(self, pos_data: Dict, cand_data: CandidateAttr) -> bool:
         """Сравнение строковых значений"""
         try:
             # pos_value = str(pos_data.get("value", {}).get("value", ""))
             # cand_value = str(cand_data.get("value", {}).get("value", ""))
             #
             # similarity = await self.trigrammer.compare_two_strings(pos_value, cand_value)
-            pos_lemma = self.lemmatizator.lemmatize(str(pos_data.get("value", {}).get("value", "")))
-            cand_lemma = cand_data.get("lemma")
+            pos_lemma = pos_data.get("compiled", {}).get("lemma")
+            if pos_lemma is None:
+                pos_lemma = self.lemmatizator.lemmatize(str(pos_data.get("value", {}).get("value", "")))
+            cand_lemma = cand_data.lemma
 
             if pos_lemma == cand_lemma:
                 return True
@@ -673,21 +963,19 @@ class ShrinkerProducts:
             logger.error(f"Ошибка сравнения строковых значений: {e}")
             return False
 
-    async def _compare_numeric_values(self, pos_data: Dict, cand_data: Dict) -> bool:
+    async def _compare_numeric_values(self, pos_data: Dict, cand_data: CandidateAttr) -> bool:
         """Сравнение числовых значений с учетом единиц измерения"""
         raw_pos_value = pos_data.get("value", {}).get("value")
         if isinstance(raw_pos_value, str):
             raw_pos_value = raw_pos_value.replace(",", ".")
 
-        raw_cand_value = cand_data.get("value", {}).get("value")
-
-        if isinstance(raw_pos_value, str):
-            raw_cand_value = raw_cand_value.replace(",", ".")
-
         pos_value = float(raw_pos_value)
-        cand_value = float(raw_cand_value)
+        cand_value = cand_data.number
+        if cand_value is None:
+            return False
+
         pos_unit = pos_data.get("value", {}).get("unit")
-        cand_unit = cand_data.get("value", {}).get("unit")
+        cand_unit = cand_data.unit
 
         try:
             if pos_unit == cand_unit:
@@ -723,15 +1011,15 @@ class ShrinkerProducts:
             logger.error(f"Ошибка сравнения числовых значений position_value: {pos_value}, position_unit: {pos_unit} | candidate_value: {cand_value}, candidate_unit: {cand_unit} | error: {e}")
             return False
 
-    async def _compare_ranges(self, pos_data: Dict, cand_data: Dict) -> bool:
+    async def _compare_ranges(self, pos_data: Dict, cand_data: CandidateAttr) -> bool:
         """Сравнение диапазонов"""
         try:
             pos_range = pos_data.get("value", [])
-            cand_range = cand_data.get("value", [])
+            cand_range = list(cand_data.items or ())
 
             # Нормализация единиц для диапазонов
             pos_unit = pos_range[0].get("unit") if pos_range else None
-            cand_unit = cand_range[0].get("unit") if cand_range else None
+            cand_unit = cand_data.unit if cand_range else None
 
             if (
                 pos_unit != cand_unit
@@ -751,16 +1039,13 @@ class ShrinkerProducts:
                                     "unit": norm_result["normalized_unit"],
                                 }
 
-                    for i, item in enumerate(cand_range):
-                        if isinstance(item.get("value"), (int, float)):
+                    for i, value in enumerate(cand_range):
+                        if isinstance(value, (int, float)):
                             norm_result = await self.unit_normalizer.normalize_unit(
-                                str(item["value"]), cand_unit
+                                str(value), cand_unit
                             )
                             if norm_result.get("success"):
-                                cand_range[i] = {
-                                    "value": norm_result["normalized_value"],
-                                    "unit": norm_result["normalized_unit"],
-                                }
+                                cand_range[i] = norm_result["normalized_value"]
                 except Exception as e:
                     logger.error(f"Error normalizing range units: {e}")
 
@@ -769,8 +1054,7 @@ class ShrinkerProducts:
 
             pos_start = pos_range[0].get("value")
             pos_end = pos_range[1].get("value")
-            cand_start = cand_range[0].get("value")
-            cand_end = cand_range[1].get("value")
+            cand_start, cand_end = cand_range[0], cand_range[1]
 
             if pos_start == "_inf-":
                 pos_start = float("-inf")
@@ -788,55 +1072,18 @@ class ShrinkerProducts:
             return False
 
     @staticmethod
-    async def _value_in_range(value_data: Dict, range_data: Dict) -> bool:
-        """Проверка входит ли значение в диапазон"""
+    def _value_in_range(raw_value, range_values) -> bool:
+        """Проверка входит ли значение в диапазон (границы - значения начала и конца)"""
         try:
-            raw_value = value_data.get("value", {}).get("value")
             if isinstance(raw_value, str):
                 raw_value = raw_value.replace(",", ".")
 
             value = float(raw_value)
-            range_vals = range_data.get("value", [])
 
-            if len(range_vals) < 2:
+            if len(range_values) < 2:
                 return False
 
-            # Нормализация единиц для значения в диапазоне
-            value_unit = value_data.get("value", {}).get("unit")
-            range_unit = range_vals[0].get("unit") if range_vals else None
-
-            if (
-                value_unit != range_unit
-                and value_unit
-                and range_unit
-                and hasattr(value_data, "unit_normalizer")
-            ):
-
-                try:
-                    if isinstance(value, (int, float)):
-                        norm_result = await value_data.unit_normalizer.normalize_unit(
-                            str(value), value_unit
-                        )
-                        if norm_result.get("success"):
-                            value = norm_result["normalized_value"]
-
-                    for i, item in enumerate(range_vals):
-                        if isinstance(item.get("value"), (int, float)):
-                            norm_result = (
-                                await value_data.unit_normalizer.normalize_unit(
-                                    str(item["value"]), range_unit
-                                )
-                            )
-                            if norm_result.get("success"):
-                                range_vals[i] = {
-                                    "value": norm_result["normalized_value"],
-                                    "unit": norm_result["normalized_unit"],
-                                }
-                except Exception as e:
-                    logger.error(f"Error normalizing value-range units: {e}")
-
-            start = range_vals[0].get("value")
-            end = range_vals[1].get("value")
+            start, end = range_values[0], range_values[1]
 
             if start == "_inf-":
                 start = float("-inf")
@@ -845,31 +1092,29 @@ class ShrinkerProducts:
             return start <= value <= end
 
         except Exception as e:
-            logger.error(f"Ошибка проверки значения в диапазоне | value: {value_data} | range: {range_data}: {e}")
+            logger.error(f"Ошибка проверки значения в диапазоне | value: {raw_value} | range: {range_values}: {e}")
             return False
 
-    async def _compare_multiple_values(self, pos_data: Dict, cand_data: Dict) -> bool:
+    async def _compare_multiple_values(self, pos_data: Dict, cand_data: CandidateAttr) -> bool:
         """Сравнение множественных значений"""
         try:
-            pos_values = pos_data.get("value", [])
-            cand_values = cand_data.get("value", [])
-
-            if not isinstance(pos_values, list):
-                pos_values = [pos_values]
-            if not isinstance(cand_values, list):
-                cand_values = [cand_values]
-
-            for pos_val in pos_values:
-                pos_val_str = str(pos_val.get("value", pos_val)).lower()
-                for cand_val in cand_values:
-                    cand_val_str = str(cand_val.get("value", cand_val)).lower()
+            pos_compiled = pos_data.get("compiled", {}).get("multiple_values")
+            if pos_compiled is None:
+                pos_compiled = [
+                    (value_str, self.trigrammer.build_signature(value_str))
+                    for value_str in self._prepare_multiple_values(pos_data.get("value", []))
+                ]
+
+            cand_values = cand_data.texts
+            if not cand_values:
+                return False
 
-                    similarity = await self.trigrammer.compare_two_strings(
-                        pos_val_str, cand_val_str
-                    )
-                    # similarity = await self.vectorizer.compare_two_strings(pos_name, cand_name)
-                    if similarity >= settings.THRESHOLD_VALUE_MATCH:
-                        return True
+            # Все значения кандидата сравниваются с одним значением позиции за один векторный проход
+            for _, pos_signature in pos_compiled:
+                similarities = self.trigrammer.compare_many(pos_signature, cand_values)
+                # similarity = await self.vectorizer.compare_two_strings(pos_name, cand_name)
+                if (similarities >= settings.THRESHOLD_VALUE_MATCH).any():
+                    return True
 
             return False
 
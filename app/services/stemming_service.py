@@ -6,6 +6,8 @@ import nltk
 import os
 
 from app.core.logger import get_logger
+from app.core.settings import settings
+from app.services.text_cache import TextCache
 
 logger = get_logger(name=__name__)
 
@@ -38,6 +40,11 @@ class StemmingService:
         self.stemmer_ru = SnowballStemmer("russian")
         self.stemmer_en = SnowballStemmer("english")
 
+        # Кэши: пословный и построчный (повторяющаяся лексика каталога -> поиск по словарю)
+        self._words_cache = TextCache(max_size=settings.NLP_WORDS_CACHE_SIZE, name="stem_words")
+        self._strings_cache = TextCache(max_size=settings.NLP_STRINGS_CACHE_SIZE, name="stem_strings")
+        self.load_cache()
+
         logger.info("✓ StemmingService инициализирован")
 
     def _detect_language(self, text: str) -> str:
@@ -66,12 +73,22 @@ class StemmingService:
     def _stem_word(self, word: str, lang: str) -> str:
         """Стемминг одного слова"""
         try:
+            if lang not in ("ru", "en"):
+                return word
+
+            # Стеммеры ru и en разные - язык входит в ключ кэша
+            cache_key = f"{lang}:{word}"
+            cached = self._words_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
             if lang == "ru":
-                return self.stemmer_ru.stem(word)
-            elif lang == "en":
-                return self.stemmer_en.stem(word)
+                stem = self.stemmer_ru.stem(word)
             else:
-                return word
+                stem = self.stemmer_en.stem(word)
+
+            self._words_cache.set(cache_key, stem)
+            return stem
         except Exception as e:
             logger.warning(f"Ошибка при стемминге слова '{word}': {e}")
             return word
@@ -100,6 +117,10 @@ class StemmingService:
                 logger.debug(f"Булево значение передано: {text}")
                 return text
 
+            cached = self._strings_cache.get(text)
+            if cached is not None:
+                return cached
+
             # Определяем язык
             lang = self._detect_language(text)
 
@@ -124,9 +145,30 @@ class StemmingService:
                 stems.append(stem)
 
             result = " ".join(stems)
+            self._strings_cache.set(text, result)
 
             return result
 
         except Exception as e:
             logger.error(f"Ошибка при стемминге строки '{text}': {e}")
-            return text
\ No newline at end of file
+            return text
+
+    def _cache_path(self, cache: TextCache) -> str:
+        return os.path.join(settings.NLP_CACHE_DIR, f"{cache.name}.json") if settings.NLP_CACHE_DIR else ""
+
+    def load_cache(self):
+        """Прогрев кэшей с диска (если задан NLP_CACHE_DIR)"""
+        for cache in (self._words_cache, self._strings_cache):
+            cache.load(self._cache_path(cache))
+
+    def save_cache(self):
+        """Сохранение кэшей на диск (если задан NLP_CACHE_DIR)"""
+        for cache in (self._words_cache, self._strings_cache):
+            cache.dump(self._cache_path(cache))
+
+    def get_cache_stats(self) -> dict:
+        """Статистика попаданий/промахов кэшей"""
+        return {
+            "words": self._words_cache.get_stats(),
+            "strings": self._strings_cache.get_stats(),
+        }
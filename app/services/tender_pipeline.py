@@ -0,0 +1,216 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.core.concurrency import WeightedSemaphore
+from app.core.logger import get_logger
+from app.core.settings import settings
+from app.models.tenders import TenderPositions
+from app.services.es_selector import ElasticSelector
+from app.services.pipeline import PipelineStage, StagedPipeline
+from app.services.shrinker.shrinker_main import Shrinker
+
+logger = get_logger(name=__name__)
+
+
+@dataclass
+class PositionJob:
+    """Состояние позиции при прохождении стадий конвейера"""
+    position: TenderPositions
+    # Порядковый номер позиции в тендере (для выдачи ответа из общего _msearch)
+    index: int = 0
+    candidates: Any = None
+    # Страницы кандидатов из ES в потоковом режиме (читаются на стадии скоринга)
+    stream: Optional[AsyncIterator[List[Dict]]] = None
+    position_attrs: Optional[Dict] = None
+    # Кандидаты, прошедшие префильтр на стадии парсинга (их и оценивает стадия скоринга)
+    candidates_hits: Optional[List[Dict]] = None
+    processed_candidates: Optional[List[Dict]] = None
+    reserved_candidates: int = 0
+    # Позиция заняла место в лимите POSITIONS_CONCURRENCY
+    admitted: bool = False
+
+
+class TenderPipeline:
+    """Конвейер обработки позиций тендера: поиск в ES -> парсинг позиции -> скоринг -> запись в PG"""
+
+    def __init__(
+        self,
+        es_service: ElasticSelector,
+        shrink_service: Shrinker,
+        finalize: Callable[..., Awaitable[Any]],
+    ):
+        self.es_service = es_service
+        self.shrink_service = shrink_service
+        self.finalize = finalize
+        self.candidates_budget = WeightedSemaphore(settings.MAX_INFLIGHT_CANDIDATES)
+        # Позиции в работе по всем стадиям: место занимается при входе в конвейер и освобождается на выходе
+        self.positions_limit = asyncio.Semaphore(max(settings.POSITIONS_CONCURRENCY, 1))
+
+        # Окна позиций для _msearch: номер окна -> задача поиска и сколько позиций еще не забрали ответ
+        self.msearch_window = max(settings.ES_MSEARCH_WINDOW, 1)
+        self._positions: List[TenderPositions] = []
+        self._windows: Dict[int, asyncio.Task] = {}
+        self._windows_left: Dict[int, int] = {}
+        # Резерв кандидатов окна, еще не переданный его позициям
+        self._windows_reserved: Dict[int, int] = {}
+
+        self.pipeline = StagedPipeline(
+            name="tender",
+            stages=[
+                PipelineStage("retrieve", self._retrieve, settings.PIPELINE_RETRIEVE_WORKERS, settings.PIPELINE_QUEUE_SIZE),
+                PipelineStage("parse", self._parse, settings.PIPELINE_PARSE_WORKERS, settings.PIPELINE_QUEUE_SIZE),
+                PipelineStage("score", self._score, settings.PIPELINE_SCORE_WORKERS, settings.PIPELINE_QUEUE_SIZE),
+                PipelineStage("persist", self._persist, settings.PIPELINE_PERSIST_WORKERS, settings.PIPELINE_QUEUE_SIZE),
+            ],
+            on_finish=self._release,
+        )
+
+    async def run(self, positions: Sequence[TenderPositions]) -> List[Any]:
+        """Результаты по позициям в исходном порядке (исключение - на месте упавшей позиции)"""
+        self._positions = list(positions)
+
+        # Характеристики всего тендера разбираются пакетными запросами параллельно с поиском в ES:
+        # позиция на стадии парсинга ждет только пачку со своими строками (или берет их из кэша)
+        prefetch = None
+        if settings.ATTRS_STANDARDIZER_BATCH_ENABLED:
+            prefetch = asyncio.create_task(self._prefetch_attributes())
+
+        try:
+            results = await self.pipeline.run(
+                PositionJob(position=position, index=index) for index, position in enumerate(self._positions)
+            )
+        finally:
+            if prefetch is not None and not prefetch.done():
+                prefetch.cancel()
+            for task in self._windows.values():
+                task.cancel()
+            self._windows.clear()
+            self._windows_left.clear()
+            # Доли окон, которые так и не забрали их позиции (позиции упали раньше)
+            for window in list(self._windows_reserved):
+                await self.candidates_budget.release(self._windows_reserved.pop(window, 0))
+
+        logger.info(f"📊 Метрики конвейера: {self.pipeline.get_metrics()}")
+        return results
+
+    async def _prefetch_attributes(self):
+        try:
+            await self.shrink_service.shrinker_positions.prefetch_attributes(self._positions)
+        except Exception as e:
+            logger.error(f"Ошибка предварительного разбора характеристик тендера: {e}")
+
+    async def _retrieve(self, job: PositionJob) -> PositionJob:
+        await self.positions_limit.acquire()
+        job.admitted = True
+
+        if settings.ES_STREAM_ENABLED:
+            # Кандидаты читаются страницами прямо на стадии скоринга, резерв держим до конца позиции
+            job.reserved_candidates = await self.candidates_budget.acquire(settings.ES_CANDIDATES_QTY)
+            job.stream = self.es_service.stream_candidates(index_name=settings.ES_INDEX, position=job.position)
+            job.candidates = {"hits": {"hits": []}}
+            return job
+
+        if settings.ES_MSEARCH_ENABLED:
+            # Резерв под кандидатов всего окна берет поиск окна, позиция получает из него свою долю
+            job.candidates = await self._window_candidates(job)
+        else:
+            # Резервируем место под максимум кандидатов, лишнее возвращаем после ответа ES
+            job.reserved_candidates = await self.candidates_budget.acquire(settings.ES_CANDIDATES_QTY)
+            job.candidates = await self.es_service.find_candidates_for_rabbit(
+                index_name=settings.ES_INDEX, position=job.position
+            )
+
+        candidates_count = len(job.candidates["hits"]["hits"]) if job.candidates else 0
+        unused = max(job.reserved_candidates - candidates_count, 0)
+        await self.candidates_budget.release(unused)
+        job.reserved_candidates -= unused
+        return job
+
+    async def _window_candidates(self, job: PositionJob) -> Any:
+        """Кандидаты позиции из _msearch ее окна (первая позиция окна запускает поиск для всего окна)"""
+        window = job.index // self.msearch_window
+        start = window * self.msearch_window
+
+        task = self._windows.get(window)
+        if task is None:
+            window_positions = self._positions[start:start + self.msearch_window]
+            task = asyncio.create_task(self._search_window(window, window_positions))
+            self._windows[window] = task
+            self._windows_left[window] = len(window_positions)
+
+        # shield: отмена одной позиции не должна отменять поиск для остальных позиций окна
+        responses = await asyncio.shield(task)
+        candidates, responses[job.index - start] = responses[job.index - start], None
+
+        # Доля резерва окна переходит к позиции: дальше она освобождается как обычный резерв позиции
+        job.reserved_candidates = min(settings.ES_CANDIDATES_QTY, self._windows_reserved.get(window, 0))
+        self._windows_reserved[window] = self._windows_reserved.get(window, 0) - job.reserved_candidates
+
+        # Последняя позиция окна освобождает его ответы
+        self._windows_left[window] -= 1
+        if not self._windows_left[window]:
+            self._windows.pop(window, None)
+            self._windows_left.pop(window, None)
+            await self.candidates_budget.release(self._windows_reserved.pop(window, 0))
+        return candidates
+
+    async def _search_window(self, window: int, window_positions: List[TenderPositions]) -> List[Any]:
+        """_msearch окна позиций: ответ держит кандидатов всех позиций окна, поэтому резерв - до запроса"""
+        self._windows_reserved[window] = await self.candidates_budget.acquire(
+            len(window_positions) * settings.ES_CANDIDATES_QTY
+        )
+        try:
+            return await self.es_service.find_candidates_multi(index_name=settings.ES_INDEX, positions=window_positions)
+        except BaseException:
+            # Ответа нет - позициям окна передавать нечего
+            await self.candidates_budget.release(self._windows_reserved.pop(window, 0))
+            raise
+
+    async def _parse(self, job: PositionJob) -> PositionJob:
+        if job.stream is not None:
+            job.position_attrs = await self.shrink_service.prepare_position(position=job.position)
+        else:
+            job.position_attrs, job.candidates_hits = await self.shrink_service.prepare(
+                candidates=job.candidates, position=job.position
+            )
+        return job
+
+    async def _score(self, job: PositionJob) -> PositionJob:
+        if job.stream is not None:
+            stream, job.stream = job.stream, None
+            if job.position_attrs is None:
+                await stream.aclose()
+            else:
+                job.processed_candidates = await self.shrink_service.shrink_stream(
+                    stream, position=job.position, position_attrs=job.position_attrs
+                )
+        elif job.position_attrs is not None:
+            job.processed_candidates = await self.shrink_service.score(
+                candidates_hits=job.candidates_hits, position=job.position, position_attrs=job.position_attrs
+            )
+            job.candidates_hits = None
+        return job
+
+    async def _persist(self, job: PositionJob) -> Dict:
+        await self.finalize(
+            candidates=job.candidates, processed_candidates=job.processed_candidates, position=job.position
+        )
+
+        return {
+            "position_id": job.position.id,
+            "position_title": job.position.title,
+            "candidates_count": len(job.candidates["hits"]["hits"]),
+            "candidates": job.candidates["hits"]["hits"],
+        }
+
+    async def _release(self, job: PositionJob, error: Optional[BaseException]):
+        # Позиция упала до скоринга - закрываем поток, чтобы освободить point in time в ES
+        if job.stream is not None:
+            await job.stream.aclose()
+            job.stream = None
+        await self.candidates_budget.release(job.reserved_candidates)
+        job.reserved_candidates = 0
+        if job.admitted:
+            self.positions_limit.release()
+            job.admitted = False
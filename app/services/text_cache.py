@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.logger import get_logger
+
+logger = get_logger(name=__name__)
+
+
+class TextCache:
+    """Ограниченный по размеру LRU кэш со строковыми ключами и счетчиками попаданий/промахов"""
+
+    def __init__(self, max_size: int, name: str = "cache"):
+        self.name = name
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получить значение из кэша (None - промах)"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        """Положить значение в кэш с вытеснением самых старых записей"""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        # Проверка без учета в статистике попаданий
+        return key in self._data
+
+    def get_stats(self) -> Dict[str, float]:
+        """Статистика кэша"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def load(self, path: str) -> int:
+        """Прогрев кэша с диска, возвращает кол-во загруженных записей"""
+        if not path or not os.path.exists(path):
+            return 0
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            for key, value in data.items():
+                self.set(key, value)
+
+            logger.info(f"♻️ Кэш '{self.name}' прогрет с диска: {len(data)} записей")
+            return len(data)
+
+        except Exception as e:
+            logger.error(f"Ошибка загрузки кэша '{self.name}' из {path}: {e}")
+            return 0
+
+    def dump(self, path: str) -> bool:
+        """Сохранение кэша на диск (атомарно, через временный файл)"""
+        if not path:
+            return False
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._lock:
+                data = dict(self._data)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+            logger.info(f"💾 Кэш '{self.name}' сохранен на диск: {len(data)} записей")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша '{self.name}' в {path}: {e}")
+            return False
@@ -1,17 +1,34 @@
 import logging
-from typing import List, Optional, Any, Set, Tuple, Dict
+import zlib
+from typing import List, Optional, Any, Set, Tuple, Dict, Sequence, Union
 from dataclasses import dataclass
 import re
 
+import numpy as np
+
+from app.core.settings import settings
+from app.services.text_cache import TextCache
+
 
 logger = logging.getLogger(__name__)
 
+# Кол-во наборов n-грамм в сигнатуре: биграммы/триграммы x (без разделителя, с '_', с паддингом)
+NGRAM_KINDS = 6
+
+
+@dataclass(frozen=True)
+class NgramSignature:
+    """Хэшированные n-граммы строки: отсортированные id (номер набора в старших битах) и размеры наборов"""
+    ids: np.ndarray
+    sizes: np.ndarray
+
 
 class Trigrammer:
     """Сервис для создания триграмм"""
 
     def __init__(self):
-        pass
+        # Интернирование сигнатур: повторяющиеся значения каталога не пересчитываются
+        self._signatures = TextCache(max_size=settings.TRIGRAM_SIGNATURE_CACHE_SIZE, name="ngram_signatures")
 
     def clean_text(self, text, separator: Optional[str] = ''):
         """
@@ -92,51 +109,84 @@ class Trigrammer:
 
         return len(intersection) / len(union)
 
+    def build_signature(self, text: str) -> NgramSignature:
+        """Очистка строки и построение хэшированной сигнатуры всех наборов n-грамм (с интернированием)"""
+        if isinstance(text, str):
+            cached = self._signatures.get(text)
+            if cached is not None:
+                return cached
+
+        clean_string = self.clean_text(text)
+        clean_string_ = self.clean_text(text, separator='_')
+
+        ngram_sets = (
+            self.create_bigrams(clean_string)[1],
+            self.create_ngrams(text=clean_string_, n=2, padding=False)[1],
+            self.create_ngrams(text=clean_string_, n=2, padding=True)[1],
+            self.create_trigrams(clean_string)[1],
+            self.create_ngrams(text=clean_string_, n=3, padding=False)[1],
+            self.create_ngrams(text=clean_string_, n=3, padding=True)[1],
+        )
+
+        ids = np.array(
+            sorted({
+                (kind << 32) | zlib.crc32(ngram.encode("utf-8"))
+                for kind, ngrams in enumerate(ngram_sets)
+                for ngram in ngrams
+            }),
+            dtype=np.int64,
+        )
+        signature = NgramSignature(ids=ids, sizes=np.bincount(ids >> 32, minlength=NGRAM_KINDS))
+
+        if isinstance(text, str):
+            self._signatures.set(text, signature)
+
+        return signature
+
+    @staticmethod
+    def _mean_jaccard(intersections: np.ndarray, sizes1: np.ndarray, sizes2: np.ndarray) -> np.ndarray:
+        """Среднее по наборам n-грамм значение коэффициента Жаккара (оба набора пусты -> 1.0)"""
+        unions = sizes1 + sizes2 - intersections
+        similarities = np.where(unions > 0, intersections / np.maximum(unions, 1), 1.0)
+        return similarities.mean(axis=-1)
+
+    def compare_signatures(self, signature1: NgramSignature, signature2: NgramSignature) -> float:
+        """Сравнение двух сигнатур (среднее по 6 коэффициентам Жаккара)"""
+        intersection = np.intersect1d(signature1.ids, signature2.ids, assume_unique=True)
+        intersections = np.bincount(intersection >> 32, minlength=NGRAM_KINDS)
+        return float(self._mean_jaccard(intersections, signature1.sizes, signature2.sizes))
+
+    def compare_many(
+        self,
+        query: Union[str, NgramSignature],
+        candidates: Sequence[Union[str, NgramSignature]],
+    ) -> np.ndarray:
+        """Сравнение одной строки со множеством строк за один векторизованный проход"""
+        if not isinstance(query, NgramSignature):
+            query = self.build_signature(query)
+        signatures = [
+            candidate if isinstance(candidate, NgramSignature) else self.build_signature(candidate)
+            for candidate in candidates
+        ]
+        if not signatures:
+            return np.zeros(0)
+
+        all_ids = np.concatenate([signature.ids for signature in signatures])
+        owners = np.repeat(np.arange(len(signatures)), [len(signature.ids) for signature in signatures])
+
+        matched = np.isin(all_ids, query.ids)
+        intersections = np.bincount(
+            owners[matched] * NGRAM_KINDS + (all_ids[matched] >> 32),
+            minlength=len(signatures) * NGRAM_KINDS,
+        ).reshape(len(signatures), NGRAM_KINDS)
+
+        sizes = np.stack([signature.sizes for signature in signatures])
+        return self._mean_jaccard(intersections, query.sizes, sizes)
+
     async def compare_two_strings(self, string1: str, string2: str) -> float:
         """Сравнение двух строк через триграммы, биграммы и униграммы"""
+        return self.compare_signatures(self.build_signature(string1), self.build_signature(string2))
 
-        # logger.info(f"Сравниваем '{string1}' с '{string2}'")
-        # Очищаем тексты
-        clean_string1 = self.clean_text(string1)
-        clean_string_1 = self.clean_text(string1, separator='_')
-        clean_string2 = self.clean_text(string2)
-        clean_string_2 = self.clean_text(string2, separator='_')
-        # logger.info(f"Отчищенные строки '{clean_string1}' с '{clean_string2}'")
-
-        # Создаем биграммы
-        _, bigrams1 = self.create_bigrams(clean_string1)
-        _, bi_grams1 = self.create_ngrams(text=clean_string_1, n=2, padding=False)
-        _, __bi_grams1__ = self.create_ngrams(text=clean_string_1, n=2, padding=True)
-
-        _, bigrams2 = self.create_bigrams(clean_string2)
-        _, bi_grams2 = self.create_ngrams(text=clean_string_2, n=2, padding=False)
-        _, __bi_grams2__ = self.create_ngrams(text=clean_string_2, n=2, padding=True)
-
-        bigrams_similarity = self.calculate_jaccard_similarity(bigrams1, bigrams2)
-        bi_grams_similarity = self.calculate_jaccard_similarity(bi_grams1, bi_grams2)
-        __bi_grams__similarity = self.calculate_jaccard_similarity(__bi_grams1__, __bi_grams2__)
-        # logger.info(f'\nсписки нграмм (схожесть {bigrams_similarity}): \n{bigrams1}\n{bigrams2}')
-
-        # Создаем триграммы
-        _, trigrams1 = self.create_trigrams(clean_string1)
-        _, tri_grams1 = self.create_ngrams(text=clean_string_1, n=3, padding=False)
-        _, __tri_grams1__ = self.create_ngrams(text=clean_string_1, n=3, padding=True)
-
-        _, trigrams2 = self.create_trigrams(clean_string2)
-        _, tri_grams2 = self.create_ngrams(text=clean_string_2, n=3, padding=False)
-        _, __tri_grams2__ = self.create_ngrams(text=clean_string_2, n=3, padding=True)
-
-        # print(bigrams1, bi_grams1, __bi_grams1__)
-        # print(bigrams2, bi_grams2, __bi_grams2__)
-        # print(trigrams1, tri_grams1, __tri_grams1__)
-        # print(trigrams2, tri_grams2, __tri_grams2__)
-
-        trigrams_similarity = self.calculate_jaccard_similarity(trigrams1, trigrams2)
-        tri_grams_similarity = self.calculate_jaccard_similarity(tri_grams1, tri_grams2)
-        __tri_grams__similarity = self.calculate_jaccard_similarity(__tri_grams1__, __tri_grams2__)
-        # logger.info(f'\nсписки нграмм (схожесть {trigrams_similarity}): \n{trigrams1}\n{trigrams2}')
-
-        # if bigrams_similarity < 0.5 or bi_grams_similarity < 0.5 or __bi_grams__similarity < 0.5 or trigrams_similarity < 0.5 or tri_grams_similarity < 0.5 or __tri_grams__similarity < 0.5:
-        #     return {}
-
-        return (bigrams_similarity + bi_grams_similarity + __bi_grams__similarity + trigrams_similarity + tri_grams_similarity + __tri_grams__similarity) / 6
+    def get_cache_stats(self) -> dict:
+        """Статистика интернирования сигнатур"""
+        return {"signatures": self._signatures.get_stats()}
@@ -0,0 +1,189 @@
+from typing import Dict, Optional, Tuple
+
+from app.core.logger import get_logger
+
+logger = get_logger(name=__name__)
+
+
+# Таблица единиц: величина -> (опорная единица, {(синонимы единицы): множитель к опорной})
+# Опорная единица - только внутренняя: базовую единицу и множитель к ней задает сервис стандартизации
+# (калибровка по его ответу на "1 <опорная единица>"), чтобы локальные и удаленные значения не расходились
+UNITS_TABLE: Dict[str, Tuple[str, Dict[Tuple[str, ...], float]]] = {
+    "length": ("м", {
+        ("нм", "nm", "нанометр"): 1e-9,
+        ("мкм", "µm", "um", "микрон", "микрометр"): 1e-6,
+        ("мм", "mm", "миллиметр"): 1e-3,
+        ("см", "cm", "сантиметр"): 1e-2,
+        ("дм", "dm", "дециметр"): 1e-1,
+        ("м", "m", "метр", "мтр", "пог. м", "п.м"): 1.0,
+        ("км", "km", "километр"): 1e3,
+        ("дюйм", "in", "inch", "\"", "″"): 0.0254,
+        ("фут", "ft", "foot"): 0.3048,
+    }),
+    "mass": ("кг", {
+        ("мкг", "µg", "ug", "микрограмм"): 1e-9,
+        ("мг", "mg", "миллиграмм"): 1e-6,
+        ("г", "гр", "g", "грамм"): 1e-3,
+        ("кг", "kg", "килограмм"): 1.0,
+        ("ц", "центнер"): 100.0,
+        ("т", "t", "тонна"): 1e3,
+        ("lb", "фунт"): 0.45359237,
+    }),
+    "volume": ("л", {
+        ("мкл", "µl", "ul", "микролитр"): 1e-6,
+        ("мл", "ml", "миллилитр", "см3", "см³", "cm3", "куб. см"): 1e-3,
+        ("дл", "dl", "децилитр"): 1e-1,
+        ("л", "l", "литр", "дм3", "дм³", "dm3"): 1.0,
+        ("м3", "м³", "m3", "куб. м", "кубометр"): 1e3,
+    }),
+    "power": ("Вт", {
+        ("мВт", "mW", "милливатт"): 1e-3,
+        ("Вт", "W", "ватт"): 1.0,
+        ("кВт", "kW", "киловатт"): 1e3,
+        ("МВт", "MW", "мегаватт"): 1e6,
+        ("л.с.", "лс", "hp", "лошадиная сила"): 735.49875,
+    }),
+    "voltage": ("В", {
+        ("мкВ", "µV", "uV", "микровольт"): 1e-6,
+        ("мВ", "mV", "милливольт"): 1e-3,
+        ("В", "V", "вольт"): 1.0,
+        ("кВ", "kV", "киловольт"): 1e3,
+        ("МВ", "MV", "мегавольт"): 1e6,
+    }),
+    "pressure": ("Па", {
+        ("Па", "Pa", "паскаль"): 1.0,
+        ("гПа", "hPa", "гектопаскаль"): 1e2,
+        ("кПа", "kPa", "килопаскаль"): 1e3,
+        ("МПа", "MPa", "мегапаскаль"): 1e6,
+        ("мбар", "mbar", "миллибар"): 1e2,
+        ("бар", "bar"): 1e5,
+        ("атм", "atm", "атмосфера"): 101325.0,
+        ("ат", "кгс/см2", "кгс/см²", "at"): 98066.5,
+        ("мм рт. ст.", "мм рт.ст.", "мм рт ст", "mmHg"): 133.322,
+        ("psi", "фунт/дюйм2"): 6894.757,
+    }),
+    # Приставки К/М/Г/Т для данных считаем двоичными (1024), как принято в русскоязычных каталогах
+    "data": ("байт", {
+        # Kb/Mb/Gb и "b" не включены: в каталогах ими обозначают и биты, и байты
+        ("бит", "bit"): 1 / 8,
+        ("Кбит", "кбит", "Kbit", "kbit"): 1024 / 8,
+        ("Мбит", "Mbit"): 1024 ** 2 / 8,
+        ("Гбит", "Gbit"): 1024 ** 3 / 8,
+        ("байт", "Б", "B", "byte"): 1.0,
+        ("КБ", "Кб", "кБ", "кб", "KB", "kB", "KiB", "килобайт"): 1024.0,
+        ("МБ", "Мб", "MB", "MiB", "мегабайт"): 1024.0 ** 2,
+        ("ГБ", "Гб", "GB", "GiB", "гигабайт"): 1024.0 ** 3,
+        ("ТБ", "Тб", "TB", "TiB", "терабайт"): 1024.0 ** 4,
+    }),
+    "time": ("с", {
+        ("мкс", "µs", "us", "микросекунда"): 1e-6,
+        ("мс", "ms", "миллисекунда"): 1e-3,
+        ("с", "сек", "s", "sec", "секунда"): 1.0,
+        ("мин", "min", "минута"): 60.0,
+        ("ч", "час", "h", "hr", "hour"): 3600.0,
+        ("сут", "сутки", "дн", "день", "d", "day"): 86400.0,
+        ("нед", "неделя", "week"): 604800.0,
+        ("мес", "месяц", "month"): 2629746.0,
+        ("год", "лет", "year", "yr"): 31556952.0,
+    }),
+}
+
+
+# Без учета регистра не сопоставляются: "Mb"/"mb" в каталогах - и мегабит, и мегабайт
+_CASE_SENSITIVE = {"b", "kb", "mb", "gb", "tb"}
+
+
+class LocalUnitConverter:
+    """Локальный пересчет известных единиц в базовые единицы сервиса (без обращения к сервису)"""
+
+    def __init__(self):
+        # Точное совпадение (регистр важен: мВт != МВт, мб != Мб)
+        self._exact: Dict[str, Tuple[str, float]] = {}
+        for quantity, (_, units) in UNITS_TABLE.items():
+            for aliases, factor in units.items():
+                for alias in aliases:
+                    self._exact[alias] = (quantity, factor)
+
+        # Совпадение без учета регистра - только для однозначных синонимов
+        candidates: Dict[str, set] = {}
+        for alias, conversion in self._exact.items():
+            candidates.setdefault(alias.lower(), set()).add(conversion)
+        self._lower: Dict[str, Tuple[str, float]] = {
+            alias: next(iter(conversions))
+            for alias, conversions in candidates.items()
+            if len(conversions) == 1 and alias not in _CASE_SENSITIVE
+        }
+
+        # Величина -> базовые единицы сервиса и множители к ним от опорной единицы таблицы
+        self._calibration: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _clean_unit(unit: str) -> str:
+        return " ".join(str(unit).replace("ё", "е").split())
+
+    def lookup(self, unit: str) -> Optional[Tuple[str, float]]:
+        """Величина и множитель к опорной единице (None - единица неизвестна)"""
+        if not unit:
+            return None
+
+        cleaned = self._clean_unit(unit)
+        conversion = self._exact.get(cleaned) or self._lower.get(cleaned.lower())
+        if conversion is None and cleaned.endswith(".") and len(cleaned.rstrip(".")) > 1:
+            # "мм." / "сек." -> без точки на конце; однобуквенные ("г." - год или грамм) неоднозначны
+            stripped = cleaned.rstrip(".")
+            conversion = self._exact.get(stripped) or self._lower.get(stripped.lower())
+
+        return conversion
+
+    def quantity(self, unit: str) -> Optional[str]:
+        conversion = self.lookup(unit)
+        return conversion[0] if conversion else None
+
+    @staticmethod
+    def reference_unit(quantity: str) -> str:
+        return UNITS_TABLE[quantity][0]
+
+    def is_calibrated(self, quantity: str) -> bool:
+        return quantity in self._calibration
+
+    def calibrate(self, quantity: str, response: Dict) -> bool:
+        """Калибровка величины по ответу сервиса на 1 опорную единицу (False - ответ не подходит)"""
+        if not response or not response.get("success"):
+            return False
+
+        base_factor = response.get("base_value")
+        base_unit = response.get("base_unit")
+        if not isinstance(base_factor, (int, float)) or isinstance(base_factor, bool) or base_factor <= 0 or not base_unit:
+            return False
+
+        normalized_factor = response.get("normalized_value", base_factor)
+        if not isinstance(normalized_factor, (int, float)) or isinstance(normalized_factor, bool):
+            return False
+
+        self._calibration[quantity] = {
+            "base_unit": base_unit,
+            "base_factor": float(base_factor),
+            "normalized_unit": response.get("normalized_unit", base_unit),
+            "normalized_factor": float(normalized_factor),
+        }
+        return True
+
+    def convert(self, value: float, unit: str) -> Optional[dict]:
+        """Пересчет значения в формате ответа сервиса стандартизации (None - единица неизвестна или величина не откалибрована)"""
+        conversion = self.lookup(unit)
+        if conversion is None:
+            return None
+
+        quantity, factor = conversion
+        calibration = self._calibration.get(quantity)
+        if calibration is None:
+            return None
+
+        reference_value = value * factor
+        return {
+            "success": True,
+            "base_value": reference_value * calibration["base_factor"],
+            "base_unit": calibration["base_unit"],
+            "normalized_value": reference_value * calibration["normalized_factor"],
+            "normalized_unit": calibration["normalized_unit"],
+        }
@@ -1,9 +1,12 @@
 import asyncio
 import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.core.connection_pool import connection_pool
+from app.services.text_cache import TextCache
+from app.services.unit_converter import LocalUnitConverter, UNITS_TABLE
 
 logger = get_logger(name=__name__)
 
@@ -12,13 +15,155 @@ class UnitStandardizer:
     def __init__(self, api_url: str = settings.SERVICE_LINK_UNIT_STANDARDIZER):
         self.api_url = api_url
 
+        # Локальная таблица известных единиц (откалиброванная по сервису) - сервис нужен только для неизвестных
+        self.local_converter = LocalUnitConverter() if settings.UNIT_LOCAL_CONVERSION_ENABLED else None
+
+        # Ответы сервиса по паре (значение, единица) - ровно то, что вернул сервис, без вывода коэффициентов
+        self._results = TextCache(max_size=settings.UNIT_STANDARDIZER_CACHE_SIZE, name="unit_standardizer")
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._semaphore = asyncio.Semaphore(settings.UNIT_STANDARDIZER_CONCURRENCY)
+
+        # False - только локальные данные (воркеры процессного пула не ходят в сеть)
+        self.remote_enabled = True
+
+        self.local_hits = 0
+        self.remote_calls = 0
+        self.offline_misses = 0
+
     async def normalize_unit(self, value: str, unit: str) -> dict:
+        """Нормализация значения: по локальной таблице, по кэшу ответов сервиса, иначе через сервис"""
+        numeric_value = self._to_float(value)
+        quantity = self._local_quantity(value, unit)
+        if quantity is not None and await self._calibrate(quantity):
+            local_result = self.local_converter.convert(numeric_value, unit)
+            if local_result is not None:
+                self.local_hits += 1
+                return local_result
+
+        key = self._key(value, unit)
+        cached = self._results.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        if not self.remote_enabled:
+            self.offline_misses += 1
+            return {}
+
+        return dict(await self._resolve(key, value, unit))
+
+    async def normalize_batch(self, pairs: List[Tuple[str, str]]) -> List[dict]:
+        """Нормализация списка пар (value, unit): неизвестные пары разрешаются параллельно"""
+        await self.prefetch(pairs)
+        return [await self.normalize_unit(value, unit) for value, unit in pairs]
+
+    async def prefetch(self, pairs: Iterable[Tuple[Any, str]]):
+        """Разрешение всех еще неизвестных пар (value, unit) параллельными запросами с ограничением конкурентности"""
+        if not self.remote_enabled:
+            return
+
+        pairs = [(value, unit) for value, unit in pairs if value is not None and unit]
+        # Сначала калибровка локальной таблицы: пары откалиброванных величин считаются без сервиса
+        quantities = {self._local_quantity(value, unit) for value, unit in pairs} - {None}
+        calibrated = dict(zip(quantities, await asyncio.gather(*[self._calibrate(q) for q in quantities])))
+
+        tasks = {}
+        for value, unit in pairs:
+            if calibrated.get(self._local_quantity(value, unit)):
+                continue
+            key = self._key(value, unit)
+            if key not in tasks and key not in self._results:
+                tasks[key] = self._resolve(key, value, unit)
+
+        if tasks:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            logger.debug(f"Разрешено пар (значение, единица): {len(tasks)}")
+
+    async def _resolve(self, key: str, value, unit: str) -> dict:
+        """Запрос в сервис с объединением одинаковых параллельных запросов"""
+        if key in self._in_flight:
+            return await self._in_flight[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        result = {}
+        try:
+            async with self._semaphore:
+                result = await self._normalize_remote(str(value), unit)
+            # Пустой ответ - ошибка запроса, а не ответ сервиса: не кэшируем, повторим в следующий раз
+            if result:
+                self._results.set(key, result)
+        finally:
+            self._in_flight.pop(key, None)
+            if not future.done():
+                future.set_result(result)
+        return result
+
+    async def _calibrate(self, quantity: str) -> bool:
+        """Калибровка величины локальной таблицы по ответу сервиса на 1 опорную единицу"""
+        if self.local_converter.is_calibrated(quantity):
+            return True
+
+        reference_unit = self.local_converter.reference_unit(quantity)
+        key = self._key(1, reference_unit)
+        if key in self._results:
+            response = self._results.get(key)
+        elif self.remote_enabled:
+            response = await self._resolve(key, "1", reference_unit)
+        else:
+            return False
+
+        if not self.local_converter.calibrate(quantity, response):
+            return False
+        logger.info(f"📏 Единицы '{quantity}' откалиброваны по сервису: базовая единица {response.get('base_unit')}")
+        return True
+
+    def export_results(self, pairs: Iterable[Tuple[Any, str]]) -> Dict[str, dict]:
+        """Закэшированные ответы сервиса для пар (для передачи в воркеры процессного пула)"""
+        # Вместе с калибровочными ответами - воркер откалибрует локальную таблицу так же, как родитель
+        pairs = list(pairs)
+        if self.local_converter is not None:
+            pairs += [(1, self.local_converter.reference_unit(quantity)) for quantity in UNITS_TABLE]
+
+        results = {}
+        for value, unit in pairs:
+            if value is None or not unit:
+                continue
+            key = self._key(value, unit)
+            if key in self._results:
+                results[key] = self._results.get(key)
+        return results
+
+    def import_results(self, results: Dict[str, dict]):
+        for key, result in results.items():
+            self._results.set(key, result)
+
+    def _local_quantity(self, value, unit: str) -> Optional[str]:
+        """Величина из локальной таблицы для числового значения (None - нужен сервис)"""
+        if self.local_converter is None or not unit or self._to_float(value) is None:
+            return None
+        return self.local_converter.quantity(unit)
+
+    @classmethod
+    def _key(cls, value, unit: str) -> str:
+        # "10", "10.0" и "10,0" - одна пара
+        number = cls._to_float(value)
+        return f"{unit}\x1f{number if number is not None else str(value).strip()}"
+
+    @staticmethod
+    def _to_float(value) -> Optional[float]:
+        try:
+            return float(str(value).strip().replace(",", "."))
+        except (TypeError, ValueError):
+            return None
+
+    async def _normalize_remote(self, value: str, unit: str) -> dict:
         for attempt in range(3):
             try:
                 session = await connection_pool.get_http_session('unit_standardizer')
                 url = f"{self.api_url}/api/v1/normalize"
                 payload = {"value": value, "unit": unit}
 
+                self.remote_calls += 1
                 async with session.post(url, json=payload) as response:
                     if response.status == 200:
                         result = await response.json()
@@ -33,4 +178,13 @@ class UnitStandardizer:
                 else:
                     logging.error(f"Ошибка при стандартизации юнитов: {e}")
                     return {}
-        return {}
\ No newline at end of file
+        return {}
+
+    def get_cache_stats(self) -> dict:
+        """Статистика кэша ответов сервиса"""
+        return {
+            **self._results.get_stats(),
+            "local_hits": self.local_hits,
+            "remote_calls": self.remote_calls,
+            "offline_misses": self.offline_misses,
+        }
@@ -1,9 +1,15 @@
 import asyncio
 import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from app.core.logger import get_logger
 from app.core.settings import settings
 from app.core.connection_pool import connection_pool
+from app.services.embeddings import HashingEmbedder, VectorCache
+from app.services.text_cache import TextCache
 
 logger = get_logger(name=__name__)
 
@@ -12,6 +18,24 @@ class SemanticMatcher:
     def __init__(self, api_url: str = settings.SERVICE_LINK_SEMANTIC_MATCHER):
         self.api_url = api_url
 
+        # Коалесинг: пары от всех параллельных кандидатов собираются в микро-батчи
+        self.batch_max_size = settings.SEMANTIC_BATCH_MAX_SIZE
+        self.batch_max_wait = settings.SEMANTIC_BATCH_MAX_WAIT_MS / 1000
+        self._scores_cache = TextCache(max_size=settings.SEMANTIC_CACHE_SIZE, name="semantic_pairs")
+        self._pending: Dict[str, Tuple[List[str], asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set = set()
+
+        self.batches_sent = 0
+        self.pairs_sent = 0
+
+        # Режим эмбеддингов: векторы уникальных строк кэшируются, схожесть считается локально
+        self.mode = settings.SEMANTIC_MATCHER_MODE
+        self._vectors = VectorCache(max_size=settings.SEMANTIC_VECTOR_CACHE_SIZE, name="semantic_vectors")
+        self._local_embedder = HashingEmbedder() if self.mode == "local_embeddings" else None
+        if self.uses_embeddings:
+            self._vectors.load(self._vectors_path())
+
     async def compare_two_strings(self, string1: str, string2: str) -> float:
         for attempt in range(3):
             try:
@@ -36,7 +60,194 @@ class SemanticMatcher:
                     return 0.0
         return 0.0
 
+    @property
+    def uses_embeddings(self) -> bool:
+        return self.mode in ("embeddings", "local_embeddings")
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(str(text).lower().split())
+
+    @classmethod
+    def _pair_key(cls, string1: str, string2: str) -> str:
+        """Ключ нормализованной пары для кэша и дедупликации"""
+        return f"{cls.normalize_text(string1)}\x00{cls.normalize_text(string2)}"
+
     async def compare_strings_batch(self, names_similarity_list: list[list[str]]) -> list[float]:
+        """Семантическое сравнение пар через кэш и общие микро-батчи (порядок ответа = порядок пар)"""
+        if not names_similarity_list:
+            return []
+
+        if self.uses_embeddings:
+            return await self._compare_by_embeddings(names_similarity_list)
+
+        keys = [self._pair_key(string1, string2) for string1, string2 in names_similarity_list]
+        scores: Dict[str, float] = {}
+        waiters: Dict[str, asyncio.Future] = {}
+
+        for key, pair in zip(keys, names_similarity_list):
+            if key in scores or key in waiters:
+                continue
+
+            cached = self._scores_cache.get(key)
+            if cached is not None:
+                scores[key] = cached
+                continue
+
+            if key not in self._pending:
+                self._pending[key] = (list(pair), asyncio.get_running_loop().create_future())
+            waiters[key] = self._pending[key][1]
+
+        if waiters:
+            self._schedule_flush()
+            results = await asyncio.gather(*waiters.values())
+            scores.update(zip(waiters.keys(), results))
+
+        # Ошибка сервиса для любой пары -> пустой ответ, как и при прямом батч-запросе
+        if any(scores[key] is None for key in keys):
+            return []
+
+        return [scores[key] for key in keys]
+
+    def _schedule_flush(self):
+        """Отправка батча по заполнению или по таймеру ожидания"""
+        if len(self._pending) >= self.batch_max_size:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_max_wait, self._start_flush)
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._pending:
+            return
+
+        batch_keys = list(self._pending.keys())[:self.batch_max_size]
+        batch = {key: self._pending.pop(key) for key in batch_keys}
+
+        task = asyncio.create_task(self._flush(batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+        if self._pending:
+            self._schedule_flush()
+
+    async def _flush(self, batch: Dict[str, Tuple[List[str], asyncio.Future]]):
+        """Один запрос в сервис на весь микро-батч уникальных пар"""
+        pairs = [pair for pair, _ in batch.values()]
+        self.batches_sent += 1
+        self.pairs_sent += len(pairs)
+
+        try:
+            results = await self._request_batch(pairs)
+        except Exception as e:
+            logger.error(f"Ошибка отправки микро-батча семантического сравнения: {e}")
+            results = []
+
+        if len(results) != len(pairs):
+            results = [None] * len(pairs)
+
+        for (key, (_, future)), score in zip(batch.items(), results):
+            if score is not None:
+                self._scores_cache.set(key, score)
+            if not future.done():
+                future.set_result(score)
+
+    async def similarity_matrix(self, queries: List[str], candidates: List[str]) -> Optional[np.ndarray]:
+        """Матрица косинусной схожести queries x candidates одним матричным произведением"""
+        queries = [self.normalize_text(text) for text in queries]
+        candidates = [self.normalize_text(text) for text in candidates]
+
+        matrix = await self._embedding_matrix(queries + candidates)
+        if matrix is None:
+            return None
+
+        return matrix[:len(queries)] @ matrix[len(queries):].T
+
+    async def _compare_by_embeddings(self, names_similarity_list: list[list[str]]) -> list[float]:
+        """Схожесть пар по закэшированным векторам (без запроса на каждую пару)"""
+        lefts = [self.normalize_text(string1) for string1, _ in names_similarity_list]
+        rights = [self.normalize_text(string2) for _, string2 in names_similarity_list]
+
+        matrix = await self._embedding_matrix(lefts + rights)
+        if matrix is None:
+            return []
+
+        scores = np.einsum("ij,ij->i", matrix[:len(lefts)], matrix[len(lefts):])
+        return scores.tolist()
+
+    async def _embedding_matrix(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Матрица векторов для строк: из кэша, для новых уникальных строк - запросом
+
+        Векторы берутся в локальную копию, поэтому вытеснение из кэша (в том числе параллельными
+        запросами, пока ждем ответ) не приводит к промаху
+        """
+        vectors = self._vectors.lookup(texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+
+        if missing:
+            if self._local_embedder is not None:
+                fetched = self._local_embedder.embed(missing)
+            else:
+                fetched = await self._request_embeddings(missing)
+                if fetched is None:
+                    return None
+
+            try:
+                vectors.update(zip(missing, self._vectors.add(missing, fetched)))
+            except Exception as e:
+                logger.error(f"Ошибка добавления эмбеддингов в кэш: {e}")
+                return None
+
+        return np.stack([vectors[text] for text in texts]) if texts else np.zeros((0, 0), dtype=np.float32)
+
+    async def _request_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Запрос эмбеддингов для списка строк"""
+        for attempt in range(3):
+            try:
+                session = await connection_pool.get_http_session('semantic_matcher')
+                url = f"{self.api_url}/api/v1/embeddings"
+
+                async with session.post(url, json=texts, ssl=False) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        return np.asarray(result, dtype=np.float32)
+                    else:
+                        logger.error(f"status: {response.status} | кол-во строк: {len(texts)}")
+                        return None
+
+            except Exception as e:
+                if attempt < 2:
+                    await asyncio.sleep(1)
+                    continue
+                else:
+                    logging.error(f"Ошибка при получении эмбеддингов для {len(texts)} строк: {e}")
+                    return None
+        return None
+
+    def _vectors_path(self) -> str:
+        return os.path.join(settings.NLP_CACHE_DIR, f"{self._vectors.name}.npz") if settings.NLP_CACHE_DIR else ""
+
+    def save_cache(self):
+        """Сохранение кэша векторов на диск (если задан NLP_CACHE_DIR)"""
+        if self.uses_embeddings:
+            self._vectors.dump(self._vectors_path())
+
+    def get_cache_stats(self) -> dict:
+        """Статистика кэша и коалесинга пар"""
+        return {
+            "mode": self.mode,
+            "vectors": len(self._vectors),
+            "vectors_evicted": self._vectors.evicted,
+            "pairs": self._scores_cache.get_stats(),
+            "batches_sent": self.batches_sent,
+            "pairs_sent": self.pairs_sent,
+            "avg_batch_size": round(self.pairs_sent / self.batches_sent, 1) if self.batches_sent else 0.0,
+        }
+
+    async def _request_batch(self, names_similarity_list: list[list[str]]) -> list[float]:
         """Отправка запроса на семантическое сравнение строк батчем"""
         for attempt in range(3):
             try: